@@ -16,6 +16,7 @@ from typing import List, Optional
 
 import click
 
+from johnny.base import colstore
 from johnny.base import discovery
 from johnny.base import mark
 from johnny.base import chains_pb2
@@ -53,8 +54,8 @@ def main(
     # Load the database.
     filename = configlib.GetConfigFilenameWithDefaults(config)
     config = configlib.ParseFile(filename)
-    transactions = petl.frompickle(config.output.transactions)
-    chains_table = petl.frompickle(config.output.chains)
+    transactions = colstore.Read(config.output.transactions)
+    chains_table = colstore.Read(config.output.chains)
     chains_db = configlib.ReadChains(config.output.chains_db)
     chains_map = {c.chain_id: c for c in chains_db.chains}
 
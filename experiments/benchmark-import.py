@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Benchmark the stages of the import pipeline on synthetic transactions logs.
+
+This generates deterministic logs of increasing sizes (see
+johnny/testing/synthetic.py) and times and memory-profiles each stage of the
+import: matching, marking, chaining and reducing to the chains table. The
+results are written out as JSON, and can be compared against the results of a
+previous version in order to detect performance regressions, e.g.,
+
+  ./experiments/benchmark-import.py -s 10k,100k -o before.json
+  (... make changes ...)
+  ./experiments/benchmark-import.py -s 10k,100k -o after.json --compare before.json
+"""
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import click
+
+from johnny.base import chains as chainslib
+from johnny.base import config as configlib
+from johnny.base import mark
+from johnny.base import match
+from johnny.base.etl import petl, Table
+from johnny.testing import synthetic
+
+
+# Version of the output format.
+FORMAT_VERSION = 1
+
+
+def Materialize(table: Table) -> Table:
+    """Force the evaluation of a lazy table."""
+    return petl.wrap(list(table))
+
+
+def RunGenerate(ctx: Dict[str, Any]) -> int:
+    ctx["transactions"] = synthetic.GenerateTransactions(ctx["size"], ctx["seed"])
+    ctx["mark_time"] = synthetic.GetEndTime(ctx["transactions"])
+    return ctx["transactions"].nrows()
+
+
+def RunMatch(ctx: Dict[str, Any]) -> int:
+    ctx["matched"] = Materialize(match.Process(ctx["transactions"], ctx["mark_time"]))
+    return ctx["matched"].nrows()
+
+
+def RunMark(ctx: Dict[str, Any]) -> int:
+    price_map = mark.FetchPricesFromTransactionsLog(ctx["matched"])
+    ctx["marked"] = Materialize(mark.Mark(ctx["matched"], price_map))
+    return ctx["marked"].nrows()
+
+
+def RunChains(ctx: Dict[str, Any]) -> int:
+    chained, ctx["chains_db"] = chainslib.ChainTransactions(
+        ctx["marked"], configlib.Chains()
+    )
+    ctx["chained"] = Materialize(chained)
+    return ctx["chained"].nrows()
+
+
+def RunReduce(ctx: Dict[str, Any]) -> int:
+    chains, transactions = chainslib.TransactionsTableToChainsTable(
+        ctx["chained"], ctx["chains_db"]
+    )
+    ctx["chains"] = Materialize(chains)
+    Materialize(transactions)
+    return ctx["chains"].nrows()
+
+
+class Stage(NamedTuple):
+    """A stage of the pipeline. The function reads its inputs from and stores its
+    outputs to a context, and returns the number of output rows."""
+
+    name: str
+    function: Callable[[Dict[str, Any]], int]
+
+
+STAGES = [
+    Stage("generate", RunGenerate),
+    Stage("match", RunMatch),
+    Stage("mark", RunMark),
+    Stage("chains", RunChains),
+    Stage("reduce", RunReduce),
+]
+
+
+def TimeStage(stage: Stage, ctx: Dict[str, Any]) -> Tuple[float, int]:
+    """Run a stage, returning its time in seconds and number of output rows."""
+    gc.collect()
+    time1 = time.perf_counter()
+    nrows = stage.function(ctx)
+    return time.perf_counter() - time1, nrows
+
+
+def TraceStage(stage: Stage, ctx: Dict[str, Any]) -> Dict[str, int]:
+    """Run a stage with memory tracing, returning the peak allocated memory and
+    the memory retained by its outputs."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage.function(ctx)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "retained_bytes": retained}
+
+
+def RunBenchmarks(
+    sizes: List[int], seed: int, repeat: int, memory: bool
+) -> List[Dict[str, Any]]:
+    """Run all the stages over logs of the given sizes."""
+    results = []
+    for size in sizes:
+        ctx = {"size": size, "seed": seed}
+        for stage in STAGES:
+            click.echo(f"Running '{stage.name}' on {size} rows", err=True)
+            if memory:
+                memory_stats = TraceStage(stage, ctx)
+            timings = []
+            for _ in range(repeat):
+                seconds, nrows = TimeStage(stage, ctx)
+                timings.append(seconds)
+            seconds = min(timings)
+            result = {
+                "size": size,
+                "stage": stage.name,
+                "rows": nrows,
+                "seconds": seconds,
+                "timings": timings,
+                "rows_per_second": size / seconds if seconds else None,
+            }
+            if memory:
+                result.update(memory_stats)
+            results.append(result)
+    return results
+
+
+def GetMetadata(seed: int, repeat: int) -> Dict[str, Any]:
+    """Describe the environment the benchmarks were run in."""
+    try:
+        revision = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "format": FORMAT_VERSION,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": sys.version.split()[0],
+        "petl": petl.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+    }
+
+
+def Compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Print a comparison of the timings against a baseline and return the list
+    of regressions, the stages slower by more than the threshold fraction."""
+    base_map = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    click.echo(
+        f"{'size':>10} {'stage':10} {'baseline':>10} {'current':>10} {'change':>8}",
+        err=True,
+    )
+    for result in current["results"]:
+        key = (result["size"], result["stage"])
+        base = base_map.get(key)
+        if base is None:
+            continue
+        change = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0
+        flag = ""
+        if change > threshold:
+            regressions.append("{} on {} rows: {:+.1%}".format(key[1], key[0], change))
+            flag = " REGRESSION"
+        click.echo(
+            f"{key[0]:>10} {key[1]:10} {base['seconds']:10.3f} "
+            f"{result['seconds']:10.3f} {change:+8.1%}{flag}",
+            err=True,
+        )
+    return regressions
+
+
+def ParseSizes(ctx, param, value: str) -> List[int]:
+    """Parse a comma-separated list of sizes, e.g. '10k,100k,1M'."""
+    suffixes = {"k": 1000, "m": 1000000}
+    sizes = []
+    for size in value.split(","):
+        size = size.strip().lower()
+        multiplier = suffixes.get(size[-1:], 1)
+        try:
+            sizes.append(int(size.rstrip("km")) * multiplier)
+        except ValueError:
+            raise click.BadParameter(f"Invalid size: '{size}'")
+    return sizes
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    "-s",
+    default="10k,100k",
+    callback=ParseSizes,
+    help="Comma-separated number of rows of the generated logs, e.g. 10k,100k,1M.",
+)
+@click.option("--seed", default=0, type=int, help="Seed of the generated logs.")
+@click.option(
+    "--repeat", "-r", default=3, type=int, help="Timings per stage; the best is kept."
+)
+@click.option(
+    "--memory/--no-memory",
+    default=True,
+    help="Run each stage once more with memory tracing.",
+)
+@click.option(
+    "--output", "-o", type=click.Path(), help="JSON output filename. Default: stdout."
+)
+@click.option(
+    "--compare",
+    type=click.Path(exists=True),
+    help="JSON output of a previous run to compare the timings against.",
+)
+@click.option(
+    "--threshold",
+    default=0.10,
+    type=float,
+    help="Slowdown fraction over the baseline reported as a regression.",
+)
+def main(
+    sizes: List[int],
+    seed: int,
+    repeat: int,
+    memory: bool,
+    output: Optional[str],
+    compare: Optional[str],
+    threshold: float,
+):
+    """Benchmark the import pipeline stages on synthetic logs."""
+    # Note: The chains heuristics warn about the synthetic logs a lot.
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)-8s: %(message)s")
+
+    current = {
+        "metadata": GetMetadata(seed, repeat),
+        "results": RunBenchmarks(sizes, seed, repeat, memory),
+    }
+    if output:
+        with open(output, "w") as outfile:
+            json.dump(current, outfile, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+    if compare:
+        with open(compare) as infile:
+            baseline = json.load(infile)
+        regressions = Compare(baseline, current, threshold)
+        if regressions:
+            for regression in regressions:
+                logging.error(f"Regression: {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
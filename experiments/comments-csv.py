@@ -15,6 +15,7 @@ from typing import List, Optional
 import click
 
 from johnny.base.etl import petl
+from johnny.base import colstore
 from johnny.base import instrument
 from johnny.base import chains_pb2
 from johnny.base import chains as chainslib
@@ -72,7 +73,7 @@ def main(comments_filename: str, config: Optional[str], force: bool = False):
 
     # Read prior transactions.
     last_chain = (
-        petl.frompickle(config.output.transactions)
+        colstore.Read(config.output.transactions)
         .applyfn(instrument.Expand, "symbol")
         .sort(["datetime", "chain_id"])
         .cut("underlying", "chain_id")
@@ -27,6 +27,7 @@ import click
 import simplejson
 
 from johnny.base import chains as chainslib
+from johnny.base import colstore
 from johnny.base import config as configlib
 from johnny.base import discovery
 from johnny.base import instrument
@@ -56,7 +57,7 @@ def main(config: Optional[str], output: Optional[str]):
 
     # Read and filter the chains.
     # print(transactions.head(40).lookallstr())
-    chains = petl.frompickle(config.output.chains)
+    chains = colstore.Read(config.output.chains)
     earnings_chains = (
         chains
         # Select the earnings trades only.
@@ -73,7 +74,7 @@ def main(config: Optional[str], output: Optional[str]):
 
     # Read the past transactions and narrow them to those in the chains..
     earnings_transactions = (
-        petl.frompickle(config.output.transactions)
+        colstore.Read(config.output.transactions)
         # Remove non-earnings trades.
         .selectin("chain_id", chains_map)
         # Order by chain.
@@ -16,6 +16,7 @@ from typing import List, Optional
 
 import click
 
+from johnny.base import colstore
 from johnny.base import discovery
 from johnny.base import mark
 from johnny.base import chains as chainslib
@@ -51,7 +52,7 @@ def main(config: Optional[str], group: str, date: datetime.date):
 
     filename = configlib.GetConfigFilenameWithDefaults(config)
     config = configlib.ParseFile(filename)
-    transactions = petl.frompickle(config.output.transactions)
+    transactions = colstore.Read(config.output.transactions)
     chains_db = configlib.ReadChains(config.input.chains_db)
     chain_table, _ = chainslib.TransactionsTableToChainsTable(transactions, chains_db)
     chain_map = chain_table.recordlookupone("chain_id")
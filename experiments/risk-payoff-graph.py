@@ -17,6 +17,7 @@ from typing import List, Optional
 
 import click
 
+from johnny.base import colstore
 from johnny.base import discovery
 from johnny.base import mark
 from johnny.base import chains_pb2
@@ -95,7 +96,7 @@ def main(config: Optional[str], username: Optional[str], password: Optional[str]
     # Load the database.
     filename = configlib.GetConfigFilenameWithDefaults(config)
     config = configlib.ParseFile(filename)
-    transactions = petl.frompickle(config.output.transactions)
+    transactions = colstore.Read(config.output.transactions)
 
     positions = (
         transactions.selecteq("account", "x18")
@@ -24,6 +24,7 @@ import numpy
 import requests
 import yfinance
 
+from johnny.base import colstore
 from johnny.base import config as configlib
 from johnny.base import chains as chainslib
 from johnny.base import mark
@@ -170,7 +171,7 @@ def main(config: Optional[str], retry: Optional[bool], database: str):
     filename = configlib.GetConfigFilenameWithDefaults(config)
     config = configlib.ParseFile(filename)
     transactions = (
-        petl.frompickle(config.output.transactions)
+        colstore.Read(config.output.transactions)
         .applyfn(instrument.Expand, "symbol")
         .selectne("rowtype", "Mark")
         .selectin("instype", {"Equity", "EquityOption"})
@@ -37,6 +37,7 @@ import py_vollib.black_scholes.implied_volatility
 from py_vollib import black_scholes
 from py_lets_be_rational import exceptions
 
+from johnny.base import colstore
 from johnny.base import config as configlib
 from johnny.base import chains as chainslib
 from johnny.base import mark
@@ -263,7 +264,7 @@ def main(config: Optional[str],
         filename = configlib.GetConfigFilenameWithDefaults(config)
         config = configlib.ParseFile(filename)
         transactions = (
-            petl.frompickle(config.output.transactions)
+            colstore.Read(config.output.transactions)
             .applyfn(instrument.Expand, 'symbol')
 
             # Fetch the database.
@@ -379,7 +380,7 @@ def main(config: Optional[str],
             filename = configlib.GetConfigFilenameWithDefaults(config)
             config = configlib.ParseFile(filename)
             transactions = (
-                petl.frompickle(config.output.transactions)
+                colstore.Read(config.output.transactions)
                 .applyfn(instrument.Expand, 'symbol')
 
                 # Move these filters in the chain aggregator.
@@ -21,6 +21,7 @@ __license__ = "GNU GPLv2"
 
 from functools import partial
 from decimal import Decimal
+from os import path
 from typing import Any, Iterator, List, Mapping, Optional, Tuple, Union, Dict, Set
 import functools
 import string
@@ -32,16 +33,19 @@ import collections
 import datetime
 import itertools
 import logging
+import os
+import pickle
 
 from more_itertools import first
-import networkx as nx
 
 from johnny.base import config as configlib
 from johnny.base import strategy as strategylib
 from johnny.base import instrument
 from johnny.base import inventories
+from johnny.base import manifest
 from johnny.base import mark
-from johnny.base.etl import AssertColumns, Record, Table
+from johnny.base.etl import AssertColumns, Record, Table, petl
+from johnny.utils import disjoint
 from johnny.utils import timing
 
 ChainStatus = configlib.ChainStatus
@@ -54,10 +58,12 @@ Q = Decimal("0.01")
 
 
 def ChainTransactions(
-    matched_transactions: Table, chains_db: Chains
+    matched_transactions: Table, chains_db: Chains, state_filename: Optional[str] = None
 ) -> Tuple[Table, Chains]:
     """Cluster the transactions and return a new table, with added 'chain_id' and an
-    update chains configuration on a config object."""
+    update chains configuration on a config object. If `state_filename` is
+    provided, the clustering state is persisted there and only transactions
+    after its watermark are processed on the next run (see `Group()`)."""
 
     log = functools.partial(timing.log_time, log_timings=logging.info, indent=1)
 
@@ -70,7 +76,7 @@ def ChainTransactions(
     with log("group"):
         chained_transactions = (
             matched_transactions.applyfn(instrument.Expand, "symbol")
-            .applyfn(Group, clean_chains_db.chains)
+            .applyfn(Group, clean_chains_db.chains, state_filename=state_filename)
             .applyfn(instrument.Shrink)
         )
 
@@ -81,7 +87,13 @@ def ChainTransactions(
 
 
 def Group(
-    transactions: Table, chains: List[Chain], by_match=True, by_order=True, by_time=True
+    transactions: Table,
+    chains: List[Chain],
+    by_match=True,
+    by_order=True,
+    by_time=True,
+    engine: str = "disjoint",
+    state_filename: Optional[str] = None,
 ) -> Table:
     """Cluster transactions to create options chains.
 
@@ -95,6 +107,13 @@ def Group(
       by_match: A flag, indicating that matching transactions should be chained.
       by_order: A flag, indicating that transactions from the same order should be chained.
       by_time: A flag, indicating that transactions overlapping over time should be chained.
+      engine: The clustering backend, either "disjoint" (an integer-indexed
+        union-find, the default) or "networkx" (a full graph of the
+        transactions). Both produce identical clusters.
+      state_filename: An optional file to persist the clustering state to, as
+        of the last transaction before the marks. If it exists and the history
+        up to its watermark hasn't changed, only the later transactions are
+        replayed on top of it. This requires the "disjoint" engine.
     Returns:
       A modified table with an extra "chain" column, identifying groups of
       related transactions, by episode, or chain.
@@ -130,7 +149,109 @@ def Group(
     )
 
     # Create a graph and process each connected component to an individual trade.
-    graph = CreateGraph(match_transactions, match_chains, by_match, by_order, by_time)
+    if engine == "disjoint":
+        chain_map = _ClusterDisjoint(
+            match_transactions,
+            match_chains,
+            txn_chain_map,
+            by_match,
+            by_order,
+            by_time,
+            state_filename,
+        )
+    elif engine == "networkx":
+        if state_filename:
+            raise ValueError("Persistent clustering requires the 'disjoint' engine")
+        graph = CreateGraph(
+            match_transactions, match_chains, by_match, by_order, by_time
+        )
+        chain_map = {}
+        for chain_txns in _GraphComponents(graph):
+            assert chain_txns, "Invalid empty chain: {}".format(chain_txns)
+            chain_id = ChainName(chain_txns, txn_chain_map)
+            for rec in chain_txns:
+                chain_map[rec.transaction_id] = chain_id
+    else:
+        raise ValueError(f"Invalid clustering engine: '{engine}'")
+
+    # This should never happen; but if you somehow used the wrong transaction -
+    # with the same (account, datetime, underlying) in a final chain, it could.
+    # Best is to adjust the input file, but we could eventually just insert a
+    # random character here.
+    collisions = final_chain_ids.intersection(chain_map.values())
+    assert not collisions, f"Collision with FINAL chain names at '{collisions}'."
+
+    # Add tagged transactions to the chain map.
+    txn_chain_map.update(chain_map)
+
+    return transactions.addfield("chain_id", lambda r: txn_chain_map[r.transaction_id])
+
+
+class DisjointGraph:
+    """A graph of nodes with named types, which only keeps track of its connected
+    components. Nodes are interned to dense integers and clustered with a
+    disjoint-set forest, without storing the edges nor the transactions. This
+    supports the subset of the `networkx.Graph` interface used by
+    `GraphBuilder`."""
+
+    def __init__(self):
+        self.nodes: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.types: List[Optional[str]] = []
+        self.forest = disjoint.DisjointSet()
+        # The nodes added or linked since the last call to `clean()`. Only the
+        # components of these nodes may have changed since then.
+        self.dirty: Set[int] = set()
+
+    def add_node(self, name: str, type: str, rec: Optional[Record] = None) -> int:
+        """Add a node, or update the type of an existing one."""
+        node = self.nodes.get(name)
+        if node is None:
+            node = self.nodes[name] = self.forest.add()
+            self.names.append(name)
+            self.types.append(type)
+        else:
+            self.types[node] = type
+        self.dirty.add(node)
+        return node
+
+    def add_edge(self, name1: str, name2: str):
+        """Link two nodes, creating them untyped if necessary."""
+        node1 = self.nodes.get(name1)
+        if node1 is None:
+            node1 = self.add_node(name1, None)
+        node2 = self.nodes.get(name2)
+        if node2 is None:
+            node2 = self.add_node(name2, None)
+        self.dirty.add(self.forest.union(node1, node2))
+
+    def roots(self) -> Dict[str, int]:
+        """Return the root node of the component of each transaction id."""
+        if None in self.types:
+            node = self.types.index(None)
+            raise KeyError("Node without type for: {}".format(self.names[node]))
+        find = self.forest.find
+        return {
+            self.names[node]: find(node)
+            for node, node_type in enumerate(self.types)
+            if node_type == "txn"
+        }
+
+    def dirty_roots(self) -> Set[int]:
+        """Return the root nodes of the components changed since the last call to
+        `clean()`."""
+        find = self.forest.find
+        return {find(node) for node in self.dirty}
+
+    def clean(self):
+        """Forget about the changes to the components so far."""
+        self.dirty = set()
+
+
+def _GraphComponents(graph: "networkx.Graph") -> Iterator[List[Record]]:
+    """Generate the list of transactions of each connected component of a graph."""
+    import networkx as nx
+
     for cc in nx.connected_components(graph):
         chain_txns = []
         for transaction_id in cc:
@@ -141,23 +262,7 @@ def Group(
                 raise KeyError("Node without type for: {}".format(transaction_id))
             if node["type"] == "txn":
                 chain_txns.append(node["rec"])
-        assert chain_txns, "Invalid empty chain: {}".format(chain_txns)
-
-        chain_id = ChainName(chain_txns, txn_chain_map)
-
-        # This should never happen; but if you somehow used the wrong
-        # transaction - with the same (account, datetime, underlying) in a final
-        # chain, it could. Best is to adjust the input file, but we could
-        # eventually just insert a random character here.
-        assert (
-            chain_id not in final_chain_ids
-        ), f"Collision with FINAL chain names at '{chain_id}'."
-
-        # Add tagged transactions to the chain map.
-        for rec in chain_txns:
-            txn_chain_map[rec.transaction_id] = chain_id
-
-    return transactions.addfield("chain_id", lambda r: txn_chain_map[r.transaction_id])
+        yield chain_txns
 
 
 def CreateGraph(
@@ -167,9 +272,21 @@ def CreateGraph(
     by_order=True,
     by_time=True,
     explicit_chain_map=None,
-) -> nx.Graph:
-    """Create a graph to link together related transactions."""
+) -> "networkx.Graph":
+    """Create a graph to link together related transactions. This is used for
+    visualization; clustering uses the more compact `DisjointGraph`."""
+    import networkx as nx
 
+    _AssertGraphColumns(transactions)
+    builder = GraphBuilder(nx.Graph(), chains, by_match, by_order, by_time)
+    for rec in transactions.records():
+        builder.add(rec)
+    builder.finish()
+    return builder.graph
+
+
+def _AssertGraphColumns(transactions: Table):
+    """Check the columns required to build a graph of transactions."""
     AssertColumns(
         transactions,
         ("transaction_id", str),
@@ -179,53 +296,286 @@ def CreateGraph(
         ("expiration", {None, datetime.date}),
         ("account", str),
         ("underlying", str),
+        ("instruction", str),
+        ("symbol", str),
+        ("quantity", Decimal),
     )
 
-    # Create a mapping of transaction id to their chain id.
-    chain_map = {
-        transaction_id: chain.chain_id
-        for chain in chains
-        for transaction_id in chain.ids
-    }
 
-    graph = nx.Graph()
-    for rec in transactions.records():
+class GraphBuilder:
+    """Add the nodes and edges linking together related transactions to a graph,
+    one transaction at a time. The graph is either a `networkx.Graph` or a
+    `DisjointGraph`. The builder only depends on the transactions already
+    added, so its state can be saved and resumed with later transactions."""
+
+    def __init__(
+        self,
+        graph: Any,
+        chains: List[Chain],
+        by_match=True,
+        by_order=True,
+        by_time=True,
+    ):
+        self.graph = graph
+        self.by_match = by_match
+        self.by_order = by_order
+
+        # Create a mapping of transaction id to their chain id.
+        self.chain_map = {
+            transaction_id: chain.chain_id
+            for chain in chains
+            for transaction_id in chain.ids
+        }
+
+        # The inventory of terms to link transactions overlapping in time.
+        self.terms = TermInventory() if by_time else None
+
+    def add(self, rec: Record):
+        """Add a transaction and its links to the graph."""
+        graph = self.graph
         graph.add_node(rec.transaction_id, type="txn", rec=rec)
 
         # Link together explicit chains that aren't finalized.
-        explicit_chain = chain_map.pop(rec.transaction_id, None)
+        explicit_chain = self.chain_map.pop(rec.transaction_id, None)
         if explicit_chain:
             graph.add_node(explicit_chain, type="expchain")
             graph.add_edge(rec.transaction_id, explicit_chain)
 
         # Link together by order id.
-        if by_order:
+        if self.by_order:
             if rec.order_id:
                 graph.add_node(rec.order_id, type="order")
                 graph.add_edge(rec.transaction_id, rec.order_id)
 
         # Link together by match id.
-        if by_match:
+        if self.by_match:
             if rec.match_id:
                 graph.add_node(rec.match_id, type="match")
                 graph.add_edge(rec.transaction_id, rec.match_id)
 
-    # Link together matches that overlap in underlying and time.
-    if by_time:
-        links, transaction_links = _LinkByOverlapping(transactions)
+        # Link together matches that overlap in underlying and time.
+        if self.terms is not None:
+            links = []
+            term_id = self.terms.add(rec, links)
+            for id1, id2 in links:
+                graph.add_node(id1, type="time")
+                graph.add_node(id2, type="time")
+                graph.add_edge(id1, id2)
+            graph.add_node(term_id, type="time")
+            graph.add_edge(term_id, rec.transaction_id)
+
+    def finish(self):
+        """Issue warnings for the leftover state after all transactions."""
+        if self.terms is not None:
+            self.terms.check()
+        for item in self.chain_map.items():
+            logging.warning(
+                f"Explicit transaction id from chains not seen in log: {item}"
+            )
+
+
+# Version of the persisted clustering state. Bump this when changing the way
+# the graph gets built.
+_STATE_VERSION = 2
+
+# Columns that influence the construction of the graph, or the names of chains.
+# (The instrument fields are derived from the symbol.)
+_STATE_COLUMNS = (
+    "transaction_id",
+    "order_id",
+    "match_id",
+    "datetime",
+    "rowtype",
+    "account",
+    "symbol",
+    "instruction",
+    "quantity",
+)
+
+
+def _StateFingerprint(chains: List[Chain], *flags: bool) -> str:
+    """Fingerprint the clustering configuration and the code."""
+    md5 = hashlib.blake2b(digest_size=16)
+    md5.update(repr((_STATE_VERSION, flags)).encode("utf8"))
+    md5.update(manifest.GetCodeVersion().encode("ascii"))
+    for chain in chains:
+        md5.update(repr((chain.chain_id, list(chain.ids))).encode("utf8"))
+    return md5.hexdigest()
+
+
+def _NewHashers() -> List[Any]:
+    """Create a hasher for each of the graph-relevant columns."""
+    return [hashlib.blake2b(digest_size=16) for _ in _STATE_COLUMNS]
+
+
+def _HashRows(hashers: List[Any], header: Tuple[str, ...], rows: List[Record]):
+    """Update the hashers with the graph-relevant columns of the rows. The values
+    of each column are formatted in bulk, which is much cheaper than hashing
+    records one at a time. Hashing consecutive runs of rows is equivalent to
+    hashing them all at once."""
+    if not rows:
+        return
+    for hasher, name in zip(hashers, _STATE_COLUMNS):
+        index = header.index(name)
+        values = "\x1f".join(map(str, [row[index] for row in rows]))
+        hasher.update((values + "\x1f").encode("utf8"))
+
+
+def _Digest(hashers: List[Any]) -> str:
+    """Combine the digests of the columns."""
+    md5 = hashlib.blake2b(digest_size=16)
+    for hasher in hashers:
+        md5.update(hasher.digest())
+    return md5.hexdigest()
+
+
+def _LoadState(
+    filename: str,
+    fingerprint: str,
+    header: Tuple[str, ...],
+    rows: List[Record],
+    hashers: List[Any],
+) -> Optional[Dict[str, Any]]:
+    """Load the persisted clustering state, validating it against the current
+    transactions. Returns the state, or None if it cannot be used."""
+    if not path.exists(filename):
+        return None
+    try:
+        with open(filename, "rb") as infile:
+            state = pickle.load(infile)
+    except Exception as exc:
+        logging.warning(f"Invalid clustering state at '{filename}': {exc}")
+        return None
+
+    if state["fingerprint"] != fingerprint:
+        logging.info("Chains configuration changed; clustering all transactions")
+        return None
+
+    count = state["count"]
+    if count <= len(rows):
+        _HashRows(hashers, header, rows[:count])
+    if count > len(rows) or _Digest(hashers) != state["digest"]:
+        logging.info("History changed before watermark; clustering all transactions")
+        return None
+
+    # Check that no transaction appears at or before the watermark after the
+    # saved prefix.
+    watermark = state["watermark"]
+    for rec in itertools.islice(rows, count, None):
+        if rec.rowtype != "Mark" and rec.datetime <= watermark:
+            logging.info(
+                "New transactions before watermark; clustering all transactions"
+            )
+            return None
+
+    return state
+
+
+def _SaveState(filename: str, state: Dict[str, Any]):
+    """Save the clustering state."""
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as outfile:
+        pickle.dump(state, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filename, filename)
+
+
+def _NameComponents(
+    graph: DisjointGraph,
+    roots: Mapping[str, int],
+    names: Mapping[int, str],
+    rows: List[Record],
+    chain_map: Mapping[str, str],
+) -> Dict[int, str]:
+    """Name the components of the graph changed since it was last cleaned, and
+    clean it. `roots` are the root nodes of the transaction ids of the graph.
+    Returns the names of all the components by root node, updated from the
+    previous ones."""
+    chain_txns = {root: [] for root in graph.dirty_roots()}
+    for row in rows:
+        txns = chain_txns.get(roots.get(row.transaction_id))
+        if txns is not None:
+            txns.append(row)
+
+    parent = graph.forest.parent
+    names = {
+        root: name
+        for root, name in names.items()
+        if parent[root] == root and root not in chain_txns
+    }
+    for root, txns in chain_txns.items():
+        assert txns, "Invalid empty chain: {}".format(txns)
+        names[root] = ChainName(txns, chain_map)
+    graph.clean()
+    return names
 
-        ids = set(id1 for id1, _ in links)
-        ids.update(id2 for _, id2 in links)
-        ids.update(id1 for id1, _ in transaction_links)
-        for idx in ids:
-            graph.add_node(idx, type="time")
-        for id1, id2 in itertools.chain(links, transaction_links):
-            graph.add_edge(id1, id2)
 
-    for item in chain_map.items():
-        logging.warning(f"Explicit transaction id from chains not seen in log: {item}")
+def _ClusterDisjoint(
+    transactions: Table,
+    chains: List[Chain],
+    chain_map: Mapping[str, str],
+    by_match=True,
+    by_order=True,
+    by_time=True,
+    state_filename: Optional[str] = None,
+) -> Dict[str, str]:
+    """Cluster the transactions with a disjoint-set forest and name the chains,
+    optionally resuming from and updating persisted state. Returns a mapping of
+    transaction id to chain id.
+
+    The state is validated with the configuration and the code, the number of
+    transactions before its watermark and a digest of their graph-relevant
+    columns. It holds the names of the components along with the graph, so that
+    only the components linked to the replayed transactions are named again.
+    """
+    _AssertGraphColumns(transactions)
+    header = transactions.header()
+    Row = collections.namedtuple("Row", header)
+    rows = [Row._make(row) for row in petl.data(transactions)]
+
+    # Resume from the persisted state if it is still valid.
+    state = None
+    hashers = _NewHashers()
+    if state_filename:
+        fingerprint = _StateFingerprint(chains, by_match, by_order, by_time)
+        state = _LoadState(state_filename, fingerprint, header, rows, hashers)
+    if state is None:
+        builder = GraphBuilder(DisjointGraph(), chains, by_match, by_order, by_time)
+        names, start = {}, 0
+        hashers = _NewHashers()
+    else:
+        builder, names, start = state["builder"], state["names"], state["count"]
+        logging.info(f"Replaying {len(rows) - start} transactions after watermark")
+
+    # Replay the history up to the marks, and save the state as of then. Marks
+    # are synthesized as of the time of import, so they are always replayed.
+    end = start
+    while end < len(rows) and rows[end].rowtype != "Mark":
+        builder.add(rows[end])
+        end += 1
+    if state_filename and end > 0:
+        if builder.graph.dirty:
+            names = _NameComponents(
+                builder.graph, builder.graph.roots(), names, rows, chain_map
+            )
+        _HashRows(hashers, header, rows[start:end])
+        _SaveState(
+            state_filename,
+            {
+                "fingerprint": fingerprint,
+                "watermark": rows[end - 1].datetime,
+                "count": end,
+                "digest": _Digest(hashers),
+                "builder": builder,
+                "names": names,
+            },
+        )
+    for row in itertools.islice(rows, end, None):
+        builder.add(row)
+    builder.finish()
 
-    return graph
+    roots = builder.graph.roots()
+    names = _NameComponents(builder.graph, roots, names, rows, chain_map)
+    return {transaction_id: names[root] for transaction_id, root in roots.items()}
 
 
 def _GetExpiration(rec: Record) -> Union[datetime.date, str]:
@@ -233,49 +583,42 @@ def _GetExpiration(rec: Record) -> Union[datetime.date, str]:
     return rec.expiration or rec.expcode
 
 
-def _LinkByOverlapping(transactions: Table) -> List[Tuple[str, str]]:
-    """Return pairs of linked matches, linking all transactions where either of (a)
-    an outright position exists in that underlying and/or (b) a common
-    expiration exists in that underlying. We're not bothering to inspect
-    match_id at all. This is a bit more general and correct than
-    _LinkByOverlappingMatch().
-    """
-    AssertColumns(
-        transactions,
-        ("transaction_id", str),
-        ("instruction", str),
-        ("symbol", str),
-        ("quantity", Decimal),
-        ("account", str),
-        ("underlying", str),
-        ("expiration", {None, datetime.date}),
-    )
+class _Term:
+    """All the positions associated with an expiration term.
+    A unique id is associated with each of the terms."""
 
-    class Term:
-        """All the positions associated with an expiration term.
-        A unique id is associated with each of the terms."""
+    def __init__(self, term_id):
+        self.id = term_id
+        # A mapping of option name to outstanding quantity for that name.
+        self.quantities = collections.defaultdict(Decimal)
 
-        def __init__(self, term_id):
-            self.id = term_id
-            # A mapping of option name to outstanding quantity for that name.
-            self.quantities = collections.defaultdict(Decimal)
+    def __repr__(self):
+        return "<Term {} {}>".format(self.id, self.quantities)
 
-        def __repr__(self):
-            return "<Term {} {}>".format(self.id, self.quantities)
 
-    # Run through matching in order to figure out overlaps.
-    # This is a mapping of (account, underlying) to a mapping of (expiration, Term).
-    # A Term object contains all the options positions for that expiration in
-    # the `quantities` attribue.
-    # `expiration` can be `None` in order to track positions in the underlying.
-    inventory = collections.defaultdict(dict)
-    links = []
-    transaction_links = []
-    idgen = iter(itertools.count(start=1))
-    for rec in transactions.records():
+class TermInventory:
+    """The running positions by account, underlying and expiration term, used to
+    link transactions overlapping in time. This links together all transactions
+    where either of (a) an outright position exists in that underlying and/or
+    (b) a common expiration exists in that underlying. We're not bothering to
+    inspect match_id at all.
+    """
+
+    def __init__(self):
+        # This is a mapping of (account, underlying) to a mapping of
+        # (expiration, Term). A Term object contains all the options positions
+        # for that expiration in the `quantities` attribue. `expiration` can be
+        # `None` in order to track positions in the underlying.
+        self.inventory = collections.defaultdict(dict)
+        self.next_id = 1
+
+    def add(self, rec: Record, links: List[Tuple[str, str]]) -> str:
+        """Update the inventory with a transaction. Links between terms are
+        appended to `links` and the id of the transaction's term is returned."""
+
         # Get a mapping for each underlying. In that submapping, the special key
         # 'None' refers to the position of the underlying outright.
-        undermap = inventory[(rec.account, rec.underlying)]
+        undermap = self.inventory[(rec.account, rec.underlying)]
 
         # Potentially allocate a new position for the expiration (or lack
         # thereof). (Note that undermap is mutating if the key is new.) Also
@@ -284,11 +627,12 @@ def _LinkByOverlapping(transactions: Table) -> List[Tuple[str, str]]:
         expiration = _GetExpiration(rec)
         isnew = expiration not in undermap
         term_id = "{}/{}/{}/{}".format(
-            rec.account, rec.underlying, expiration, next(idgen)
+            rec.account, rec.underlying, expiration, self.next_id
         )
+        self.next_id += 1
         term = undermap.get(expiration, None)
         if term is None:
-            term = undermap[expiration] = Term(term_id)
+            term = undermap[expiration] = _Term(term_id)
 
         if isnew:
             if expiration is None:
@@ -307,19 +651,45 @@ def _LinkByOverlapping(transactions: Table) -> List[Tuple[str, str]]:
 
         sign = -1 if rec.instruction == "SELL" else +1
         term.quantities[rec.symbol] += sign * rec.quantity
-        transaction_links.append((term.id, rec.transaction_id))
         if term.quantities[rec.symbol] == ZERO:
             del term.quantities[rec.symbol]
         if not term.quantities:
             del undermap[expiration]
+        return term.id
+
+    def check(self):
+        """Sanity check. All positions should have been closed (`Mark` rows close
+        outstanding positions) and the resulting inventory should be completely
+        empty."""
+        inventory = {
+            key: undermap for key, undermap in self.inventory.items() if undermap
+        }
+        if inventory:
+            logging.error("Inventory not empty: {}".format(inventory))
 
-    # Sanity check. All positions should have been closed (`Mark` rows close
-    # outstanding positions) and the resulting inventory should be completely
-    # empty.
-    inventory = {key: undermap for key, undermap in undermap.items() if undermap}
-    if inventory:
-        logging.error("Inventory not empty: {}".format(inventory))
 
+def _LinkByOverlapping(transactions: Table) -> List[Tuple[str, str]]:
+    """Return pairs of linked matches, and pairs of (term, transaction), linking
+    all transactions overlapping in time. See `TermInventory`.
+    """
+    AssertColumns(
+        transactions,
+        ("transaction_id", str),
+        ("instruction", str),
+        ("symbol", str),
+        ("quantity", Decimal),
+        ("account", str),
+        ("underlying", str),
+        ("expiration", {None, datetime.date}),
+    )
+
+    # Run through matching in order to figure out overlaps.
+    terms = TermInventory()
+    links = []
+    transaction_links = []
+    for rec in transactions.records():
+        transaction_links.append((terms.add(rec, links), rec.transaction_id))
+    terms.check()
     return links, transaction_links
 
 
@@ -501,8 +871,12 @@ def _NumAdjustments(rec: Record) -> int:
 
 def _CalculatePnlFrac(r: Record) -> Decimal:
     """Calculate the P/L fraction."""
-    denom = r.pnl_win if r.pnl_chain * r.pnl_win > 0 else -r.pnl_loss
-    return (r.pnl_chain / denom).quantize(Q) if denom else ZERO
+    return _PnlFrac(r.pnl_chain, r.pnl_win, r.pnl_loss)
+
+
+def _PnlFrac(pnl_chain: Decimal, pnl_win: Decimal, pnl_loss: Decimal) -> Decimal:
+    denom = pnl_win if pnl_chain * pnl_win > 0 else -pnl_loss
+    return (pnl_chain / denom).quantize(Q) if denom else ZERO
 
 
 def TransactionsTableToChainsTable(
@@ -534,7 +908,10 @@ def TransactionsTableToChainsTable(
         "fees": ("fees", sum),
     }
 
-    transaction_map = transactions.recordlookupone("transaction_id")
+    log = functools.partial(timing.log_time, log_timings=logging.info, indent=1)
+
+    with log("reduce.lookup"):
+        transaction_map = transactions.recordlookupone("transaction_id")
     chain_map = {c.chain_id: c for c in chains_db.chains}
 
     chains_table = (
@@ -580,12 +957,14 @@ def TransactionsTableToChainsTable(
         .sort("maxdate")
     )
 
-    # Add a row marking transactions with the initial flag.
-    init_txns = set(
-        rec.transaction_id
-        for chain_row in chains_table.records()
-        for rec in chain_row.init_txns
-    )
+    # Add a row marking transactions with the initial flag. (Note: This
+    # evaluates the aggregation.)
+    with log("reduce.aggregate"):
+        init_txns = set(
+            rec.transaction_id
+            for chain_row in chains_table.records()
+            for rec in chain_row.init_txns
+        )
     itransactions = transactions.addfield(
         "init", lambda r: r.transaction_id in init_txns
     )
@@ -622,6 +1001,26 @@ def TransactionsTableToChainsTable(
     return chains_table, itransactions
 
 
+# Columns of the chains table which depend on the prices of the marks.
+MARK_COLUMNS = ["pnl_chain", "pnl_frac", "net_win", "net_liq", "net_loss"]
+
+
+def MarkValues(
+    pnl_chain: Decimal, net_liq: Decimal, pnl_win: Decimal, pnl_loss: Decimal
+) -> Tuple[Decimal, ...]:
+    """Compute the columns of a chain which depend on the prices of the marks,
+    in the order of `MARK_COLUMNS`, from the sum of the costs of its
+    transactions and of its Mark rows, each quantized. The values are the same
+    as those of `TransactionsTableToChainsTable()`."""
+    return (
+        pnl_chain,
+        _PnlFrac(pnl_chain, pnl_win, pnl_loss),
+        net_liq + (pnl_win - pnl_chain),
+        net_liq,
+        net_liq + (pnl_loss - pnl_chain),
+    )
+
+
 def ScrubConfig(transactions: Table, chains_db: Chains) -> Chains:
     """Update and clean configuration from the processed transactions table."""
 
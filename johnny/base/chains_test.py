@@ -3,11 +3,17 @@ __license__ = "GNU GPLv2"
 
 from datetime import datetime, timedelta
 from decimal import Decimal as D
-from typing import Any, List, Tuple
+from os import path
+from typing import Any, List, Optional, Tuple
 from functools import partial
+import logging
+import random
+import tempfile
 import unittest
+from unittest import mock
 
 from johnny.base import chains
+from johnny.base import config as configlib
 from johnny.base import match
 from johnny.base import instrument
 from johnny.base.etl import petl, Table
@@ -216,6 +222,210 @@ class TestChains(unittest.TestCase):
         )
 
 
+def random_transactions(
+    seed: int, num_rows: int, mark_time: Optional[datetime] = None
+) -> Table:
+    """Generate a random matched and expanded transactions log."""
+    rng = random.Random(seed)
+    symbols = [
+        "NKE",
+        "NKE_210815_C195",
+        "NKE_210815_C200",
+        "NKE_210915_C195",
+        "AAPL",
+        "AAPL_210815_P140",
+        "MSFT",
+        "MSFT_210915_C300",
+        "SPY_210815_P420",
+    ]
+    positions = {}
+    rows = []
+    dt = datetime(2021, 7, 1)
+    for index in range(num_rows):
+        dt += timedelta(seconds=rng.randint(1, 3600))
+        symbol = rng.choice(symbols)
+        position = positions.get(symbol, 0)
+        if position and rng.random() < 0.5:
+            quantity = abs(position)
+            instruction = "SELL" if position > 0 else "BUY"
+            effect = "CLOSING"
+        else:
+            quantity = rng.randint(1, 3)
+            instruction = "BUY" if position >= 0 else "SELL"
+            effect = "OPENING"
+        positions[symbol] = position + (quantity if instruction == "BUY" else -quantity)
+        order_id = "O{}".format(index // 2 if rng.random() < 0.3 else index)
+        rows.append(
+            (
+                "tos",
+                "T{}".format(index),
+                order_id,
+                dt,
+                "Trade",
+                instruction,
+                effect,
+                D(quantity),
+                symbol,
+                "",
+                None,
+                D("-1.00") * quantity,
+                ZERO,
+                ZERO,
+            )
+        )
+    header = (
+        "account",
+        "transaction_id",
+        "order_id",
+        "datetime",
+        "rowtype",
+        "instruction",
+        "effect",
+        "quantity",
+        "symbol",
+        "description",
+        "price",
+        "cost",
+        "commissions",
+        "fees",
+    )
+    return (
+        petl.wrap([header] + rows)
+        .applyfn(match.Process, mark_time)
+        .applyfn(instrument.Expand, "symbol")
+    )
+
+
+class TestGroupEngines(unittest.TestCase):
+    def check_equivalent(self, transactions: Table, chains_list: List[Any]):
+        expected = list(
+            chains.Group(transactions, chains_list, engine="networkx").values(
+                "chain_id"
+            )
+        )
+        actual = list(
+            chains.Group(transactions, chains_list, engine="disjoint").values(
+                "chain_id"
+            )
+        )
+        self.assertEqual(expected, actual)
+        return actual
+
+    def test_random(self):
+        for seed in range(10):
+            transactions = random_transactions(seed, 200)
+            chain_ids = self.check_equivalent(transactions, [])
+            self.assertGreater(len(set(chain_ids)), 1)
+
+    def test_explicit_and_final(self):
+        transactions = random_transactions(7, 200).cache()
+        transaction_ids = list(transactions.values("transaction_id"))
+
+        # Merge two otherwise unrelated clusters explicitly.
+        explicit = configlib.Chain(chain_id="explicit.chain")
+        explicit.ids.extend([transaction_ids[0], transaction_ids[-1]])
+
+        # Finalize the cluster of a transaction in the middle.
+        clustered = chains.Group(transactions, [])
+        final_id = list(clustered.values("chain_id"))[100]
+        final = configlib.Chain(chain_id=final_id, status=configlib.ChainStatus.FINAL)
+        final.ids.extend(
+            clustered.selecteq("chain_id", final_id).values("transaction_id")
+        )
+
+        chain_ids = self.check_equivalent(transactions, [explicit, final])
+        self.assertEqual("explicit.chain", chain_ids[0])
+        self.assertEqual("explicit.chain", chain_ids[-1])
+        self.assertEqual(final_id, chain_ids[100])
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            chains.Group(random_transactions(0, 10), [], engine="invalid")
+
+
+class TestGroupIncremental(unittest.TestCase):
+    mark_time = datetime(2021, 7, 20)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = path.join(self.tmpdir.name, "chains.state")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check_incremental(self, transactions: Table, chains_list: List[Any]) -> str:
+        """Check incremental clustering against a full one, returning the logs."""
+        expected = list(chains.Group(transactions, chains_list).values("chain_id"))
+        with self.assertLogs(level="INFO") as logs:
+            logging.info("Clustering")
+            actual = list(
+                chains.Group(
+                    transactions, chains_list, state_filename=self.filename
+                ).values("chain_id")
+            )
+        self.assertEqual(expected, actual)
+        return "\n".join(logs.output)
+
+    def test_incremental(self):
+        transactions = random_transactions(3, 100, self.mark_time)
+        self.assertNotIn("Replaying", self.check_incremental(transactions, []))
+        self.assertTrue(path.exists(self.filename))
+
+        # New transactions after the watermark are replayed.
+        transactions = random_transactions(3, 200, self.mark_time).cache()
+        self.assertIn("Replaying", self.check_incremental(transactions, []))
+
+        # Nothing has changed; only the marks are replayed.
+        num_marks = transactions.selecteq("rowtype", "Mark").nrows()
+        self.assertGreater(num_marks, 0)
+        self.assertIn(
+            f"Replaying {num_marks} transactions",
+            self.check_incremental(transactions, []),
+        )
+
+    def test_names_changed_components(self):
+        transactions = random_transactions(3, 200, self.mark_time).cache()
+        self.check_incremental(transactions, [])
+        clustered = chains.Group(transactions, []).cache()
+        marked = set(transactions.selecteq("rowtype", "Mark").values("transaction_id"))
+        marked_chain_ids = set(
+            clustered.selectin("transaction_id", marked).values("chain_id")
+        )
+        self.assertLess(len(marked_chain_ids), len(set(clustered.values("chain_id"))))
+
+        # Only the chains with marks are named again.
+        with mock.patch.object(
+            chains, "ChainName", wraps=chains.ChainName
+        ) as chain_name:
+            actual = chains.Group(transactions, [], state_filename=self.filename)
+            self.assertEqual(
+                list(clustered.values("chain_id")), list(actual.values("chain_id"))
+            )
+        self.assertEqual(len(marked_chain_ids), chain_name.call_count)
+
+    def test_history_changed(self):
+        self.check_incremental(random_transactions(3, 100, self.mark_time), [])
+        logs = self.check_incremental(random_transactions(4, 200, self.mark_time), [])
+        self.assertIn("History changed before watermark", logs)
+        self.assertNotIn("Replaying", logs)
+
+    def test_chains_changed(self):
+        transactions = random_transactions(3, 100, self.mark_time).cache()
+        self.check_incremental(transactions, [])
+
+        transaction_ids = list(transactions.values("transaction_id"))
+        explicit = configlib.Chain(chain_id="explicit.chain")
+        explicit.ids.extend([transaction_ids[0], transaction_ids[-1]])
+        logs = self.check_incremental(transactions, [explicit])
+        self.assertIn("Chains configuration changed", logs)
+
+    def test_invalid_state(self):
+        with open(self.filename, "w") as outfile:
+            outfile.write("garbage")
+        logs = self.check_incremental(random_transactions(3, 100, self.mark_time), [])
+        self.assertIn("Invalid clustering state", logs)
+
+
 class TestOpenChains(unittest.TestCase):
     def test_open_position(self):
         actual, expected = process(
@@ -0,0 +1,640 @@
+"""A columnar, memory-mappable on-disk format for our output tables.
+
+The transactions and chains tables produced by the import used to be stored as
+pickles of petl tables, which have to be deserialized row by row in their
+entirety before a single column can be looked at. This module stores a table as
+a single file of independent column buffers which are memory-mapped and decoded
+lazily, only when a column is accessed. The layout of a file is:
+
+  - An 8-byte magic string, `MAGIC`.
+  - An 8-byte little-endian unsigned length of the header.
+  - A JSON header with the number of rows and a list of column descriptions.
+  - The column buffers, each aligned to `ALIGN` bytes.
+
+Each column is stored according to the type of its values:
+
+  - `str`: Dictionary-encoded: int32 codes (-1 for None) into a dictionary of
+    unique strings, itself stored as int64 offsets into a UTF-8 buffer.
+  - `decimal`: Scaled integers: int64 values multiplied by 10^scale, where scale
+    is the largest number of decimal places in the column. The individual
+    exponents are stored as well if they aren't all the same, so that the
+    Decimal values are restored exactly, with the same representation.
+  - `int`, `bool`, `float`: int64, uint8 and float64 arrays, respectively.
+  - `date`: int32 proleptic Gregorian ordinals.
+  - `datetime`: int64 microseconds since the epoch (naive datetimes only).
+  - `object`: A pickle of the list of values, for anything else (e.g., mixed
+    types or lists of records). This is the fallback.
+
+Columns with missing values have an additional uint8 mask of the null rows.
+
+Files that don't begin with the magic string are assumed to be pickles written
+by `petl.topickle()` and are read as such, for compatibility with older outputs.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import datetime
+import decimal
+import io
+import mmap
+import os
+import pickle
+import struct
+
+import numpy as np
+import simplejson
+
+from johnny.base.etl import petl, Table
+
+
+MAGIC = b"JOHNCOL1"
+ALIGN = 64
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_INT64_MAX = (1 << 63) - 1
+
+# A context in which the coefficients of decimals are scaled exactly.
+_EXACT = decimal.Context(
+    prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN
+)
+
+
+class _Writer:
+    """Accumulate column buffers and their offsets relative to the data section."""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def add(self, array: np.ndarray) -> Dict[str, Any]:
+        """Append a buffer and return a reference to it for the header."""
+        offset = self.buf.tell()
+        padding = -offset % ALIGN
+        if padding:
+            self.buf.write(b"\0" * padding)
+            offset += padding
+        data = array.tobytes()
+        self.buf.write(data)
+        return {"offset": offset, "dtype": array.dtype.str, "count": len(array)}
+
+
+def _EncodeDecimals(
+    values: List[Decimal],
+) -> Optional[Tuple[int, List[int], List[int]]]:
+    """Convert Decimal values to (scale, scaled integers, exponents), or None if
+    they are not representable as 64-bit scaled integers."""
+    exponents = []
+    coefficients = []
+    for value in values:
+        exponent = value.as_tuple().exponent
+        if not isinstance(exponent, int):
+            return None  # NaN or infinity.
+        coefficients.append(int(value.scaleb(-exponent, _EXACT)))
+        exponents.append(exponent)
+    scale = max(0, -min(exponents))
+    scaled = [
+        coefficient * 10 ** (exponent + scale)
+        for coefficient, exponent in zip(coefficients, exponents)
+    ]
+    if any(abs(value) > _INT64_MAX for value in scaled):
+        return None
+    if any(not -128 <= exponent <= 127 for exponent in exponents):
+        return None
+    return scale, scaled, exponents
+
+
+def _EncodeColumn(writer: _Writer, name: str, values: List[Any]) -> Dict[str, Any]:
+    """Encode a single column of values."""
+    column = {"name": name}
+    nulls = [value is None for value in values]
+    present = [value for value in values if value is not None]
+    types = set(type(value) for value in present)
+    if any(nulls) and len(types) == 1:
+        column["nulls"] = writer.add(np.array(nulls, dtype=np.uint8))
+
+    vtype = next(iter(types)) if len(types) == 1 else None
+    if vtype is str:
+        dictionary = {}
+        codes = [
+            -1 if value is None else dictionary.setdefault(value, len(dictionary))
+            for value in values
+        ]
+        encoded = [string.encode("utf8") for string in dictionary]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+        column["kind"] = "str"
+        column["codes"] = writer.add(np.array(codes, dtype=np.int32))
+        column["dict_offsets"] = writer.add(offsets)
+        column["dict_data"] = writer.add(np.frombuffer(b"".join(encoded), np.uint8))
+        return column
+
+    if vtype is Decimal:
+        encoded = _EncodeDecimals(present)
+        if encoded is not None:
+            scale, scaled, exponents = encoded
+            fill = iter(scaled)
+            column["kind"] = "decimal"
+            column["scale"] = scale
+            column["values"] = writer.add(
+                np.array([0 if null else next(fill) for null in nulls], dtype=np.int64)
+            )
+            if len(set(exponents)) == 1:
+                column["exponent"] = exponents[0]
+            else:
+                fill = iter(exponents)
+                column["exponents"] = writer.add(
+                    np.array(
+                        [0 if null else next(fill) for null in nulls], dtype=np.int8
+                    )
+                )
+            # Negative zeros lose their sign as integers; record them explicitly.
+            column["negzeros"] = [
+                index
+                for index, value in enumerate(values)
+                if value is not None and value.is_zero() and value.is_signed()
+            ]
+            return column
+
+    elif vtype in {bool, int, float}:
+        if vtype is not int or all(abs(value) <= _INT64_MAX for value in present):
+            dtype = {bool: np.uint8, int: np.int64, float: np.float64}[vtype]
+            column["kind"] = vtype.__name__
+            column["values"] = writer.add(
+                np.array(
+                    [vtype() if value is None else value for value in values],
+                    dtype=dtype,
+                )
+            )
+            return column
+
+    elif vtype is datetime.date:
+        column["kind"] = "date"
+        column["values"] = writer.add(
+            np.array(
+                [1 if value is None else value.toordinal() for value in values],
+                dtype=np.int32,
+            )
+        )
+        return column
+
+    elif vtype is datetime.datetime and all(value.tzinfo is None for value in present):
+        column["kind"] = "datetime"
+        column["values"] = writer.add(
+            np.array(
+                [
+                    0 if value is None else (value - _EPOCH) // _MICROSECOND
+                    for value in values
+                ],
+                dtype=np.int64,
+            )
+        )
+        return column
+
+    # Fallback for everything else.
+    column.pop("nulls", None)
+    column["kind"] = "object"
+    column["values"] = writer.add(
+        np.frombuffer(pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL), np.uint8)
+    )
+    return column
+
+
+def Write(table: Table, filename: str) -> int:
+    """Write a table to a columnar file, atomically. Returns the number of rows
+    written."""
+    it = iter(table)
+    header = [str(field) for field in next(it)]
+    columns = [[] for _ in header]
+    appenders = [column.append for column in columns]
+    nrows = 0
+    for row in it:
+        for append, value in zip(appenders, row):
+            append(value)
+        nrows += 1
+
+    writer = _Writer()
+    encoded = [
+        _EncodeColumn(writer, name, values) for name, values in zip(header, columns)
+    ]
+    _WriteFile(filename, nrows, encoded, writer)
+    return nrows
+
+
+def Update(
+    filename: str, positions: Sequence[int], columns: Mapping[str, Sequence[Any]]
+) -> int:
+    """Replace the values of some of the rows of a columnar file, atomically.
+    `columns` maps the names of the columns to update to their new values at
+    `positions`. The buffers of the string and decimal columns are patched
+    without decoding them, and those of the other columns are copied as they
+    are; other kinds of columns are decoded and encoded again when updated.
+    Returns the number of rows."""
+    if not IsColumnar(filename):
+        raise ValueError(f"Not a columnar file: {filename}")
+    cfile = _ColumnarFile(filename)
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) and not 0 <= positions.min() <= positions.max() < cfile.nrows:
+        raise IndexError(f"Invalid positions for {cfile.nrows} rows")
+    for name, values in columns.items():
+        if name not in cfile.columns:
+            raise KeyError(name)
+        if len(values) != len(positions):
+            raise ValueError(
+                f"Invalid number of values for '{name}': "
+                f"{len(values)} != {len(positions)}"
+            )
+
+    writer = _Writer()
+    encoded = []
+    for name in cfile.fieldnames:
+        column = {
+            key: cfile.array(value) if isinstance(value, dict) else value
+            for key, value in cfile.columns[name].items()
+        }
+        if name in columns:
+            values = list(columns[name])
+            if not _PatchColumn(column, cfile.nrows, positions, values):
+                full = list(cfile.column(name))
+                for pos, value in zip(positions.tolist(), values):
+                    full[pos] = value
+                encoded.append(_EncodeColumn(writer, name, full))
+                continue
+        encoded.append(
+            {
+                key: writer.add(value) if isinstance(value, np.ndarray) else value
+                for key, value in column.items()
+            }
+        )
+    _WriteFile(filename, cfile.nrows, encoded, writer)
+    return cfile.nrows
+
+
+def _PatchColumn(
+    column: Dict[str, Any], nrows: int, positions: np.ndarray, values: List[Any]
+) -> bool:
+    """Patch the buffers of a column, given as arrays, with new values at some
+    positions. Returns false if the values cannot be encoded as the column is,
+    in which case the column is left untouched."""
+    kind = column["kind"]
+    if kind == "str":
+        if not all(value is None or isinstance(value, str) for value in values):
+            return False
+        _PatchStrings(column, positions, values)
+    elif kind == "decimal":
+        if not all(value is None or isinstance(value, Decimal) for value in values):
+            return False
+        if not _PatchDecimals(column, nrows, positions, values):
+            return False
+    else:
+        return False
+
+    nulls = [value is None for value in values]
+    if "nulls" in column:
+        column["nulls"] = column["nulls"].copy()
+        column["nulls"][positions] = nulls
+    elif any(nulls):
+        column["nulls"] = np.zeros(nrows, dtype=np.uint8)
+        column["nulls"][positions] = nulls
+    return True
+
+
+def _PatchStrings(column: Dict[str, Any], positions: np.ndarray, values: List[Any]):
+    """Patch the codes of a string column, extending its dictionary with new
+    strings."""
+    offsets = column["dict_offsets"].tolist()
+    data = column["dict_data"].tobytes()
+    codes = column["codes"].copy()
+
+    # Values which are the same as before keep their codes, and the dictionary
+    # is only searched for the others.
+    new_codes = codes[positions].tolist()
+    changed = [
+        index
+        for index, (code, value) in enumerate(zip(new_codes, values))
+        if value is None
+        or code == -1
+        or data[offsets[code] : offsets[code + 1]].decode("utf8") != value
+    ]
+    if not changed:
+        return
+
+    dictionary = {
+        data[offsets[index] : offsets[index + 1]].decode("utf8"): index
+        for index in range(len(offsets) - 1)
+    }
+    size = len(dictionary)
+    for index in changed:
+        value = values[index]
+        new_codes[index] = (
+            -1 if value is None else dictionary.setdefault(value, len(dictionary))
+        )
+    codes[positions] = new_codes
+    column["codes"] = codes
+    if len(dictionary) > size:
+        encoded = [string.encode("utf8") for string in dictionary]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+        column["dict_offsets"] = offsets
+        column["dict_data"] = np.frombuffer(b"".join(encoded), np.uint8)
+
+
+def _PatchDecimals(
+    column: Dict[str, Any], nrows: int, positions: np.ndarray, values: List[Any]
+) -> bool:
+    """Patch the scaled integers and exponents of a decimal column. The scale of
+    the column is increased if necessary. Returns false on overflow."""
+    present = [value for value in values if value is not None]
+    scale = column["scale"]
+    scaled, exponents = [], []
+    if present:
+        encoded = _EncodeDecimals(present)
+        if encoded is None:
+            return False
+        pscale, scaled, exponents = encoded
+        if pscale > scale:
+            factor = 10 ** (pscale - scale)
+            if factor > _INT64_MAX:
+                return False
+            if column["values"].size and (
+                np.abs(column["values"]).max() > _INT64_MAX // factor
+            ):
+                return False
+            column["values"] = column["values"] * factor
+            scale = pscale
+        else:
+            factor = 10 ** (scale - pscale)
+            scaled = [value * factor for value in scaled]
+            if any(abs(value) > _INT64_MAX for value in scaled):
+                return False
+        column["scale"] = scale
+
+    fill, fill_exponents = iter(scaled), iter(exponents)
+    nulls = [value is None for value in values]
+    column["values"] = column["values"].copy()
+    column["values"][positions] = [0 if null else next(fill) for null in nulls]
+    new_exponents = [0 if null else next(fill_exponents) for null in nulls]
+    if "exponent" in column and any(
+        exponent != column["exponent"] for exponent in exponents
+    ):
+        column["exponents"] = np.full(nrows, column.pop("exponent"), dtype=np.int8)
+    if "exponents" in column:
+        column["exponents"] = column["exponents"].copy()
+        column["exponents"][positions] = new_exponents
+
+    negzeros = set(column["negzeros"]).difference(positions.tolist())
+    negzeros.update(
+        pos
+        for pos, value in zip(positions.tolist(), values)
+        if value is not None and value.is_zero() and value.is_signed()
+    )
+    column["negzeros"] = sorted(negzeros)
+    return True
+
+
+def _WriteFile(
+    filename: str, nrows: int, columns: List[Dict[str, Any]], writer: _Writer
+):
+    """Write the header and the column buffers to a file."""
+    header_json = {"nrows": nrows, "columns": columns}
+    header_bytes = simplejson.dumps(header_json).encode("utf8")
+    prefix_size = len(MAGIC) + 8 + len(header_bytes)
+    padding = -prefix_size % ALIGN
+    # Write to a temporary file and rename it, so that readers never observe a
+    # partially written file. This also leaves the files of existing readers,
+    # which may have it memory-mapped, untouched.
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as outfile:
+        outfile.write(MAGIC)
+        outfile.write(struct.pack("<Q", len(header_bytes) + padding))
+        outfile.write(header_bytes)
+        outfile.write(b" " * padding)
+        outfile.write(writer.buf.getbuffer())
+    os.replace(tmp_filename, filename)
+
+
+def IsColumnar(filename: str) -> bool:
+    """Return true if the file is in the columnar format."""
+    with open(filename, "rb") as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+
+def Read(filename: str) -> Table:
+    """Open a table file. Columns are decoded lazily, as they are accessed.
+    Pickled petl tables from older imports are read as such."""
+    if not IsColumnar(filename):
+        return petl.frompickle(filename)
+    return ColumnarTable(_ColumnarFile(filename))
+
+
+class _ColumnarFile:
+    """A memory-mapped columnar file and a cache of its decoded columns. The
+    cached columns are tuples, so that callers can't alter them."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, "rb") as infile:
+            self.mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        (header_size,) = struct.unpack_from("<Q", self.mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = simplejson.loads(bytes(self.mmap[start : start + header_size]))
+        self.data_offset = start + header_size
+        self.nrows = self.header["nrows"]
+        self.columns = {column["name"]: column for column in self.header["columns"]}
+        self.fieldnames = tuple(column["name"] for column in self.header["columns"])
+        self.cache: Dict[str, Tuple[Any, ...]] = {}
+
+    def array(self, ref: Dict[str, Any]) -> np.ndarray:
+        """Return a zero-copy array over one of the buffers."""
+        return np.frombuffer(
+            self.mmap,
+            dtype=np.dtype(ref["dtype"]),
+            count=ref["count"],
+            offset=self.data_offset + ref["offset"],
+        )
+
+    def raw(self, name: str) -> np.ndarray:
+        """Return the raw encoded values of a column, without decoding them.
+        This is the scaled integers for decimals and the codes for strings."""
+        column = self.columns[name]
+        return self.array(column["codes" if column["kind"] == "str" else "values"])
+
+    def dictionary(self, name: str, codes: Optional[Iterable[int]] = None) -> List[str]:
+        """Return the strings which the raw codes of a string column index, all of
+        them or only those of some codes."""
+        column = self.columns[name]
+        if column["kind"] != "str":
+            raise ValueError(f"Not a string column: '{name}'")
+        offsets = self.array(column["dict_offsets"]).tolist()
+        data = self.array(column["dict_data"]).tobytes()
+        if codes is None:
+            codes = range(len(offsets) - 1)
+        return [
+            data[offsets[code] : offsets[code + 1]].decode("utf8") for code in codes
+        ]
+
+    def scale(self, name: str) -> int:
+        """Return the scale of the raw values of a decimal column: they are the
+        values multiplied by 10^scale."""
+        column = self.columns[name]
+        if column["kind"] != "decimal":
+            raise ValueError(f"Not a decimal column: '{name}'")
+        return column["scale"]
+
+    def column(self, name: str) -> Tuple[Any, ...]:
+        """Return the decoded values of a column."""
+        values = self.cache.get(name)
+        if values is None:
+            values = self.cache[name] = tuple(self._decode(self.columns[name]))
+        return values
+
+    def take(self, name: str, positions: np.ndarray) -> List[Any]:
+        """Return the decoded values of a column at some positions. Only those
+        values are decoded, unless the column is already."""
+        values = self.cache.get(name)
+        if values is not None:
+            return [values[pos] for pos in positions.tolist()]
+        return self._decode(self.columns[name], positions)
+
+    def _decode(
+        self, column: Dict[str, Any], positions: Optional[np.ndarray] = None
+    ) -> List[Any]:
+        def array(ref: Dict[str, Any]) -> np.ndarray:
+            values = self.array(ref)
+            return values if positions is None else values[positions]
+
+        kind = column["kind"]
+        if kind == "object":
+            values = pickle.loads(self.array(column["values"]).tobytes())
+            if positions is None:
+                return values
+            return [values[pos] for pos in positions.tolist()]
+
+        if kind == "str":
+            codes = array(column["codes"]).tolist()
+            offsets = self.array(column["dict_offsets"]).tolist()
+            data = self.array(column["dict_data"]).tobytes()
+            if positions is None:
+                dictionary = [
+                    data[offsets[index] : offsets[index + 1]].decode("utf8")
+                    for index in range(len(offsets) - 1)
+                ]
+                dictionary.append(None)  # Code -1.
+            else:
+                # Only decode the strings which are used.
+                dictionary = {
+                    code: data[offsets[code] : offsets[code + 1]].decode("utf8")
+                    for code in set(codes)
+                    if code != -1
+                }
+                dictionary[-1] = None
+            return [dictionary[code] for code in codes]
+
+        raw = array(column["values"]).tolist()
+        if kind == "decimal":
+            scale = column["scale"]
+            if "exponents" in column:
+                exponents = array(column["exponents"]).tolist()
+            else:
+                exponents = [column["exponent"]] * len(raw)
+            quanta = {}
+            values = []
+            for value, exponent in zip(raw, exponents):
+                number = Decimal(value).scaleb(-scale)
+                if exponent != -scale:
+                    quantum = quanta.get(exponent)
+                    if quantum is None:
+                        quantum = quanta[exponent] = Decimal(1).scaleb(exponent)
+                    number = number.quantize(quantum)
+                values.append(number)
+            negzeros = column["negzeros"]
+            if positions is not None and negzeros:
+                negzeros = np.flatnonzero(np.isin(positions, negzeros)).tolist()
+            for index in negzeros:
+                values[index] = values[index].copy_negate()
+        elif kind == "bool":
+            values = [bool(value) for value in raw]
+        elif kind == "date":
+            fromordinal = datetime.date.fromordinal
+            values = [fromordinal(value) for value in raw]
+        elif kind == "datetime":
+            values = [_EPOCH + value * _MICROSECOND for value in raw]
+        else:
+            values = raw
+
+        if "nulls" in column:
+            for index in np.flatnonzero(array(column["nulls"])).tolist():
+                values[index] = None
+        return values
+
+
+class ColumnarTable(petl.Table):
+    """A petl table over some of the columns of a columnar file.
+
+    Accessing a subset of the columns, via `cut()`, `cutout()` or `values()`,
+    only decodes those columns. Any other petl operation works as usual, via
+    iteration over the rows.
+    """
+
+    def __init__(self, cfile: _ColumnarFile, fieldnames: Optional[Tuple[str]] = None):
+        self.cfile = cfile
+        self.flds = cfile.fieldnames if fieldnames is None else tuple(fieldnames)
+
+    def __iter__(self):
+        yield self.flds
+        if self.flds:
+            yield from zip(*[self.cfile.column(name) for name in self.flds])
+        else:
+            yield from (() for _ in range(self.cfile.nrows))
+
+    def header(self):
+        return self.flds
+
+    def fieldnames(self):
+        return self.flds
+
+    def nrows(self):
+        return self.cfile.nrows
+
+    def column(self, name: str) -> Tuple[Any, ...]:
+        """Return the decoded values for a column."""
+        return self.cfile.column(name)
+
+    def raw(self, name: str) -> np.ndarray:
+        """Return the undecoded array for a column, see `_ColumnarFile.raw()`."""
+        return self.cfile.raw(name)
+
+    def dictionary(self, name: str, codes: Optional[Iterable[int]] = None) -> List[str]:
+        """Return the strings of the codes of a string column, see
+        `_ColumnarFile.dictionary()`."""
+        return self.cfile.dictionary(name, codes)
+
+    def scale(self, name: str) -> int:
+        """Return the scale of a decimal column, see `_ColumnarFile.scale()`."""
+        return self.cfile.scale(name)
+
+    def take(self, positions: Sequence[int]) -> Table:
+        """Return a table of the rows at the given positions, in that order.
+        Only their values are decoded."""
+        positions = np.asarray(positions, dtype=np.intp)
+        columns = [self.cfile.take(name, positions) for name in self.flds]
+        return petl.wrap([self.flds] + list(zip(*columns)))
+
+    def values(self, *field, **kwargs):
+        if len(field) == 1 and not kwargs and field[0] in self.flds:
+            return self.cfile.column(field[0])
+        return super().values(*field, **kwargs)
+
+    def cut(self, *args, **kwargs):
+        if not kwargs and args and all(arg in self.flds for arg in args):
+            return ColumnarTable(self.cfile, args)
+        return super().cut(*args, **kwargs)
+
+    def cutout(self, *args, **kwargs):
+        if not kwargs and all(arg in self.flds for arg in args):
+            return ColumnarTable(
+                self.cfile, [name for name in self.flds if name not in args]
+            )
+        return super().cutout(*args, **kwargs)
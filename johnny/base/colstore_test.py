@@ -0,0 +1,257 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+import datetime
+import os
+import tempfile
+import unittest
+
+from johnny.base import colstore
+from johnny.base.etl import petl
+
+
+ROWS = [
+    ("account", "cost", "quantity", "open", "date", "datetime", "ratio", "extra"),
+    (
+        "x1234",
+        Decimal("-1.50"),
+        1,
+        True,
+        datetime.date(2021, 1, 2),
+        datetime.datetime(2021, 1, 2, 3, 4, 5, 6),
+        1.5,
+        [1, 2],
+    ),
+    (None, Decimal("-0.0"), None, False, None, None, None, "s"),
+    (
+        "x1234",
+        Decimal("3"),
+        -5,
+        None,
+        datetime.date(2020, 1, 1),
+        datetime.datetime(1960, 1, 1),
+        2.0,
+        None,
+    ),
+    (
+        "tasty",
+        None,
+        7,
+        True,
+        datetime.date(2020, 1, 1),
+        datetime.datetime(2022, 1, 1),
+        None,
+        None,
+    ),
+]
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = path.join(self.tmpdir.name, "table.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def roundtrip(self, rows):
+        colstore.Write(petl.wrap(rows), self.filename)
+        return colstore.Read(self.filename)
+
+    def assertIdentical(self, expected, actual):
+        # Compare representations, to catch differing Decimal exponents and signs.
+        self.assertEqual(
+            [tuple(map(repr, row)) for row in expected],
+            [tuple(map(repr, row)) for row in actual],
+        )
+
+    def test_roundtrip(self):
+        table = self.roundtrip(ROWS)
+        self.assertTrue(colstore.IsColumnar(self.filename))
+        self.assertIdentical(ROWS, table)
+        kinds = {
+            column["name"]: column["kind"] for column in table.cfile.columns.values()
+        }
+        self.assertEqual(
+            {
+                "account": "str",
+                "cost": "decimal",
+                "quantity": "int",
+                "open": "bool",
+                "date": "date",
+                "datetime": "datetime",
+                "ratio": "float",
+                "extra": "object",
+            },
+            kinds,
+        )
+
+    def test_empty(self):
+        rows = [("a", "b")]
+        self.assertIdentical(rows, self.roundtrip(rows))
+
+    def test_decimal_exponents(self):
+        rows = [
+            ("amount",),
+            (Decimal("1E+2"),),
+            (Decimal("0.001"),),
+            (Decimal("-0"),),
+            (Decimal("12.30"),),
+        ]
+        self.assertIdentical(rows, self.roundtrip(rows))
+
+    def test_decimal_overflow(self):
+        rows = [("amount",), (Decimal("12345678901234567890123"),), (Decimal("1"),)]
+        table = self.roundtrip(rows)
+        self.assertIdentical(rows, table)
+        self.assertEqual("object", table.cfile.columns["amount"]["kind"])
+
+    def test_mixed_types(self):
+        rows = [("value",), (1,), ("a",), (Decimal("2"),)]
+        self.assertIdentical(rows, self.roundtrip(rows))
+
+    def test_columns(self):
+        table = self.roundtrip(ROWS)
+        self.assertEqual(4, table.nrows())
+        self.assertEqual(ROWS[0], table.header())
+        self.assertEqual(
+            [Decimal("-1.50"), Decimal("-0.0"), Decimal("3"), None],
+            list(table.values("cost")),
+        )
+        self.assertEqual([1, None, -5, 7], list(table.values("quantity")))
+        # The cached columns can't be altered by callers.
+        self.assertIsInstance(table.values("quantity"), tuple)
+        self.assertEqual([1, 0, -5, 7], table.raw("quantity").tolist())
+
+        cut = table.cut("quantity", "account")
+        self.assertIsInstance(cut, colstore.ColumnarTable)
+        self.assertEqual(
+            [
+                ("quantity", "account"),
+                (1, "x1234"),
+                (None, None),
+                (-5, "x1234"),
+                (7, "tasty"),
+            ],
+            list(cut),
+        )
+        cutout = table.cutout("extra", "ratio")
+        self.assertEqual(ROWS[0][:-2], cutout.header())
+        self.assertEqual([row[:-2] for row in ROWS], list(cutout))
+
+        # Only the accessed columns are decoded.
+        self.assertEqual(
+            {"cost", "quantity", "account", "open", "date", "datetime"},
+            set(table.cfile.cache),
+        )
+
+        # Regular petl operations still apply.
+        self.assertEqual(
+            [("account", "quantity"), ("x1234", 1), ("x1234", -5)],
+            list(table.selecteq("account", "x1234").cut("account", "quantity")),
+        )
+
+    def test_dictionary(self):
+        table = self.roundtrip(ROWS)
+        self.assertEqual([0, -1, 0, 1], table.raw("account").tolist())
+        self.assertEqual(["x1234", "tasty"], table.dictionary("account"))
+        self.assertEqual(["tasty", "tasty"], table.dictionary("account", [1, 1]))
+        self.assertEqual([], table.dictionary("account", []))
+        with self.assertRaises(ValueError):
+            table.dictionary("cost")
+
+    def test_scale(self):
+        table = self.roundtrip(ROWS)
+        self.assertEqual(2, table.scale("cost"))
+        self.assertEqual([-150, 0, 300, 0], table.raw("cost").tolist())
+        with self.assertRaises(ValueError):
+            table.scale("account")
+
+    def test_overwrite(self):
+        # Readers of the previous file still see its contents after a rewrite.
+        old_table = self.roundtrip(ROWS)
+        new_rows = [("value",), (1,)]
+        new_table = self.roundtrip(new_rows)
+        self.assertIdentical(ROWS, old_table)
+        self.assertIdentical(new_rows, new_table)
+        self.assertEqual(["table.db"], os.listdir(self.tmpdir.name))
+
+    def test_take(self):
+        table = self.roundtrip(ROWS)
+        positions = [2, 1, 2]
+        expected = [ROWS[0]] + [ROWS[1 + pos] for pos in positions]
+        self.assertIdentical(expected, table.take(positions))
+        self.assertIdentical([ROWS[0]], table.take([]))
+        # Columns already decoded are reused.
+        table.values("cost")
+        self.assertIdentical(expected, table.take(positions))
+
+    def assertUpdate(self, rows, positions, columns):
+        # Compare the patched file to a file written from the patched rows.
+        colstore.Write(petl.wrap(rows), self.filename)
+        self.assertEqual(
+            len(rows) - 1, colstore.Update(self.filename, positions, columns)
+        )
+        expected = [list(row) for row in rows]
+        for name, values in columns.items():
+            index = rows[0].index(name)
+            for pos, value in zip(positions, values):
+                expected[1 + pos][index] = value
+        self.assertIdentical(expected, colstore.Read(self.filename))
+        self.assertEqual(["table.db"], os.listdir(self.tmpdir.name))
+
+    def test_update(self):
+        self.assertUpdate(
+            ROWS,
+            [3, 0],
+            {
+                "account": ["y", None],
+                "cost": [Decimal("-0.00"), Decimal("1.5")],
+                "quantity": [8, 9],
+                "extra": [None, "z"],
+            },
+        )
+
+    def test_update_none(self):
+        self.assertUpdate(ROWS, [], {"cost": [], "account": []})
+        self.assertUpdate(ROWS, [1], {"account": ["new"], "cost": [Decimal("2")]})
+
+    def test_update_decimals(self):
+        rows = [("cost",)] + [(Decimal("1.00"),), (Decimal("-2.50"),), (None,)]
+        # Same exponent, a new exponent, a larger scale and a null.
+        self.assertUpdate(rows, [0], {"cost": [Decimal("3.25")]})
+        self.assertUpdate(rows, [0, 2], {"cost": [Decimal("3"), Decimal("-0")]})
+        self.assertUpdate(rows, [1], {"cost": [Decimal("0.000001")]})
+        self.assertUpdate(rows, [0, 1], {"cost": [None, Decimal("7.0")]})
+        # Values which don't fit the encoding of the column.
+        self.assertUpdate(rows, [0], {"cost": [Decimal("1e-20")]})
+        self.assertUpdate(rows, [0], {"cost": ["text"]})
+
+    def test_update_strings(self):
+        rows = [("name",)] + [("a",), ("b",), ("a",)]
+        self.assertUpdate(rows, [1, 2], {"name": ["c", None]})
+        self.assertUpdate(rows, [0, 1, 2], {"name": ["b", "a", "éé"]})
+        self.assertUpdate(rows, [0], {"name": [1]})
+
+    def test_update_invalid(self):
+        colstore.Write(petl.wrap(ROWS), self.filename)
+        with self.assertRaises(KeyError):
+            colstore.Update(self.filename, [0], {"missing": [1]})
+        with self.assertRaises(ValueError):
+            colstore.Update(self.filename, [0, 1], {"cost": [Decimal("1")]})
+        with self.assertRaises(IndexError):
+            colstore.Update(self.filename, [4], {"cost": [Decimal("1")]})
+        petl.wrap(ROWS).topickle(self.filename)
+        with self.assertRaises(ValueError):
+            colstore.Update(self.filename, [0], {"cost": [Decimal("1")]})
+
+    def test_read_pickle(self):
+        petl.wrap(ROWS).topickle(self.filename)
+        self.assertFalse(colstore.IsColumnar(self.filename))
+        self.assertIdentical(ROWS, colstore.Read(self.filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
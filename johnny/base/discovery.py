@@ -7,9 +7,10 @@ type in a bungled directory of downloads. For now.
 __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
+from concurrent import futures
 from decimal import Decimal
 from os import path
-from typing import Any, Dict, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 import collections
 import glob
 import importlib
@@ -21,6 +22,7 @@ from johnny.base.etl import petl, Table
 from johnny.base import instrument
 from johnny.base import transactions as txnlib
 from johnny.base import config as configlib
+from johnny.base import manifest
 from johnny.base.config import Account
 
 
@@ -82,47 +84,143 @@ def ReadInitialPositions(filename: str) -> Table:
     return table
 
 
-def ImportConfiguredInputs(
-    config: configlib.Config, filter_logtypes: Optional[Set['LogType']] = None
-) -> Dict[int, Table]:
-    """Read the explicitly configured inputs in the config file.
-    Returns tables for the transactions and positions."""
-
-    # Parse and accumulate by log type.
-    tablemap = collections.defaultdict(list)
+def ImportAccount(
+    account: configlib.Account, config: configlib.Config, logtype: int
+) -> Optional[Table]:
+    """Import and normalize the given log type from a single account source.
+    Returns None if the source produced nothing."""
+
+    tables = []
+
+    # Incorporate initial positions.
+    if logtype == Account.TRANSACTIONS and account.initial:
+        table = ReadInitialPositions(account.initial)
+        if table is not None:
+            tables.append(table.update("account", account.nickname))
+
+    # Import module transactions.
+    module = importlib.import_module(account.module)
+    table = module.Import(account.source, config, logtype)
+    if table is not None:
+        # Filter out instrument types.
+        if account.exclude_instrument_types:
+            exclude_instrument_types = set(
+                configlib.InstrumentType.Name(instype)
+                for instype in account.exclude_instrument_types
+            )
+            table = (
+                table.applyfn(instrument.Expand, "symbol")
+                .selectnotin("instype", exclude_instrument_types)
+                .applyfn(instrument.Shrink)
+            )
+
+        if "account" in table.fieldnames():
+            table = table.update("account", account.nickname)
+        tables.append(table)
+
+    if not tables:
+        return None
+    return tables[0] if len(tables) == 1 else petl.cat(*tables)
+
+
+def _ImportAccountRows(
+    account: configlib.Account, config: configlib.Config, logtype: int
+) -> Optional[List[tuple]]:
+    """Import an account source and materialize its rows, header first. This is
+    run in worker processes; lazy tables cannot be sent back across processes."""
+    table = ImportAccount(account, config, logtype)
+    return None if table is None else list(table)
+
+
+def _ImportSources(
+    config: configlib.Config,
+    filter_logtypes: Optional[Set["LogType"]] = None,
+    use_cache: bool = True,
+    num_workers: Optional[int] = None,
+) -> List[Tuple[int, Table]]:
+    """Import the configured sources. Returns a list of (logtype, table) for each
+    source that produced a table, in configuration order.
+
+    If the configuration has an import cache, sources whose files haven't
+    changed since they were last normalized are read from the cache. Set
+    `use_cache` to False in order to ignore the cached tables (they get
+    refreshed nonetheless).
+
+    The sources that need to be normalized are processed in a pool of up to
+    `num_workers` processes (defaults to `input.import_workers` from the
+    config). With a single worker they are imported sequentially in this process.
+    """
+    cache_dir = config.output.import_cache
+    import_manifest = manifest.ImportManifest(cache_dir) if cache_dir else None
+    if num_workers is None:
+        num_workers = config.input.import_workers
+
+    # Figure out which sources need to be imported and load the others from the
+    # cache. Slots are kept in configuration order.
+    slots = []
+    pending = []
     for account in config.input.accounts:
         for logtype in account.logtype:
             if filter_logtypes and logtype not in filter_logtypes:
                 continue
-            output_tables = tablemap[logtype]
-
-            # Incorporate initial positions.
-            if logtype == Account.TRANSACTIONS and account.initial:
-                table = ReadInitialPositions(account.initial)
-                if table is not None:
-                    output_tables.append(table.update("account", account.nickname))
 
-            # Import module transactions.
-            module = importlib.import_module(account.module)
-            table = module.Import(account.source, config, logtype)
+            key, filename, fingerprint, table = None, None, None, None
+            if import_manifest is not None:
+                key = import_manifest.key(account, logtype)
+                filename = GetLatestFile(account.source)
+                fingerprint = manifest.GetFingerprint(account, logtype, filename)
+                if use_cache:
+                    table = import_manifest.lookup(key, fingerprint)
+            slot = [logtype, table]
+            slots.append(slot)
             if table is None:
-                continue
+                pending.append((slot, account, key, filename, fingerprint))
+
+    # Normalize the remaining sources, in parallel if requested.
+    if num_workers > 1 and len(pending) > 1:
+        with futures.ProcessPoolExecutor(
+            max_workers=min(num_workers, len(pending))
+        ) as executor:
+            jobs = [
+                executor.submit(_ImportAccountRows, account, config, slot[0])
+                for slot, account, _, _, _ in pending
+            ]
+            tables = [
+                None if rows is None else petl.wrap(rows)
+                for rows in (job.result() for job in jobs)
+            ]
+    else:
+        tables = [
+            ImportAccount(account, config, slot[0])
+            for slot, account, _, _, _ in pending
+        ]
+    for (slot, _, key, filename, fingerprint), table in zip(pending, tables):
+        if import_manifest is not None:
+            table = import_manifest.store(key, fingerprint, filename, table)
+        slot[1] = table
+
+    if import_manifest is not None:
+        import_manifest.save()
+
+    return [(logtype, table) for logtype, table in slots if table is not None]
 
-            # Filter out instrument types.
-            if account.exclude_instrument_types:
-                exclude_instrument_types = set(
-                    configlib.InstrumentType.Name(instype)
-                    for instype in account.exclude_instrument_types
-                )
-                table = (
-                    table.applyfn(instrument.Expand, "symbol")
-                    .selectnotin("instype", exclude_instrument_types)
-                    .applyfn(instrument.Shrink)
-                )
-
-            if "account" in table.fieldnames():
-                table = table.update("account", account.nickname)
-            output_tables.append(table)
+
+def ImportConfiguredInputs(
+    config: configlib.Config,
+    filter_logtypes: Optional[Set["LogType"]] = None,
+    use_cache: bool = True,
+    num_workers: Optional[int] = None,
+) -> Dict[int, Table]:
+    """Read the explicitly configured inputs in the config file.
+    Returns tables for the transactions and positions. See `_ImportSources()`
+    for the caching and parallelism options."""
+
+    # Accumulate by log type.
+    tablemap = collections.defaultdict(list)
+    for logtype, table in _ImportSources(
+        config, filter_logtypes, use_cache, num_workers
+    ):
+        tablemap[logtype].append(table)
 
     # Concatenate tables for each logtype.
     bytype = {}
@@ -136,3 +234,20 @@ def ImportConfiguredInputs(
             bytype[t_logtype] = table
 
     return bytype
+
+
+def ImportTransactionStreams(
+    config: configlib.Config,
+    use_cache: bool = True,
+    num_workers: Optional[int] = None,
+) -> List[Table]:
+    """Read the configured transactions sources, as a list of tables, one per
+    source, each sorted by (datetime, account). This is suitable for a k-way
+    merge, e.g. in `match.Process()`, without sorting the entire log. See
+    `_ImportSources()` for the caching and parallelism options."""
+    return [
+        table.sort(("datetime", "account"))
+        for _, table in _ImportSources(
+            config, {Account.TRANSACTIONS}, use_cache, num_workers
+        )
+    ]
@@ -0,0 +1,82 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from os import path
+from unittest import mock
+import tempfile
+import unittest
+
+from johnny.base import config as configlib
+from johnny.base import discovery
+from johnny.base.etl import petl, Table
+
+
+def Import(filename: str, config: configlib.Config, logtype: int) -> Table:
+    """A minimal importer for the tests, reading a CSV file as it is. This is
+    imported by name in the worker processes."""
+    return petl.fromcsv(filename)
+
+
+class TestImportSources(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config = configlib.Config()
+        self.config.output.import_cache = path.join(self.tmpdir.name, "cache")
+        for nickname in "tasty", "x1234", "x5678":
+            filename = path.join(self.tmpdir.name, f"{nickname}.csv")
+            self.write(filename, nickname, 3)
+            account = self.config.input.accounts.add()
+            account.nickname = nickname
+            account.logtype.append(configlib.Account.TRANSACTIONS)
+            account.module = __name__
+            account.source = filename
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, filename: str, nickname: str, num_rows: int):
+        rows = [("account", "transaction_id")]
+        rows.extend((nickname, f"{nickname}-{index}") for index in range(num_rows))
+        petl.wrap(rows).tocsv(filename)
+
+    def import_sources(self, config: configlib.Config, num_workers: int):
+        return [
+            (logtype, list(table))
+            for logtype, table in discovery._ImportSources(
+                config, num_workers=num_workers
+            )
+        ]
+
+    def test_process_pool(self):
+        serial_config = configlib.Config()
+        serial_config.CopyFrom(self.config)
+        serial_config.output.ClearField("import_cache")
+        expected = self.import_sources(serial_config, 1)
+        self.assertEqual(3, len(expected))
+        self.assertEqual(expected, self.import_sources(self.config, 2))
+
+        # The second run reuses the cached tables without starting a pool.
+        with mock.patch.object(
+            discovery.futures, "ProcessPoolExecutor"
+        ) as executor, mock.patch.object(discovery, "ImportAccount") as import_account:
+            self.assertEqual(expected, self.import_sources(self.config, 2))
+        executor.assert_not_called()
+        import_account.assert_not_called()
+
+        # Only the changed sources are imported again, in the pool, and the
+        # tables are kept in configuration order.
+        for account in self.config.input.accounts[1:]:
+            self.write(account.source, account.nickname, 4)
+        expected = self.import_sources(serial_config, 1)
+        with mock.patch.object(
+            discovery.futures,
+            "ProcessPoolExecutor",
+            wraps=discovery.futures.ProcessPoolExecutor,
+        ) as executor:
+            self.assertEqual(expected, self.import_sources(self.config, 2))
+        executor.assert_called_once_with(max_workers=2)
+        self.assertEqual([4, 5, 5], [len(rows) for _, rows in expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
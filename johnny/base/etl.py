@@ -4,7 +4,21 @@ __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
 from decimal import Decimal
-from typing import Any, List, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+import collections
+import heapq
+import operator
 
 import petl
 import petl.config
@@ -28,6 +42,127 @@ def WrapRecords(records: List[Record]) -> Table:
     return petl.wrap([records[0].flds] + records)
 
 
+class MergeSortedView(petl.Table):
+    """A lazy, stable k-way merge of tables already sorted by the same key. This
+    is equivalent to concatenating the tables and stable-sorting the result, but
+    in a single streaming pass and without buffering any rows."""
+
+    def __init__(self, tables: Sequence[Table], key: Union[str, Tuple[str, ...]]):
+        self.tables = tables
+        self.key = (key,) if isinstance(key, str) else tuple(key)
+
+    def __iter__(self):
+        iterators = [iter(table) for table in self.tables]
+        headers = [tuple(next(it, ())) for it in iterators]
+
+        # Gather all the fields in order, like petl.cat().
+        header = []
+        for theader in headers:
+            header.extend(field for field in theader if field not in header)
+        header = tuple(header)
+        yield header
+
+        # Reorder the columns of the tables whose header differs.
+        streams = [
+            it if theader == header else _ReorderRows(it, theader, header)
+            for theader, it in zip(headers, iterators)
+        ]
+
+        getkey = operator.itemgetter(*[header.index(field) for field in self.key])
+        yield from heapq.merge(*streams, key=getkey)
+
+
+def _ReorderRows(rows, header, new_header):
+    """Reorder the columns of rows to a new header, filling missing ones with None."""
+    indexes = [header.index(field) if field in header else None for field in new_header]
+    for row in rows:
+        yield tuple(None if index is None else row[index] for index in indexes)
+
+
+def MergeSorted(tables: Sequence[Table], key: Union[str, Tuple[str, ...]]) -> Table:
+    """Merge tables, each already sorted by `key`, into a single sorted table."""
+    return MergeSortedView(tables, key)
+
+
+class IndexedTable(petl.Table):
+    """A table materialized in memory as a list of tuples, with hash indexes over
+    some of its columns. Selecting the rows for some keys of an index costs
+    O(result) instead of a full scan of the table.
+
+    Indexes are specified by name, as either a field name, or a pair of a field
+    name and a function of its value computing the key. If the function returns
+    a list, the row is indexed under each of its elements.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        indexes: Optional[
+            Mapping[str, Union[str, Tuple[str, Callable[[Any], Any]]]]
+        ] = None,
+    ):
+        it = iter(table)
+        self.flds = tuple(next(it, ()))
+        self.datarows = [tuple(row) for row in it]
+        # Maps of index name to key to the positions of its rows.
+        self.indexes: Dict[str, Dict[Any, List[int]]] = {}
+        for name, spec in (indexes or {}).items():
+            field, function = (spec, None) if isinstance(spec, str) else spec
+            self.indexes[name] = self._build_index(self.flds.index(field), function)
+
+    def _build_index(
+        self, column: int, function: Optional[Callable[[Any], Any]]
+    ) -> Dict[Any, List[int]]:
+        index = collections.defaultdict(list)
+        for position, row in enumerate(self.datarows):
+            key = row[column] if function is None else function(row[column])
+            if isinstance(key, list):
+                for subkey in key:
+                    index[subkey].append(position)
+            else:
+                index[key].append(position)
+        return dict(index)
+
+    def __iter__(self):
+        yield self.flds
+        yield from self.datarows
+
+    def header(self):
+        return self.flds
+
+    def fieldnames(self):
+        return self.flds
+
+    def nrows(self):
+        return len(self.datarows)
+
+    def values(self, *field, **kwargs):
+        if len(field) == 1 and not kwargs and field[0] in self.flds:
+            column = self.flds.index(field[0])
+            return [row[column] for row in self.datarows]
+        return super().values(*field, **kwargs)
+
+    def keys(self, name: str) -> List[Any]:
+        """Return the distinct keys of an index."""
+        return list(self.indexes[name])
+
+    def keypositions(self, name: str, *keys: Any) -> List[int]:
+        """Return the positions of the rows for the given keys of an index, in
+        table order."""
+        index = self.indexes[name]
+        if len(keys) == 1:
+            return index.get(keys[0], [])
+        # Rows may be indexed under multiple keys, and must appear once.
+        return sorted({pos for key in keys for pos in index.get(key, ())})
+
+    def selectkey(self, name: str, *keys: Any) -> Table:
+        """Select the rows for the given keys of an index, in table order."""
+        datarows = self.datarows
+        return petl.wrap(
+            [self.flds] + [datarows[pos] for pos in self.keypositions(name, *keys)]
+        )
+
+
 def PrintGroups(table: Table, column: str):
     """Debug print groups of a table."""
 
@@ -0,0 +1,64 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import datetime
+import unittest
+
+from johnny.base.etl import petl, IndexedTable
+
+
+class TestIndexedTable(unittest.TestCase):
+    def setUp(self):
+        self.source = petl.wrap(
+            [
+                ("chain_id", "datetime", "underlyings"),
+                ("a", datetime.datetime(2021, 1, 4, 10, 0), "SPY"),
+                ("b", datetime.datetime(2021, 1, 4, 11, 0), "QQQ,SPY"),
+                ("a", datetime.datetime(2021, 1, 5, 10, 0), "SPY"),
+                ("c", datetime.datetime(2021, 1, 6, 10, 0), "IWM"),
+            ]
+        )
+        self.table = IndexedTable(
+            self.source,
+            {
+                "chain_id": "chain_id",
+                "date": ("datetime", datetime.datetime.date),
+                "underlying": ("underlyings", lambda value: value.split(",")),
+            },
+        )
+
+    def test_table(self):
+        self.assertEqual(list(self.source), list(self.table))
+        self.assertEqual(4, self.table.nrows())
+        self.assertEqual(self.source.header(), self.table.fieldnames())
+        self.assertEqual(
+            list(self.source.values("chain_id")), self.table.values("chain_id")
+        )
+        self.assertEqual(["a", "b", "c"], self.table.keys("chain_id"))
+
+    def test_selectkey(self):
+        for key in "a", "b", "c", "d":
+            self.assertEqual(
+                list(self.source.selecteq("chain_id", key)),
+                list(self.table.selectkey("chain_id", key)),
+            )
+        date = datetime.date(2021, 1, 4)
+        self.assertEqual(
+            list(self.source.select(lambda r: r.datetime.date() == date)),
+            list(self.table.selectkey("date", date)),
+        )
+
+    def test_selectkey_multiple(self):
+        # Rows appear once and in table order.
+        self.assertEqual(
+            list(self.source.selectin("chain_id", {"a", "c"})),
+            list(self.table.selectkey("chain_id", "c", "a")),
+        )
+        self.assertEqual(
+            ["a", "b", "a"],
+            list(self.table.selectkey("underlying", "SPY", "QQQ").values("chain_id")),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
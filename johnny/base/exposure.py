@@ -0,0 +1,115 @@
+"""Notional exposure of the open positions.
+
+The positions are the Mark rows of the transactions table, which are inserted
+at import time for every open position. For each of them we compute an
+estimate of the notional risk, and its downside (puts, long equities and
+futures) and upside (calls, short equities and futures) components. The
+per-position table is computed once by the import and persisted, and the
+webapp only rolls it up by account, underlying, group and strategy.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+
+from more_itertools import first
+
+from johnny.base import instrument
+from johnny.base.etl import Record, Table
+
+
+ZERO = Decimal(0)
+Q = Decimal("0.01")
+
+
+# Fields of the rollup per underlying, in order.
+UNDERLYING_FIELDS = [
+    "account",
+    "underlying",
+    "price",
+    "instype",
+    "group",
+    "strategy",
+    "notional_down",
+    "notional_up",
+]
+
+
+def MarkPosition(r: Record) -> Decimal:
+    """Convert mark transaction to position (investing the sign)."""
+    sign = +1 if r.instruction == "SELL" else -1
+    return sign * r.quantity
+
+
+def Notional(r: Record) -> Decimal:
+    """Calculate the notional risk of the position."""
+    mquantity = r.position * r.multiplier
+    if r.instype in {"EquityOption", "FutureOption"}:
+        return (mquantity * r.strike).quantize(Q)
+    elif r.instype in {"Equity"}:
+        return -mquantity * r.price
+    elif r.instype in {"Future"}:
+        return -mquantity * r.price
+    else:
+        return ZERO
+
+
+def DownsideNotional(r: Record) -> Decimal:
+    """Return downside risk notional."""
+    if r.putcall in {"P", "C"}:
+        return r.notional if r.putcall == "P" else ZERO
+    return r.notional
+
+
+def UpsideNotional(r: Record) -> Decimal:
+    """Return upside risk notional."""
+    if r.putcall in {"P", "C"}:
+        return r.notional if r.putcall == "C" else ZERO
+    return -r.notional
+
+
+def PositionsExposure(transactions: Table, chains: Table) -> Table:
+    """Compute the notional exposure of each open position, from the Mark rows
+    of the transactions. The group and strategy of the chains are joined in."""
+    return (
+        transactions.selecteq("rowtype", "Mark")
+        # Convert Mark rows to position quantities.
+        .applyfn(instrument.Expand, "symbol")
+        .addfield("position", MarkPosition)
+        .cutout("instruction", "quantity")
+        # Compute the put/call notional risks associated with the position.
+        .addfield("notional", Notional)
+        .addfield("notional_down", DownsideNotional)
+        .addfield("notional_up", UpsideNotional)
+        # Join in the group and strategy.
+        .leftjoin(chains.cut("chain_id", "group", "strategy"), "chain_id")
+    )
+
+
+def ByUnderlying(exposure: Table) -> Table:
+    """Aggregate all put and call notional risk per (account, underlying), along
+    with the instrument type, group and strategy."""
+    return (
+        exposure.aggregate(
+            ["account", "underlying", "instype", "group", "strategy"],
+            {
+                "price": ("price", first),
+                "notional_down": ("notional_down", lambda g: sum(g).quantize(Q)),
+                "notional_up": ("notional_up", lambda g: sum(g).quantize(Q)),
+            },
+        )
+        .sort(["account", "underlying", "instype", "group"])
+        .cut(*UNDERLYING_FIELDS)
+    )
+
+
+def Rollup(per_underlying: Table, field: str) -> Table:
+    """Aggregate the notional risk per underlying further, by a single field."""
+    return per_underlying.aggregate(
+        field,
+        {
+            "notional_down": ("notional_down", sum),
+            "notional_up": ("notional_up", sum),
+        },
+    ).sort([field])
@@ -0,0 +1,97 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+import datetime
+import logging
+import tempfile
+import unittest
+
+from johnny.base import chains as chainslib
+from johnny.base import colstore
+from johnny.base import config as configlib
+from johnny.base import exposure
+from johnny.base import match
+from johnny.base.etl import petl
+from johnny.testing import synthetic
+
+
+ZERO = Decimal(0)
+
+
+class TestExposure(unittest.TestCase):
+    def test_notional(self):
+        header = ("chain_id", "account", "rowtype", "symbol", "instruction")
+        table = petl.wrap(
+            [
+                header + ("quantity", "price"),
+                ("c1", "x1234", "Mark", "SPY", "SELL", Decimal("10"), Decimal("400")),
+                ("c1", "x1234", "Trade", "SPY", "BUY", Decimal("10"), Decimal("390")),
+                ("c2", "x1234", "Mark", "SPY_210618_P380", "BUY", Decimal("2"), ZERO),
+                ("c2", "x1234", "Mark", "SPY_210618_C420", "SELL", Decimal("1"), ZERO),
+            ]
+        )
+        chains = petl.wrap(
+            [
+                ("chain_id", "group", "strategy"),
+                ("c1", "Investment", "Equity"),
+                ("c2", "Trades", "Strangle"),
+            ]
+        )
+        positions = exposure.PositionsExposure(table, chains)
+        self.assertEqual(
+            [
+                ("c1", "SPY", Decimal("-4000.00"), Decimal("4000.00"), "Investment"),
+                ("c2", "SPY", Decimal("-76000.00"), Decimal("0"), "Trades"),
+                ("c2", "SPY", Decimal("0"), Decimal("42000.00"), "Trades"),
+            ],
+            list(
+                positions.cut(
+                    "chain_id", "underlying", "notional_down", "notional_up", "group"
+                ).skip(1)
+            ),
+        )
+
+        per_underlying = exposure.ByUnderlying(positions)
+        self.assertEqual(
+            tuple(exposure.UNDERLYING_FIELDS), tuple(per_underlying.fieldnames())
+        )
+        self.assertEqual(2, per_underlying.nrows())
+        self.assertEqual(
+            [
+                ("Investment", Decimal("-4000.00"), Decimal("4000.00")),
+                ("Trades", Decimal("-76000.00"), Decimal("42000.00")),
+            ],
+            list(exposure.Rollup(per_underlying, "group").skip(1)),
+        )
+
+    def test_persisted(self):
+        transactions = synthetic.GenerateTransactions(500, seed=1)
+        matched = match.Process(transactions, synthetic.GetEndTime(transactions))
+        logging.disable(logging.WARNING)
+        try:
+            chained, chains_db = chainslib.ChainTransactions(
+                matched, configlib.Chains()
+            )
+            chains, chained = chainslib.TransactionsTableToChainsTable(
+                chained, chains_db
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+
+        positions = exposure.PositionsExposure(chained, chains)
+        self.assertGreater(positions.nrows(), 0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = path.join(tmpdir, "exposure.db")
+            colstore.Write(positions, filename)
+            persisted = colstore.Read(filename)
+            self.assertEqual(list(positions), list(persisted))
+            self.assertEqual(
+                list(exposure.ByUnderlying(positions)),
+                list(exposure.ByUnderlying(persisted)),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,26 @@ __license__ = "GNU GPLv2"
 
 
 import datetime
+import functools
 import re
 from decimal import Decimal
-from typing import NamedTuple, Optional, List
+from typing import Any, Dict, NamedTuple, Optional, List, Tuple
 
 from mulmat import multipliers
-from johnny.base.etl import Table
+from johnny.base.etl import petl, Table
+
+
+# Maximum number of distinct symbols to keep parsed instruments for. A typical
+# history has only a few thousand distinct symbols.
+CACHE_SIZE = 1 << 16
+
+# Precompiled patterns for parsing symbols.
+_OPTION_RE = re.compile(r"(/?[A-Z0-9]+)_(?:(\d{6})|([A-Z0-9]+))_([CP])(.*)")
+_CURRENCY_RE = re.compile("[A-Z]{3}_[A-Z]{3}")
+_UNDERLYING_RE = re.compile(r"(/?[A-Z0-9]+)(_.*)?")
+_PRODUCT_RE = re.compile(r"(/?[A-Z0-9]+?)([FGHJKMNQUVXZ][23][0-9])")
+_FUTURE_RE = re.compile(r"(/.*)([FGHJKMNQUVXZ]2\d)")
+_CONTRACT_RE = re.compile(r"(.*)([FGHJKMNQUVXZ]2\d)")
 
 
 # TODO(blais): Set the expiration datetime for future option instruments to the
@@ -102,7 +116,7 @@ def FromColumns(
 
     # Infer the multiplier if it is not provided.
     if multiplier is None:
-        match = re.match("(/.*)([FGHJKMNQUVXZ]2\d)", underlying)
+        match = _FUTURE_RE.match(underlying)
         if match:
             _, calendar = match.groups()
         else:
@@ -119,24 +133,28 @@ def FromColumns(
     return Instrument(underlying, expiration, expcode, putcall, strike, multiplier)
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def ParseUnderlying(symbol: str) -> str:
     """Parse only the underlying from the symbol."""
-    match = re.match(r"(/?[A-Z0-9]+)(_.*)?", symbol)
+    match = _UNDERLYING_RE.match(symbol)
     assert match
     return match.group(1)
 
 
 def ParseProduct(underlying: str) -> str:
     """Return the product from an underlying."""
-    match = re.fullmatch(r"(/?[A-Z0-9]+?)([FGHJKMNQUVXZ][23][0-9])", underlying)
+    match = _PRODUCT_RE.fullmatch(underlying)
     return match.group(1) if match else underlying
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def FromString(symbol: str) -> Instrument:
-    """Build an instrument object from the symbol string."""
+    """Build an instrument object from the symbol string. Instruments are
+    immutable, so parsed instruments are interned and shared for each distinct
+    symbol."""
 
     # Match options.
-    match = re.match(r"(/?[A-Z0-9]+)_(?:(\d{6})|([A-Z0-9]+))_([CP])(.*)", symbol)
+    match = _OPTION_RE.match(symbol)
     if match:
         underlying, expi_str, expcode, putcall, strike_str = match.groups()
         expiration = (
@@ -144,7 +162,7 @@ def FromString(symbol: str) -> Instrument:
         )
         strike = Decimal(strike_str)
     else:
-        assert re.match("[A-Z]{3}_[A-Z]{3}", symbol) or ("_" not in symbol), symbol
+        assert _CURRENCY_RE.match(symbol) or ("_" not in symbol), symbol
         expiration, expcode, putcall, strike = None, None, None, None
         underlying = symbol
 
@@ -189,42 +207,61 @@ def GetContractName(symbol: str) -> str:
     """Return the underlying root without the futures calendar expiration, e.g. '/CL'."""
     underlying = symbol.split("_")[0]
     if underlying.startswith("/"):
-        match = re.match("(.*)([FGHJKMNQUVXZ]2\d)", underlying)
-        assert match, string
+        match = _CONTRACT_RE.match(underlying)
+        assert match, symbol
         return match.group(1)
     else:
         return underlying
 
 
-INSTATTR = {
-    "instype": lambda r: r._instrument.instype,
-    "underlying": lambda r: r._instrument.underlying,
-    "expiration": lambda r: r._instrument.expiration,
-    "expcode": lambda r: r._instrument.expcode,
-    "putcall": lambda r: r._instrument.putcall,
-    "strike": lambda r: r._instrument.strike,
-    "multiplier": lambda r: r._instrument.multiplier,
-}
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _ExpandSymbol(symbol: str, fieldnames: Tuple[str, ...]) -> Tuple[Any, ...]:
+    """Compute the values of the given component fields for a symbol."""
+    inst = FromString(symbol)
+    return tuple(getattr(inst, fieldname) for fieldname in fieldnames)
 
 
-def ExpandInstrument(table: Table, only: List[str]) -> Table:
-    """Expand the symbol name into its component fields."""
-    if only:
-        for fieldname in only:
-            table = table.addfield(fieldname, INSTATTR[fieldname])
-    else:
-        for fieldname, getter in INSTATTR.items():
-            table = table.addfield(fieldname, getter)
-    return table
+class ExpandView(petl.Table):
+    """A table with the component fields of the instrument appended to each row.
+    The fields are computed only once for each distinct symbol."""
+
+    def __init__(self, table: Table, fieldname: str, names: Tuple[str, ...]):
+        self.table = table
+        self.fieldname = fieldname
+        self.names = names
+
+    def __iter__(self):
+        it = iter(self.table)
+        header = tuple(next(it))
+        yield header + self.names
+        index = header.index(self.fieldname)
+        names = self.names
+        for row in it:
+            yield tuple(row) + _ExpandSymbol(row[index], names)
 
 
 def Expand(table: Table, fieldname: str, *only: List[str]) -> Table:
     """Expand the symbol name into its component fields."""
-    return (
-        table.addfield("_instrument", lambda r: FromString(getattr(r, fieldname)))
-        .applyfn(ExpandInstrument, only=only)
-        .cutout("_instrument")
-    )
+    for name in only:
+        if name not in FIELDNAMES:
+            raise KeyError(name)
+    return ExpandView(table, fieldname, tuple(only) if only else tuple(FIELDNAMES))
+
+
+def CacheStats() -> Dict[str, Any]:
+    """Return the statistics of the instrument parsing caches."""
+    return {
+        "FromString": FromString.cache_info(),
+        "ParseUnderlying": ParseUnderlying.cache_info(),
+        "Expand": _ExpandSymbol.cache_info(),
+    }
+
+
+def ClearCaches():
+    """Clear the instrument parsing caches."""
+    FromString.cache_clear()
+    ParseUnderlying.cache_clear()
+    _ExpandSymbol.cache_clear()
 
 
 FIELDNAMES = [
@@ -0,0 +1,89 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+import datetime
+import unittest
+
+from johnny.base import instrument
+from johnny.base.etl import petl
+
+
+SYMBOLS = [
+    "AAPL",
+    "AAPL_210625_C150",
+    "SPX_210917_P4000",
+    "/ESU21",
+    "/ESU21_EW3U21_C4500",
+    "GLD_211015_P160",
+    "GLD",
+    "EUR_USD",
+]
+
+
+class TestInstrument(unittest.TestCase):
+    def setUp(self):
+        instrument.ClearCaches()
+
+    def test_from_string(self):
+        inst = instrument.FromString("AAPL_210625_C150")
+        self.assertEqual(
+            instrument.Instrument(
+                "AAPL",
+                datetime.date(2021, 6, 25),
+                None,
+                "C",
+                Decimal("150"),
+                instrument.multipliers.OPTION_CONTRACT_SIZE,
+            ),
+            inst,
+        )
+        self.assertEqual("AAPL_210625_C150", str(inst))
+
+    def test_interned(self):
+        inst = instrument.FromString("/ESU21_EW3U21_C4500")
+        self.assertIs(inst, instrument.FromString("/ESU21_EW3U21_C4500"))
+        stats = instrument.CacheStats()["FromString"]
+        self.assertEqual((1, 1), (stats.hits, stats.misses))
+
+        instrument.ClearCaches()
+        self.assertEqual(0, instrument.CacheStats()["FromString"].currsize)
+
+    def test_expand(self):
+        table = petl.wrap(
+            [("symbol", "quantity")]
+            + [(symbol, index) for index, symbol in enumerate(SYMBOLS * 3)]
+        )
+        expanded = instrument.Expand(table, "symbol")
+        self.assertEqual(
+            ("symbol", "quantity") + tuple(instrument.FIELDNAMES), expanded.header()
+        )
+        for rec in expanded.records():
+            inst = instrument.FromString.__wrapped__(rec.symbol)
+            self.assertEqual(
+                tuple(getattr(inst, name) for name in instrument.FIELDNAMES),
+                tuple(rec[name] for name in instrument.FIELDNAMES),
+            )
+        self.assertEqual(list(table), list(instrument.Shrink(expanded)))
+
+        # Each distinct symbol is parsed only once.
+        stats = instrument.CacheStats()
+        self.assertEqual(len(SYMBOLS), stats["FromString"].misses)
+        self.assertEqual(len(SYMBOLS), stats["Expand"].misses)
+
+    def test_expand_only(self):
+        table = petl.wrap([("symbol",), ("/ESU21_EW3U21_C4500",), ("AAPL",)])
+        self.assertEqual(
+            [
+                ("symbol", "underlying", "expcode"),
+                ("/ESU21_EW3U21_C4500", "/ESU21", "EW3U21"),
+                ("AAPL", "AAPL", None),
+            ],
+            list(instrument.Expand(table, "symbol", "underlying", "expcode")),
+        )
+        with self.assertRaises(KeyError):
+            instrument.Expand(table, "symbol", "invalid")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,9 +11,10 @@ by one corresponding 'Expire' row for each underlying position, with the
 __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
+import collections
 import hashlib
 from decimal import Decimal
-from typing import Callable, List, Tuple, NamedTuple, Optional
+from typing import Callable, Deque, List, Tuple, NamedTuple, Optional
 
 from johnny.base.etl import AssertFields, Record
 
@@ -167,6 +168,43 @@ class Lot(NamedTuple):
     cost: Amount  # Unit cost, not total.
 
 
+def _ReduceLots(
+    lots: Deque[Lot], sign: Decimal, remaining: Quantity
+) -> Tuple[Quantity, Amount, Quantity]:
+    """Reduce a queue of lots of the given sign in FIFO order.
+
+    Fully matched lots are popped from the front of the queue, and a partially
+    matched lot is replaced in place by its remainder, so this runs in time
+    proportional to the number of lots consumed.
+
+    Args:
+      lots: A queue of insertion-ordered lots, all of the same sign.
+      sign: The sign of the position, +1 or -1.
+      remaining: The positive quantity to reduce the position by.
+    Returns:
+      The positive matched quantity and basis, and the positive quantity left
+      after all the lots have been consumed.
+    """
+    matched = ZERO
+    basis = ZERO
+    while lots and remaining > ZERO:
+        lot = lots[0]
+
+        lot_quantity = sign * lot.quantity
+        lot_matched = min(lot_quantity, remaining)
+        matched += lot_matched
+        basis += lot_matched * lot.cost
+        remaining -= lot_matched
+
+        if lot_matched < lot_quantity:
+            # Partial lot matched; replace it with its remainder.
+            lots[0] = Lot(lot.quantity - sign * lot_matched, lot.cost)
+            break
+        lots.popleft()
+
+    return matched, basis, remaining
+
+
 class FifoInventory:
     """Simple inventory object which implements matching of lots of an instrument as FIFO.
 
@@ -181,8 +219,8 @@ class FifoInventory:
     create_id_fn = staticmethod(_CreateMatchId)
 
     def __init__(self):
-        # A list of insertion-ordered lots as (quantity, basis) pairs.
-        self.lots: List[Lot] = []
+        # A queue of insertion-ordered lots as (quantity, basis) pairs.
+        self.lots: Deque[Lot] = collections.deque()
 
         # The current match id being assigned.
         self.match_id: str = None
@@ -231,22 +269,9 @@ class FifoInventory:
                 self.lots.append(Lot(quantity, unit_cost))
             else:
                 # Reduction in FIFO order.
-                # Notes: lot_matched` and `remaining` are positive.
-                remaining = -sign * quantity
-                while self.lots and remaining > ZERO:
-                    lot = self.lots.pop(0)
-
-                    lot_matched = min(sign * lot.quantity, remaining)
-                    matched += lot_matched
-                    basis += lot_matched * lot.cost
-                    remaining -= lot_matched
-
-                    if lot_matched < sign * lot.quantity:
-                        # Partial lot matched; reinsert remainder.
-                        self.lots.insert(
-                            0, Lot(lot.quantity - sign * lot_matched, lot.cost)
-                        )
-                        break
+                matched, basis, remaining = _ReduceLots(
+                    self.lots, sign, -sign * quantity
+                )
 
                 # Remaining quantity to insert to cross.
                 if remaining != ZERO:
@@ -268,7 +293,7 @@ class FifoInventory:
         sign = 1 if self.lots[0].quantity >= 0 else -1
         matched = sign * sum(lot.quantity for lot in self.lots)
         basis = sign * sum(lot.quantity * lot.cost for lot in self.lots)
-        self.lots = []
+        self.lots.clear()
 
         match_id = (
             self.create_id_fn(transaction_id)
@@ -334,8 +359,11 @@ class OpenCloseFifoInventory:
     create_id_fn = staticmethod(_CreateMatchId)
 
     def __init__(self, debug: bool = False):
-        # A list of insertion-ordered lots as (quantity, cost) pairs.
-        self.lots: List[Lot] = []
+        # A queue of insertion-ordered lots as (quantity, cost) pairs.
+        self.lots: Deque[Lot] = collections.deque()
+
+        # The signed total quantity of the lots, maintained as they change.
+        self._quantity = ZERO
 
         # The current match id being processed.
         self._match_id: str = None
@@ -396,6 +424,7 @@ class OpenCloseFifoInventory:
                 "NEW",
             )
             self.lots.append(Lot(squantity, unit_cost))
+            self._quantity += squantity
         else:
             # Calculate the sign of the current position.
             position_sign = self.sign()
@@ -413,6 +442,7 @@ class OpenCloseFifoInventory:
                     "AUGMENT",
                 )
                 self.lots.append(Lot(squantity, unit_cost))
+                self._quantity += squantity
             else:
                 if self.debug:
                     print("C")
@@ -421,23 +451,11 @@ class OpenCloseFifoInventory:
                     raise MatchError("Reducing position not closing.")
 
                 # Reduction in FIFO order.
-                # Notes: lot_matched` and `remaining` are positive.
-                remaining = rec.quantity
-                while self.lots and remaining > ZERO:
-                    lot = self.lots.pop(0)
-
-                    abs_lot_quantity = abs(lot.quantity)
-                    matched = min(abs_lot_quantity, remaining)
-                    matched_quantity += matched
-                    # matched_cost += matched * lot.cost
-                    remaining -= matched
-
-                    if matched < abs_lot_quantity:
-                        # Partial lot matched; insert remainder.
-                        self.lots.insert(
-                            0, Lot(lot.quantity - position_sign * matched, lot.cost)
-                        )
-                        break
+                # Notes: `matched_quantity` and `remaining` are positive.
+                matched_quantity, _, remaining = _ReduceLots(
+                    self.lots, position_sign, rec.quantity
+                )
+                self._quantity -= position_sign * matched_quantity
 
                 # If after matching there is some remaining quantity, cross
                 # beyond flat to the other side.
@@ -478,9 +496,11 @@ class OpenCloseFifoInventory:
                         "REDUCE_OPENING",
                     )
                     self.lots.append(Lot(-position_sign * remaining, unit_cost))
+                    self._quantity -= position_sign * remaining
 
         # If after matching the position has been cleared, we'll reset the match id.
         if not self.lots:
+            self._quantity = ZERO
             self.clear_match_id()
 
     def opening(self, rec: Record, accumfn: TxnAccumFn):
@@ -489,7 +509,7 @@ class OpenCloseFifoInventory:
         transactions log. We make no attempt to auto-correct the initial positions."""
 
         # If this is a reduction, it cannot be opening, it has to be closing.
-        pquantity = self.quantity()
+        pquantity = self._quantity
         squantity = SignedQuantity(rec)
         if pquantity * squantity < ZERO:
             raise MatchError(
@@ -505,7 +525,7 @@ class OpenCloseFifoInventory:
         transactions log. We make no attempt to auto-correct the initial positions."""
 
         # If this is an augmentation, it cannot be opening, it has to be closing.
-        pquantity = self.quantity()
+        pquantity = self._quantity
         squantity = SignedQuantity(rec)
         if pquantity * squantity >= ZERO:
             raise MatchError(
@@ -539,5 +559,6 @@ class OpenCloseFifoInventory:
             "EXPIRE",
         )
 
-        self.lots[:] = []
+        self.lots.clear()
+        self._quantity = ZERO
         self.clear_match_id()
@@ -7,7 +7,9 @@ __license__ = "GNU GPLv2"
 
 from decimal import Decimal
 from typing import List
+import collections
 import itertools
+import random
 import unittest
 
 from parameterized import parameterized
@@ -493,5 +495,221 @@ class TestOpenCloseFifoInventory(unittest.TestCase):
         AssertTableEqual(TestTable(expected_rows), table)
 
 
+class ListFifoInventory(inventories.FifoInventory):
+    """The previous implementation of FifoInventory, over a list of lots, as a
+    reference for the queue-based lot engine."""
+
+    def __init__(self):
+        super().__init__()
+        self.lots = []
+
+    def match(self, quantity, unit_cost, transaction_id):
+        if self.match_id is None:
+            self.match_id = self.create_id_fn(transaction_id)
+        basis = ZERO
+        matched = ZERO
+        if not self.lots:
+            self.lots.append(Lot(quantity, unit_cost))
+        else:
+            sign = 1 if self.lots[0].quantity >= 0 else -1
+            if sign * quantity >= ZERO:
+                self.lots.append(Lot(quantity, unit_cost))
+            else:
+                remaining = -sign * quantity
+                while self.lots and remaining > ZERO:
+                    lot = self.lots.pop(0)
+                    lot_matched = min(sign * lot.quantity, remaining)
+                    matched += lot_matched
+                    basis += lot_matched * lot.cost
+                    remaining -= lot_matched
+                    if lot_matched < sign * lot.quantity:
+                        self.lots.insert(
+                            0, Lot(lot.quantity - sign * lot_matched, lot.cost)
+                        )
+                        break
+                if remaining != ZERO:
+                    self.lots.append(Lot(-sign * remaining, unit_cost))
+        match_id = self.match_id
+        if not self.lots:
+            self.match_id = None
+        return (matched, basis, match_id)
+
+
+class ListOpenCloseFifoInventory(OpenCloseFifoInventory):
+    """The previous implementation of OpenCloseFifoInventory, over a list of lots,
+    as a reference for the queue-based lot engine."""
+
+    def __init__(self):
+        super().__init__()
+        self.lots = []
+
+    def match(self, rec, accumfn):
+        squantity = inventories.SignedQuantity(rec)
+        unit_cost = rec.cost / rec.quantity
+        if not self.lots:
+            if rec.effect and rec.effect != "OPENING":
+                raise MatchError("New position not opening.")
+            accumfn(
+                rec._replace(
+                    match_id=self.get_match_id(rec), effect=rec.effect or "OPENING"
+                ),
+                "NEW",
+            )
+            self.lots.append(Lot(squantity, unit_cost))
+        else:
+            position_sign = self.sign()
+            if position_sign * squantity >= ZERO:
+                if rec.effect and rec.effect != "OPENING":
+                    raise MatchError("Augmenting position not opening.")
+                accumfn(
+                    rec._replace(
+                        match_id=self.get_match_id(rec), effect=rec.effect or "OPENING"
+                    ),
+                    "AUGMENT",
+                )
+                self.lots.append(Lot(squantity, unit_cost))
+            else:
+                if rec.effect and rec.effect != "CLOSING":
+                    raise MatchError("Reducing position not closing.")
+                matched_quantity = ZERO
+                remaining = rec.quantity
+                while self.lots and remaining > ZERO:
+                    lot = self.lots.pop(0)
+                    abs_lot_quantity = abs(lot.quantity)
+                    matched = min(abs_lot_quantity, remaining)
+                    matched_quantity += matched
+                    remaining -= matched
+                    if matched < abs_lot_quantity:
+                        self.lots.insert(
+                            0, Lot(lot.quantity - position_sign * matched, lot.cost)
+                        )
+                        break
+                if remaining == ZERO:
+                    accumfn(
+                        rec._replace(
+                            quantity=matched_quantity,
+                            cost=matched_quantity * unit_cost,
+                            effect="CLOSING",
+                            match_id=self.get_match_id(rec),
+                        ),
+                        "REDUCE",
+                    )
+                else:
+                    accumfn(
+                        rec._replace(
+                            transaction_id=rec.transaction_id + ".1",
+                            quantity=matched_quantity,
+                            cost=matched_quantity * unit_cost,
+                            effect="CLOSING",
+                            match_id=self.get_match_id(rec),
+                        ),
+                        "REDUCE_CLOSING",
+                    )
+                    accumfn(
+                        rec._replace(
+                            transaction_id=rec.transaction_id + ".2",
+                            quantity=remaining,
+                            cost=remaining * unit_cost,
+                            effect="OPENING",
+                            match_id=self.get_match_id(rec),
+                        ),
+                        "REDUCE_OPENING",
+                    )
+                    self.lots.append(Lot(-position_sign * remaining, unit_cost))
+        if not self.lots:
+            self.clear_match_id()
+
+    def opening(self, rec, accumfn):
+        pquantity = self.quantity()
+        if pquantity * inventories.SignedQuantity(rec) < ZERO:
+            raise MatchError("Invalid opening position")
+        return self.match(rec, accumfn)
+
+    def closing(self, rec, accumfn):
+        pquantity = self.quantity()
+        if pquantity * inventories.SignedQuantity(rec) >= ZERO:
+            raise MatchError("Invalid closing position")
+        return self.match(rec, accumfn)
+
+
+# Quantities and costs of random trades, with varied exponents, which have to
+# be preserved exactly.
+QUANTITIES = ["1", "2", "3", "10", "1.0", "0.5", "2.50", "100", "7"]
+COSTS = ["0", "1", "10.00", "3.25", "99.9", "1234.5678"]
+
+
+def RandomQuantity(rng: random.Random) -> Decimal:
+    return Decimal(rng.choice(QUANTITIES))
+
+
+class TestLotEngine(unittest.TestCase):
+    """Check the queue-based inventories against the list-based ones."""
+
+    def test_fifo_inventory(self):
+        for seed in range(50):
+            rng = random.Random(seed)
+            new, old = inventories.FifoInventory(), ListFifoInventory()
+            for index in range(rng.randrange(1, 300)):
+                if rng.random() < 0.02:
+                    self.assertEqual(
+                        repr(old.expire(f"x{index}")), repr(new.expire(f"x{index}"))
+                    )
+                    continue
+                # Scale in and out of a position with partial fills.
+                sign = rng.choice([-1, 1, 1]) if rng.random() < 0.7 else -old.sign()
+                quantity = (sign or 1) * RandomQuantity(rng)
+                cost = Decimal(rng.choice(COSTS))
+                self.assertEqual(
+                    repr(old.match(quantity, cost, f"t{index}")),
+                    repr(new.match(quantity, cost, f"t{index}")),
+                )
+                self.assertEqual(repr(old.lots), repr(list(new.lots)))
+                self.assertEqual(repr(old.position()), repr(new.position()))
+                self.assertEqual(repr(old.quantity()), repr(new.quantity()))
+                self.assertEqual(repr(old.cost()), repr(new.cost()))
+
+    def test_open_close_fifo_inventory(self):
+        Txn = collections.namedtuple("Txn", HEADER)
+        for seed in range(50):
+            rng = random.Random(seed)
+            new, old = OpenCloseFifoInventory(), ListOpenCloseFifoInventory()
+            new_rows, old_rows = [], []
+            for index in range(rng.randrange(1, 300)):
+                if rng.random() < 0.02:
+                    rec = Txn(f"x{index}", "Expire", "", "", ZERO, ZERO, "")
+                    if not old.lots:
+                        with self.assertRaises(MatchError):
+                            new.expire(rec, lambda *_: None)
+                        continue
+                    old.expire(rec, lambda rec, _: old_rows.append(rec))
+                    new.expire(rec, lambda rec, _: new_rows.append(rec))
+                    continue
+
+                quantity = RandomQuantity(rng)
+                rec = Txn(
+                    f"t{index}",
+                    "Trade",
+                    rng.choice(["", "", "OPENING", "CLOSING"]),
+                    rng.choice(["BUY", "BUY", "SELL"]),
+                    quantity,
+                    quantity * Decimal(rng.choice(COSTS)),
+                    "",
+                )
+                method = {"OPENING": "opening", "CLOSING": "closing"}.get(
+                    rec.effect, "match"
+                )
+                try:
+                    getattr(old, method)(rec, lambda rec, _: old_rows.append(rec))
+                except MatchError:
+                    with self.assertRaises(MatchError):
+                        getattr(new, method)(rec, lambda *_: None)
+                    continue
+                getattr(new, method)(rec, lambda rec, _: new_rows.append(rec))
+                self.assertEqual(repr(old.lots), repr(list(new.lots)))
+                self.assertEqual(repr(old.quantity()), repr(new.quantity()))
+                self.assertEqual(old.quantity(), new._quantity)
+            self.assertEqual(repr(old_rows), repr(new_rows))
+
+
 if __name__ == "__main__":
     unittest.main()
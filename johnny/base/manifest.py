@@ -0,0 +1,170 @@
+"""A persistent manifest of the normalized tables for each account source.
+
+Parsing and normalizing the broker files is the most expensive part of an
+import, and most of the time only one or two of the files have changed since
+the last run. This module maintains a cache directory with the normalized table
+for each (account, logtype) pair, along with a manifest recording the resolved
+file it was produced from and a fingerprint of its contents. Sources whose
+fingerprint hasn't changed are loaded from the cache instead of being
+re-normalized.
+
+The fingerprint covers the contents of the resolved source file, the initial
+positions file, the account configuration, the source code of the importer
+module and of the johnny package (importers share code like the symbol
+normalization) and the version of the manifest format, so that upgrading the
+code invalidates the cached tables.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from os import path
+from typing import Any, Dict, Optional
+import functools
+import hashlib
+import importlib.util
+import logging
+import os
+
+import simplejson
+
+from johnny.base import config as configlib
+from johnny.base.etl import petl, Table
+
+
+# The name of the manifest file in the cache directory.
+MANIFEST_FILENAME = "manifest.json"
+
+# Version of the format of the manifest and of the cached tables. Bump it to
+# invalidate the cached tables of previous versions.
+MANIFEST_VERSION = 2
+
+# Root directory of the sources of the johnny package.
+PACKAGE_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Size of the blocks to read when hashing files.
+_BLOCK_SIZE = 1 << 20
+
+
+def _HashFile(hasher: Any, filename: str):
+    """Update the hasher with the contents of a file."""
+    with open(filename, "rb") as infile:
+        while True:
+            block = infile.read(_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+
+
+@functools.lru_cache(maxsize=None)
+def GetCodeVersion(directory: str = PACKAGE_DIR) -> str:
+    """Compute a fingerprint of the Python sources under a directory, excluding
+    the tests. This is computed once per process."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".py") or filename.endswith("_test.py"):
+                continue
+            fullname = path.join(dirpath, filename)
+            hasher.update(path.relpath(fullname, directory).encode("utf8"))
+            _HashFile(hasher, fullname)
+    return hasher.hexdigest()
+
+
+def GetFingerprint(
+    account: configlib.Account, logtype: int, filename: Optional[str]
+) -> Optional[str]:
+    """Compute a fingerprint of everything that goes into a normalized table.
+
+    Args:
+      account: The account configuration.
+      logtype: The type of log to be imported from it.
+      filename: The file the source resolves to, as the importer will read it.
+    Returns:
+      A hex digest string, or None if the source cannot be fingerprinted (e.g.,
+      it does not resolve to a single local file), in which case it must always
+      be imported.
+    """
+    if filename is None or not path.isfile(filename):
+        return None
+    spec = importlib.util.find_spec(account.module)
+    if spec is None or not spec.origin or not path.isfile(spec.origin):
+        return None
+
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(MANIFEST_VERSION).encode("ascii"))
+    hasher.update(GetCodeVersion().encode("ascii"))
+    hasher.update(account.SerializeToString(deterministic=True))
+    hasher.update(str(logtype).encode("ascii"))
+    hasher.update(filename.encode("utf8"))
+    _HashFile(hasher, filename)
+    _HashFile(hasher, spec.origin)
+    if account.initial:
+        _HashFile(hasher, account.initial)
+    return hasher.hexdigest()
+
+
+class ImportManifest:
+    """A directory of normalized tables keyed by the fingerprint of their sources."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.filename = path.join(directory, MANIFEST_FILENAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists(self.filename):
+            with open(self.filename) as infile:
+                self.entries = simplejson.load(infile)
+
+    @staticmethod
+    def key(account: configlib.Account, logtype: int) -> str:
+        """Return the manifest key for an account source."""
+        return "{}.{}".format(account.nickname, configlib.LogType.Name(logtype))
+
+    def lookup(self, key: str, fingerprint: Optional[str]) -> Optional[Table]:
+        """Return the cached table for the source, if it is still valid."""
+        if fingerprint is None:
+            return None
+        entry = self.entries.get(key)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return None
+        filename = path.join(self.directory, entry["table"])
+        if not path.exists(filename):
+            return None
+        logging.info(f"Loading unchanged source '{key}' from cache")
+        return petl.frompickle(filename)
+
+    def store(
+        self,
+        key: str,
+        fingerprint: Optional[str],
+        filename: Optional[str],
+        table: Optional[Table],
+    ) -> Optional[Table]:
+        """Save a freshly normalized table for the source. The table is
+        materialized in the process and the materialized table is returned."""
+        if table is None or fingerprint is None:
+            self.entries.pop(key, None)
+            return table
+
+        table = petl.wrap(list(table))
+        os.makedirs(self.directory, exist_ok=True)
+        table_filename = "{}.pickle".format(key)
+        tmp_filename = path.join(self.directory, table_filename + ".tmp")
+        table.topickle(tmp_filename)
+        os.replace(tmp_filename, path.join(self.directory, table_filename))
+
+        self.entries[key] = {
+            "filename": filename,
+            "fingerprint": fingerprint,
+            "table": table_filename,
+        }
+        return table
+
+    def save(self):
+        """Write out the manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w") as outfile:
+            simplejson.dump(self.entries, outfile, indent=2, sort_keys=True)
+        os.replace(tmp_filename, self.filename)
@@ -0,0 +1,109 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+import os
+import tempfile
+import unittest
+
+from johnny.base import config as configlib
+from johnny.base import manifest
+from johnny.base.etl import petl
+
+
+class TestImportManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = path.join(self.tmpdir.name, "statement.csv")
+        with open(self.source, "w") as outfile:
+            outfile.write("a,b\n1,2\n")
+        self.cachedir = path.join(self.tmpdir.name, "cache")
+
+        self.account = configlib.Account()
+        self.account.nickname = "tasty"
+        self.account.logtype.append(configlib.Account.TRANSACTIONS)
+        self.account.module = "johnny.base.manifest"
+        self.account.source = self.source
+
+        self.table = petl.wrap([("symbol", "cost"), ("AAPL", Decimal("1.23"))])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def fingerprint(self):
+        return manifest.GetFingerprint(
+            self.account, configlib.Account.TRANSACTIONS, self.source
+        )
+
+    def test_fingerprint(self):
+        fingerprint = self.fingerprint()
+        self.assertEqual(fingerprint, self.fingerprint())
+
+        with open(self.source, "a") as outfile:
+            outfile.write("3,4\n")
+        self.assertNotEqual(fingerprint, self.fingerprint())
+
+        fingerprint = self.fingerprint()
+        self.account.exclude_instrument_types.append(configlib.InstrumentType.Crypto)
+        self.assertNotEqual(fingerprint, self.fingerprint())
+
+    def test_code_version(self):
+        directory = path.join(self.tmpdir.name, "package")
+        os.makedirs(path.join(directory, "sub"))
+        for filename in "module.py", "module_test.py", "sub/helper.py":
+            with open(path.join(directory, filename), "w") as outfile:
+                outfile.write("A = 1\n")
+        version = manifest.GetCodeVersion.__wrapped__(directory)
+
+        # Tests don't affect the version.
+        with open(path.join(directory, "module_test.py"), "a") as outfile:
+            outfile.write("B = 2\n")
+        self.assertEqual(version, manifest.GetCodeVersion.__wrapped__(directory))
+
+        # Helper modules do.
+        with open(path.join(directory, "sub/helper.py"), "a") as outfile:
+            outfile.write("B = 2\n")
+        self.assertNotEqual(version, manifest.GetCodeVersion.__wrapped__(directory))
+
+    def test_fingerprint_missing(self):
+        self.assertIsNone(
+            manifest.GetFingerprint(self.account, configlib.Account.TRANSACTIONS, None)
+        )
+        self.assertIsNone(
+            manifest.GetFingerprint(
+                self.account, configlib.Account.TRANSACTIONS, self.tmpdir.name
+            )
+        )
+
+    def test_store_lookup(self):
+        key = manifest.ImportManifest.key(self.account, configlib.Account.TRANSACTIONS)
+        self.assertEqual("tasty.TRANSACTIONS", key)
+        fingerprint = self.fingerprint()
+
+        import_manifest = manifest.ImportManifest(self.cachedir)
+        self.assertIsNone(import_manifest.lookup(key, fingerprint))
+        table = import_manifest.store(key, fingerprint, self.source, self.table)
+        self.assertEqual(list(self.table), list(table))
+        import_manifest.save()
+
+        # Reload and look it up from disk.
+        import_manifest = manifest.ImportManifest(self.cachedir)
+        table = import_manifest.lookup(key, fingerprint)
+        self.assertIsNotNone(table)
+        self.assertEqual(list(self.table), list(table))
+
+        # A changed fingerprint invalidates the entry.
+        self.assertIsNone(import_manifest.lookup(key, "0" * 32))
+        self.assertIsNone(import_manifest.lookup(key, None))
+
+    def test_store_unfingerprinted(self):
+        key = manifest.ImportManifest.key(self.account, configlib.Account.TRANSACTIONS)
+        import_manifest = manifest.ImportManifest(self.cachedir)
+        import_manifest.store(key, self.fingerprint(), self.source, self.table)
+        import_manifest.store(key, None, None, self.table)
+        self.assertNotIn(key, import_manifest.entries)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,13 +5,12 @@ __license__ = "GNU GPLv2"
 
 from decimal import Decimal
 from typing import Mapping, Tuple
-
-from more_itertools import last
+import re
 
 from johnny.base import config as configlib
 from johnny.base import discovery
 from johnny.base import instrument
-from johnny.base.etl import Table, Record
+from johnny.base.etl import IndexedTable, Table
 
 Instrument = instrument.Instrument
 
@@ -19,6 +18,13 @@ Instrument = instrument.Instrument
 ZERO = Decimal(0)
 
 
+# Fields of the transactions updated by marking.
+MARK_FIELDS = ("price", "description", "cost")
+
+# The source of the price in the description of a marked row.
+_SOURCE_REGEXP = re.compile(r" \(source: [^)]*\)$")
+
+
 # def FetchPricesForMark(transactions: Table) -> Table:
 #     """Fetch live prices for all marks."""
 #
@@ -51,20 +57,17 @@ def FetchPricesFromTransactionsLog(transactions: Table) -> Mapping[str, Decimal]
     semi-reasonable prices (i.e., without accessing any network resource), just
     taking the most recent price you've seen in the log. A fallback of sorts.
     """
-
-    def fn(symbol, group):
-        rec = last(group)
-        return symbol, rec.price, rec.datetime
-
-    table = (
-        transactions.sort("datetime")
-        .select(lambda r: r.rowtype not in {"Open", "Mark"})
-        .rowreduce("symbol", fn, header=["symbol", "price", "datetime"])
-    )
-    return {
-        key: (value, "transactions")
-        for key, value in table.lookupone("symbol", "price").items()
-    }
+    # Note: Of the rows with the same time, the last one in the log wins.
+    latest = {}
+    for symbol, rowtype, price, dtime in transactions.cut(
+        "symbol", "rowtype", "price", "datetime"
+    ).data():
+        if rowtype in {"Open", "Mark"}:
+            continue
+        seen = latest.get(symbol)
+        if seen is None or dtime >= seen[1]:
+            latest[symbol] = (price, dtime)
+    return {symbol: (price, "transactions") for symbol, (price, _) in latest.items()}
 
 
 def GetPriceMap(
@@ -90,34 +93,33 @@ def GetPriceMap(
     return price_map
 
 
-def Mark(transactions: Table, price_map: Mapping[str, Tuple[Decimal, str]]) -> Table:
-    """Mark the live positions."""
-
-    def set_mark(price: Decimal, row: Record) -> Decimal:
-        "Set mark price from price database."
-        if row.rowtype != "Mark":
-            return price
-        price, _ = price_map.get(row.symbol, (price, "N/A"))
-        return price
-
-    def set_description(description: str, row: Record) -> Decimal:
-        "Place the source of the price in the description."
-        if row.rowtype != "Mark":
-            return description
-        _, source = price_map.get(row.symbol, (None, "N/A"))
-        return f"{description} (source: {source})"
-
-    def get_cost(cost: Decimal, rec: Record) -> Decimal:
-        "Calculate cost from updated price."
-        if rec.rowtype != "Mark":
-            return cost
-        sign = -1 if rec.instruction == "BUY" else +1
-        return sign * rec.quantity * rec.price * rec.multiplier
-
-    return (
-        transactions.convert("price", set_mark, pass_row=True)
-        .convert("description", set_description, pass_row=True)
-        .applyfn(instrument.Expand, "symbol")
-        .convert("cost", get_cost, pass_row=True)
-        .applyfn(instrument.Shrink)
-    )
+def Mark(
+    transactions: Table, price_map: Mapping[str, Tuple[Decimal, str]]
+) -> IndexedTable:
+    """Mark the live positions. The Mark rows are located through an index on the
+    row type and only their price, description and cost are updated (see
+    `MARK_FIELDS`); all other rows are passed through as they are. The result is
+    materialized."""
+    table = IndexedTable(transactions, {"rowtype": "rowtype"})
+    header = table.header()
+    isymbol, iinstruction, iquantity, iprice, idesc, icost = [
+        header.index(name)
+        for name in ("symbol", "instruction", "quantity") + MARK_FIELDS
+    ]
+    datarows = table.datarows
+    for pos in table.keypositions("rowtype", "Mark"):
+        row = list(datarows[pos])
+        symbol = row[isymbol]
+        # Set mark price from price database, and place the source of the price
+        # in the description, replacing that of a previous mark.
+        price, source = price_map.get(symbol, (row[iprice], "N/A"))
+        row[iprice] = price
+        row[idesc] = "{} (source: {})".format(
+            _SOURCE_REGEXP.sub("", row[idesc]), source
+        )
+        # Calculate cost from updated price.
+        sign = -1 if row[iinstruction] == "BUY" else +1
+        multiplier = instrument.FromString(symbol).multiplier
+        row[icost] = sign * row[iquantity] * price * multiplier
+        datarows[pos] = tuple(row)
+    return table
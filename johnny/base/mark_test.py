@@ -0,0 +1,218 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+import logging
+import unittest
+
+from more_itertools import last
+
+from johnny.base import instrument
+from johnny.base import mark
+from johnny.base import match
+from johnny.base.etl import petl
+from johnny.testing import synthetic
+
+
+def ReferenceFetchPrices(transactions):
+    """Extract the latest prices by sorting the log by time and symbol."""
+    table = (
+        transactions.sort("datetime")
+        .select(lambda r: r.rowtype not in {"Open", "Mark"})
+        .rowreduce(
+            "symbol",
+            lambda symbol, group: (symbol, last(group).price),
+            header=["symbol", "price"],
+        )
+    )
+    return {
+        key: (value, "transactions")
+        for key, value in table.lookupone("symbol", "price").items()
+    }
+
+
+def ReferenceMark(transactions, price_map):
+    """Mark the live positions by converting the columns of every row."""
+
+    def set_mark(price, row):
+        if row.rowtype != "Mark":
+            return price
+        price, _ = price_map.get(row.symbol, (price, "N/A"))
+        return price
+
+    def set_description(description, row):
+        if row.rowtype != "Mark":
+            return description
+        _, source = price_map.get(row.symbol, (None, "N/A"))
+        return f"{description} (source: {source})"
+
+    def get_cost(cost, rec):
+        if rec.rowtype != "Mark":
+            return cost
+        sign = -1 if rec.instruction == "BUY" else +1
+        return sign * rec.quantity * rec.price * rec.multiplier
+
+    return (
+        transactions.convert("price", set_mark, pass_row=True)
+        .convert("description", set_description, pass_row=True)
+        .applyfn(instrument.Expand, "symbol")
+        .convert("cost", get_cost, pass_row=True)
+        .applyfn(instrument.Shrink)
+    )
+
+
+def Rows(table) -> str:
+    """Render rows for an exact comparison, including Decimal exponents."""
+    return repr([tuple(row) for row in table])
+
+
+class TestMark(unittest.TestCase):
+    def test_mark(self):
+        header = (
+            "rowtype",
+            "symbol",
+            "instruction",
+            "quantity",
+            "price",
+            "cost",
+            "description",
+        )
+        transactions = petl.wrap(
+            [
+                header,
+                (
+                    "Trade",
+                    "SPY",
+                    "BUY",
+                    Decimal("10"),
+                    Decimal("390"),
+                    Decimal("-3900"),
+                    "Buy",
+                ),
+                (
+                    "Mark",
+                    "SPY",
+                    "SELL",
+                    Decimal("10"),
+                    Decimal("390"),
+                    Decimal("3900"),
+                    "Mark",
+                ),
+                (
+                    "Mark",
+                    "QQQ",
+                    "BUY",
+                    Decimal("2"),
+                    Decimal("300"),
+                    Decimal("-600"),
+                    "Mark",
+                ),
+                (
+                    "Mark",
+                    "/ESU21",
+                    "SELL",
+                    Decimal("1"),
+                    Decimal("4300"),
+                    Decimal("215000"),
+                    "Mark",
+                ),
+            ]
+        )
+        price_map = {
+            "SPY": (Decimal("400"), "positions"),
+            "/ESU21": (Decimal("4400"), "transactions"),
+        }
+        marked = mark.Mark(transactions, price_map)
+        self.assertEqual(header, marked.header())
+        self.assertEqual(
+            [
+                (
+                    "Trade",
+                    "SPY",
+                    "BUY",
+                    Decimal("10"),
+                    Decimal("390"),
+                    Decimal("-3900"),
+                    "Buy",
+                ),
+                (
+                    "Mark",
+                    "SPY",
+                    "SELL",
+                    Decimal("10"),
+                    Decimal("400"),
+                    Decimal("4000"),
+                    "Mark (source: positions)",
+                ),
+                (
+                    "Mark",
+                    "QQQ",
+                    "BUY",
+                    Decimal("2"),
+                    Decimal("300"),
+                    Decimal("-600"),
+                    "Mark (source: N/A)",
+                ),
+                (
+                    "Mark",
+                    "/ESU21",
+                    "SELL",
+                    Decimal("1"),
+                    Decimal("4400"),
+                    Decimal("220000"),
+                    "Mark (source: transactions)",
+                ),
+            ],
+            list(marked.data()),
+        )
+
+    def test_remark(self):
+        transactions = petl.wrap(
+            [
+                ("rowtype", "symbol", "instruction", "quantity", "price", "cost"),
+                ("Mark", "SPY", "SELL", Decimal("10"), Decimal("390"), Decimal("3900")),
+            ]
+        ).addfield("description", "Mark for SPY")
+        marked = mark.Mark(transactions, {"SPY": (Decimal("400"), "positions")})
+        remarked = mark.Mark(marked, {"SPY": (Decimal("410"), "transactions")})
+        self.assertEqual(
+            ["Mark for SPY (source: transactions)"],
+            list(remarked.values("description")),
+        )
+        self.assertEqual([Decimal("4100")], list(remarked.values("cost")))
+
+
+class TestMarkSynthetic(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+        try:
+            transactions = synthetic.GenerateTransactions(1500, seed=7)
+            cls.matched = petl.wrap(
+                [
+                    tuple(row)
+                    for row in match.Process(
+                        transactions, synthetic.GetEndTime(transactions)
+                    )
+                ]
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+        cls.price_map = mark.FetchPricesFromTransactionsLog(cls.matched)
+
+    def test_fetch_prices(self):
+        self.assertEqual(
+            repr(sorted(ReferenceFetchPrices(self.matched).items())),
+            repr(sorted(self.price_map.items())),
+        )
+
+    def test_identical_to_reference(self):
+        self.assertIn("Mark", set(self.matched.values("rowtype")))
+        self.assertEqual(
+            Rows(ReferenceMark(self.matched, self.price_map)),
+            Rows(mark.Mark(self.matched, self.price_map)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -53,16 +53,19 @@ positions can be inserted.
 __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
+from concurrent import futures
 from decimal import Decimal
 from functools import partial
-from typing import List, Mapping, NamedTuple, Optional
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
 import collections
 import datetime
 import enum
 import hashlib
+import heapq
 import itertools
+import operator
 
-from johnny.base.etl import petl, AssertColumns, Record, Table
+from johnny.base.etl import petl, AssertColumns, MergeSorted, Record, Table
 from johnny.base import instrument
 from johnny.base import inventories
 
@@ -85,85 +88,231 @@ class InstKey(NamedTuple):
 
 
 def Process(
-    transactions: Table,
+    transactions: Union[Table, Sequence[Table]],
     mark_time: Optional[datetime.datetime] = None,
     debug: bool = False,
+    num_workers: Optional[int] = None,
 ) -> Table:
     """Run state-based processing over the transactions log.
 
     Args:
-      transactions: The table of transactions, as normalized by each importer code.
+      transactions: The table of transactions, as normalized by each importer
+        code. This can also be a list of tables each already sorted by
+        (datetime, account), e.g., one per account source, in which case they
+        are merged in a single streaming pass instead of being sorted.
       mark_time: The datetime to use for marking position.
+      num_workers: If more than one, the log is partitioned by instrument key
+        and the partitions are matched in a pool of that many processes. The
+        output is identical to that of the serial path.
     Returns:
       A fixed up table of processed, transformed and normalized transactions, as
       per the description of this module.
     """
-    AssertColumns(
-        transactions,
-        ("account", str),
-        ("transaction_id", str),
-        ("datetime", datetime.datetime),
-        ("rowtype", str),
-        ("order_id", str),
-        ("symbol", str),
-        ("effect", str),
-        ("instruction", str),
-        ("quantity", Decimal),
-        ("price", Decimal),
-        ("cost", Decimal),
-        ("commissions", Decimal),
-        ("fees", Decimal),
-        ("description", str),
-    )
+    if isinstance(transactions, petl.Table):
+        tables = [transactions.sort("datetime")]
+    else:
+        tables = list(transactions)
+    for table in tables:
+        AssertColumns(
+            table,
+            ("account", str),
+            ("transaction_id", str),
+            ("datetime", datetime.datetime),
+            ("rowtype", str),
+            ("order_id", str),
+            ("symbol", str),
+            ("effect", str),
+            ("instruction", str),
+            ("quantity", Decimal),
+            ("price", Decimal),
+            ("cost", Decimal),
+            ("commissions", Decimal),
+            ("fees", Decimal),
+            ("description", str),
+        )
 
-    invs = collections.defaultdict(
-        lambda: inventories.OpenCloseFifoInventory(debug=debug)
-    )
+    # Note: The input is sorted or merged only once, to ensure that inventory
+    # matching is done in time order {123a4903c212}.
+    transactions = (
+        tables[0] if len(tables) == 1 else MergeSorted(tables, ("datetime", "account"))
+    ).addfield("match_id", "")
+    header = transactions.header()
+
+    if num_workers is not None and num_workers > 1:
+        if mark_time is None:
+            mark_time = _GetMarkTime()
+        new_rows, synthetic_rows = _ProcessPartitioned(
+            transactions, mark_time, debug, num_workers
+        )
+    else:
+        invs = collections.defaultdict(
+            partial(inventories.OpenCloseFifoInventory, debug=debug)
+        )
+
+        # Accumulators for new records to output, as plain tuples. The records
+        # can't be pickled, which petl requires e.g. for sorting large tables.
+        # The rows produced by matching preserve the datetime of their input
+        # rows, so they come out in time order.
+        new_rows = [header]
+        synthetic_rows = [header]
 
-    # Accumulator for new records to output.
-    new_rows = []
+        def accum(nrec, _):
+            new_rows.append(tuple(nrec))
 
-    def accum(nrec, _):
-        new_rows.append(nrec)
+        def accum_synthetic(nrec, _):
+            synthetic_rows.append(tuple(nrec))
 
-    # Note: Unfortunately we require two sortings; one to ensure that inventory
-    # matching is done in time order, and a final one to reorder the newly
-    # synthesized outputs {123a4903c212}.
-    transactions = transactions.addfield("match_id", "").sort("datetime")
-    for rec in transactions.namedtuples():
-        inv = invs[InstKey(rec.account, rec.symbol)]
+        for rec in transactions.namedtuples():
+            _MatchRecord(invs, rec, accum)
 
-        if rec.rowtype in {"Trade", "Open"}:
-            if rec.effect == "OPENING":
-                inv.opening(rec, accum)
-            elif rec.effect == "CLOSING":
-                inv.closing(rec, accum)
-            else:
-                assert not rec.effect
-                inv.match(rec, accum)
+        if mark_time is None:
+            mark_time = _GetMarkTime()
 
-        elif rec.rowtype in {"Expire", "Assign", "Exercise"}:
-            inv.expire(rec, accum, rec.rowtype)
+        # Insert missing expirations.
+        prototype = type(rec)(*[None] * len(header))
+        _AddMissingExpirations(invs, mark_time, accum_synthetic, prototype)
 
+        # Add closing transactions for existing positions.
+        _AddMarkTransactions(invs, mark_time, accum_synthetic, prototype)
+
+    # Note: The few newly synthesized rows are merged in datetime order, after
+    # any existing rows at the same time {123a4903c212}.
+    synthetic_rows[1:] = sorted(
+        synthetic_rows[1:], key=operator.itemgetter(header.index("datetime"))
+    )
+    return MergeSorted([petl.wrap(new_rows), petl.wrap(synthetic_rows)], "datetime")
+
+
+def _MatchRecord(
+    invs: Mapping[InstKey, inventories.OpenCloseFifoInventory],
+    rec: Record,
+    accum: inventories.TxnAccumFn,
+):
+    """Match a single transaction against the inventory of its instrument."""
+    inv = invs[InstKey(rec.account, rec.symbol)]
+
+    if rec.rowtype in {"Trade", "Open"}:
+        if rec.effect == "OPENING":
+            inv.opening(rec, accum)
+        elif rec.effect == "CLOSING":
+            inv.closing(rec, accum)
         else:
-            raise ValueError(f"Invalid row type: {rec.rowtype}")
+            assert not rec.effect
+            inv.match(rec, accum)
+
+    elif rec.rowtype in {"Expire", "Assign", "Exercise"}:
+        inv.expire(rec, accum, rec.rowtype)
+
+    else:
+        raise ValueError(f"Invalid row type: {rec.rowtype}")
 
-    if mark_time is None:
-        mark_time = _GetMarkTime()
 
-    # Insert missing expirations.
-    prototype = type(rec)(*[None] * len(transactions.header()))
-    _AddMissingExpirations(invs, mark_time, accum, prototype)
+# A partition of the transactions log, for a single instrument key, as a list of
+# (sequence number in the log, row) pairs.
+Partition = List[Tuple[int, tuple]]
 
-    # Add closing transactions for existing positions.
-    _AddMarkTransactions(invs, mark_time, accum, prototype)
 
-    # Note: We sort again to ensure newly synthesized rows are ordered in
-    # datetime order {123a4903c212}.
-    return petl.wrap(itertools.chain([transactions.header()], new_rows)).sort(
-        "datetime"
+def _ProcessPartitioned(
+    transactions: Table,
+    mark_time: datetime.datetime,
+    debug: bool,
+    num_workers: int,
+) -> Tuple[List[tuple], List[tuple]]:
+    """Match the transactions log in a pool of processes. Matching only depends
+    on the rows of each instrument key, so the log is partitioned by key, and
+    the matched rows are merged back in the order of their input rows.
+
+    Returns:
+      The rows produced by matching, in log order, and the synthesized
+      expiration and mark rows, in the order they are created by the serial path.
+      Both are lists of plain tuples, headed by the header.
+    """
+    # Partition the log by instrument key, keeping the position of each row.
+    header = transactions.header()
+    iaccount, isymbol = header.index("account"), header.index("symbol")
+    partitions: Dict[InstKey, Partition] = collections.defaultdict(list)
+    for index, row in enumerate(petl.data(transactions)):
+        partitions[InstKey(row[iaccount], row[isymbol])].append((index, tuple(row)))
+
+    # Balance the partitions across a few tasks per worker, largest first. The
+    # keys are sorted for the assignment to be deterministic.
+    num_tasks = min(len(partitions), num_workers * 4)
+    tasks = [[] for _ in range(num_tasks)]
+    sizes = [0] * num_tasks
+    for key in sorted(partitions, key=lambda key: (-len(partitions[key]), key)):
+        task = sizes.index(min(sizes))
+        tasks[task].append((key, partitions[key]))
+        sizes[task] += len(partitions[key])
+
+    with futures.ProcessPoolExecutor(
+        max_workers=min(num_workers, max(num_tasks, 1))
+    ) as executor:
+        jobs = [
+            executor.submit(_MatchPartitions, header, task, mark_time, debug)
+            for task in tasks
+        ]
+        results = [job.result() for job in jobs]
+
+    # Rows produced from the same input row stay together, in order.
+    new_rows = [header]
+    new_rows.extend(
+        row
+        for _, row in heapq.merge(
+            *(matched for matched, _, _ in results), key=operator.itemgetter(0)
+        )
     )
 
+    # The serial path synthesizes all the expirations, then all the marks, each
+    # in instrument key order.
+    expirations = sorted(
+        itertools.chain.from_iterable(expired for _, expired, _ in results)
+    )
+    marks = sorted(itertools.chain.from_iterable(marked for _, _, marked in results))
+    synthetic_rows = [header]
+    synthetic_rows.extend(row for _, row in itertools.chain(expirations, marks))
+    return new_rows, synthetic_rows
+
+
+def _MatchPartitions(
+    header: Tuple[str, ...],
+    partitions: List[Tuple[InstKey, Partition]],
+    mark_time: datetime.datetime,
+    debug: bool,
+) -> Tuple[Partition, List[Tuple[InstKey, tuple]], List[Tuple[InstKey, tuple]]]:
+    """Match the rows of some instrument keys. This runs in worker processes; the
+    rows are sent back as plain tuples, with their sequence numbers or keys."""
+    Row = collections.namedtuple("Row", header)
+    prototype = Row(*[None] * len(header))
+
+    matched = []
+    expired = []
+    marked = []
+    for key, partition in partitions:
+        invs = collections.defaultdict(
+            partial(inventories.OpenCloseFifoInventory, debug=debug)
+        )
+        for index, row in partition:
+            _MatchRecord(
+                invs,
+                Row(*row),
+                lambda nrec, _, index=index: matched.append((index, tuple(nrec))),
+            )
+        _AddMissingExpirations(
+            invs,
+            mark_time,
+            lambda nrec, _: expired.append((key, tuple(nrec))),
+            prototype,
+        )
+        _AddMarkTransactions(
+            invs,
+            mark_time,
+            lambda nrec, _: marked.append((key, tuple(nrec))),
+            prototype,
+        )
+
+    matched.sort(key=operator.itemgetter(0))
+    return matched, expired, marked
+
 
 def _GetMarkTime() -> datetime.datetime:
     """Get the mark time date. Override for tests."""
@@ -256,84 +405,158 @@ def _AddMarkTransactions(
         accum(rec, "MARK")
 
 
+# Fields of the table of trade matches, in order. The cost and proceeds are
+# provided for each of the methods of handling short options (see
+# `ShortMethod`), as `cost_<method>` and `proceeds_<method>`; the plain `cost`
+# and `proceeds` fields are for `ShortMethod.NONE`.
+MATCHES_FIELDS = [
+    "chain_id",
+    "match_id",
+    "account",
+    "symbol",
+    "instype",
+    "quantity",
+    "long_short",
+    "date_acquired",
+    "date_disposed",
+    "date_min",
+    "date_max",
+    "pnl",
+    "cost",
+    "proceeds",
+    "cost_invert",
+    "proceeds_invert",
+    "cost_nullify",
+    "proceeds_nullify",
+]
+
+# Fields of the matches of a chain, as rendered and reported.
+CHAIN_MATCHES_FIELDS = [
+    "date_acquired",
+    "date_disposed",
+    "cost",
+    "proceeds",
+    "pnl",
+    "long_short",
+    "match_id",
+    "symbol",
+    "quantity",
+    "date_min",
+    "date_max",
+    "account",
+    "chain_id",
+]
+
+
+def MatchesTable(transactions: Table) -> Table:
+    """Aggregate the transactions of all the chains into a table of trade
+    matches, one row per (chain_id, match_id), sorted by those. This is done in a
+    single pass over the transactions and is intended to be computed at import
+    time. See `MATCHES_FIELDS` for the columns."""
+    # Note: The rows are converted to named tuples, whose attributes are much
+    # faster to access than those of petl records.
+    it = iter(instrument.Expand(transactions, "symbol", "instype"))
+    Row = collections.namedtuple("Row", next(it), rename=True)
+    groups = collections.defaultdict(list)
+    for rec in map(Row._make, it):
+        groups[(rec.chain_id, rec.match_id)].append(rec)
+    rows = [tuple(MATCHES_FIELDS)]
+    for chain_id, match_id in sorted(groups, key=_MatchSortKey):
+        recs = groups[(chain_id, match_id)]
+        recs.sort(key=operator.attrgetter("datetime"))
+        rows.append(_AggregateMatch(chain_id, match_id, recs))
+    return petl.wrap(rows)
+
+
+def ChainMatches(matches: Table, short_method: ShortMethod) -> Table:
+    """Select the cost and proceeds of a short options method from a table of
+    matches produced by `MatchesTable()`."""
+    if short_method == ShortMethod.NONE:
+        return matches.cut(*CHAIN_MATCHES_FIELDS)
+    suffix = short_method.value
+    return (
+        matches.cutout("cost", "proceeds")
+        .rename({f"cost_{suffix}": "cost", f"proceeds_{suffix}": "proceeds"})
+        .cut(*CHAIN_MATCHES_FIELDS)
+    )
+
+
 def GetChainMatchesFromTransactions(txns: Table, short_method: ShortMethod) -> Table:
     """Extract a list of trade matches from the list of transactions."""
-    chain_id = next(iter(txns.values("chain_id")))
-    ctxns = (
-        txns.movefield("chain_id", 0)
-        .movefield("account", 1)
-        .convert("chain_id", lambda _: "")
-        .sort(["match_id", "datetime"])
-        .applyfn(instrument.Expand, "symbol")
+    return ChainMatches(MatchesTable(txns), short_method)
+
+
+def _MatchSortKey(key: Tuple[str, Optional[str]]) -> Tuple[str, str]:
+    chain_id, match_id = key
+    return (chain_id or "", match_id or "")
+
+
+def _AggregateMatch(chain_id: str, match_id: str, recs: List[Record]) -> Tuple:
+    """Aggregate the transactions of a match, sorted by time, into a row of the
+    matches table."""
+    instype = next(iter(set(r.instype for r in recs)))
+    return (
+        chain_id,
+        match_id,
+        recs[0].account,
+        next(iter(set(r.symbol for r in recs))),
+        instype,
+        _EstimateMatchQuantity(recs),
+        _LongShortIndicator(recs),
+        _DateSub("OPENING", recs),
+        _DateSub("CLOSING", recs),
+        min(r.datetime for r in recs).date(),
+        max(r.datetime for r in recs).date(),
+    ) + MarkValues(
+        instype, _CostOpened(recs), _CostClosed(recs), _FuturesNotionalOpen(recs)
     )
 
-    # Append a list of aggregated matches for the purpose of reporting.
-    funcs = {
-        "date_acquired": partial(_DateSub, "OPENING"),
-        "date_disposed": partial(_DateSub, "CLOSING"),
-        "date_min": ("datetime", lambda g: min(g).date()),
-        "date_max": ("datetime", lambda g: max(g).date()),
-        "cost": _CostOpened,
-        "proceeds": _CostClosed,
-        "futures_notional_open": _FuturesNotionalOpen,
-        "account": ("account", lambda g: next(iter(g))),
-        "symbol": ("symbol", lambda g: next(iter(set(g)))),
-        "instype": ("instype", lambda g: next(iter(set(g)))),
-        "quantity": _EstimateMatchQuantity,
-        "long_short": _LongShortIndicator,
-    }
-    cmatches = ctxns.aggregate("match_id", funcs)
 
+# Fields of the table of trade matches which depend on the prices of the marks,
+# in order. See `MarkValues()`.
+MARK_FIELDS = [
+    "pnl",
+    "cost",
+    "proceeds",
+    "cost_invert",
+    "proceeds_invert",
+    "cost_nullify",
+    "proceeds_nullify",
+]
+
+
+def MarkValues(
+    instype: str,
+    cost_opened: Decimal,
+    cost_closed: Decimal,
+    futures_notional_open: Decimal,
+) -> Tuple[Decimal, ...]:
+    """Compute the fields of a match which depend on the prices of the marks, in
+    the order of `MARK_FIELDS`, from the sums of the costs, commissions and fees
+    of its opening and closing transactions, and of the cost of its opening
+    futures transactions."""
     # For futures contracts, remove notional value from cost and add the
     # corresponding notional to proceeds. Opening futures positions should
     # have 0 cost (excluding commissions and fees) and closing positions
     # should be the matched P/L. This should produce proceeds and cost
     # numbers much closer to those on the 1099s.
-    denotionalize_futures = True
-    if denotionalize_futures:
-        cmatches = cmatches.convert(
-            "cost",
-            lambda _, r: r.cost - r.futures_notional_open,
-            pass_row=True,
-        ).convert(
-            "proceeds",
-            lambda _, r: r.proceeds + r.futures_notional_open,
-            pass_row=True,
-        )
-
-    cmatches = (
-        cmatches.addfield("chain_id", chain_id)
-        .addfield("pnl", lambda r: (r.proceeds + r.cost).quantize(Q))
-        .convert("proceeds", lambda v: v.quantize(Q))
-        # Flip the signs on cost, so that pnl = proceeds - cost, not proceeds + cost.
-        .convert("cost", lambda v: -v.quantize(Q))
-    )
-
-    # Handle P/L specially on short options.
-    if short_method == ShortMethod.INVERT:
-        cmatches = _ShortOptionsInvert(cmatches)
-    elif short_method == ShortMethod.NULLIFY:
-        cmatches = _ShortOptionsNullify(cmatches)
-
-    return cmatches.cut(
-        # "description",
-        "date_acquired",
-        "date_disposed",
-        "cost",
-        "proceeds",
-        "pnl",
-        "long_short",
-        # "*",
-        "match_id",
-        "symbol",
-        "quantity",
-        "date_min",
-        "date_max",
-        # "instype",
-        # "underlying",
-        "account",
-        "chain_id",
-        # "category",
+    cost = cost_opened - futures_notional_open
+    proceeds = cost_closed + futures_notional_open
+    pnl = (proceeds + cost).quantize(Q)
+    proceeds = proceeds.quantize(Q)
+    # Flip the signs on cost, so that pnl = proceeds - cost, not proceeds + cost.
+    cost = -cost.quantize(Q)
+
+    cost_invert, proceeds_invert = _ShortOptionsInvert(cost, proceeds)
+    cost_nullify, proceeds_nullify = _ShortOptionsNullify(instype, cost, proceeds)
+    return (
+        pnl,
+        cost,
+        proceeds,
+        cost_invert,
+        proceeds_invert,
+        cost_nullify,
+        proceeds_nullify,
     )
 
 
@@ -366,38 +589,25 @@ def _FuturesNotionalOpen(rows: List[Record]) -> Decimal:
     return sum(r.cost for r in rows if r.instype == "Future" and r.effect == "OPENING")
 
 
-def _ShortOptionsNullify(matches: Table) -> Table:
+def _ShortOptionsNullify(
+    instype: str, cost: Decimal, proceeds: Decimal
+) -> Tuple[Decimal, Decimal]:
     """
     On short options sales, nullify the cost basis as per the following rule:
     https://support.tastyworks.com/support/solutions/articles/43000615420--0-00-cost-basis-on-short-equity-options-
     """
-    return (
-        matches.addfield(
-            "null",
-            lambda r: (
-                r.instype == "EquityOption" and r.cost <= ZERO and r.proceeds <= ZERO
-            ),
-        )
-        .addfield("offset", lambda r: -r.cost)
-        .addfield("cost_null", lambda r: r.cost + r.offset if r.null else r.cost)
-        .addfield(
-            "proceeds_null", lambda r: r.proceeds + r.offset if r.null else r.proceeds
-        )
-        .cutout("null", "offset", "cost", "proceeds")
-        .rename({"cost_null": "cost", "proceeds_null": "proceeds"})
-    )
+    if instype == "EquityOption" and cost <= ZERO and proceeds <= ZERO:
+        offset = -cost
+        return cost + offset, proceeds + offset
+    return cost, proceeds
 
 
-def _ShortOptionsInvert(matches: Table) -> Table:
+def _ShortOptionsInvert(cost: Decimal, proceeds: Decimal) -> Tuple[Decimal, Decimal]:
     """
     Invert sell-to-open then buy-to-close in order to have positive
     numbers. We swap the dates, swap cost and proceeds and swap the signs
     on them. The P/L should be the same.
     """
-    return (
-        matches.addfield("inv", lambda r: r.cost <= ZERO and r.proceeds <= ZERO)
-        .addfield("cost_inv", lambda r: -r.proceeds if r.inv else r.cost)
-        .addfield("proceeds_inv", lambda r: -r.cost if r.inv else r.proceeds)
-        .cutout("inv", "cost", "proceeds")
-        .rename({"cost_inv": "cost", "proceeds_inv": "proceeds"})
-    )
+    if cost <= ZERO and proceeds <= ZERO:
+        return -proceeds, -cost
+    return cost, proceeds
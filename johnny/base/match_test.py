@@ -5,12 +5,20 @@ __license__ = "GNU GPLv2"
 
 import datetime
 from decimal import Decimal
+from functools import partial
+import logging
+import pickle
+import random
 import unittest
 from unittest import mock
 
+from johnny.base import chains as chainslib
+from johnny.base import config as configlib
+from johnny.base import instrument
 from johnny.base import match
 from johnny.base.etl import petl
 from johnny.base.etl import petl, AssertTableEqual
+from johnny.testing import synthetic
 
 
 ZERO = Decimal(0)
@@ -185,5 +193,229 @@ class TestMatch2(unittest.TestCase):
         AssertTableEqual(expected_output, match.Process(transactions))
 
 
+HEADER = (
+    "account",
+    "datetime",
+    "transaction_id",
+    "order_id",
+    "rowtype",
+    "symbol",
+    "instruction",
+    "effect",
+    "quantity",
+    "price",
+    "description",
+    "cost",
+    "commissions",
+    "fees",
+)
+
+
+def random_source(rng: random.Random, name: str, accounts: list, num_rows: int):
+    """Generate an unsorted source of trades, on a coarse time grid so that some
+    rows share the same datetime. Effects are left for matching to infer."""
+    symbols = ["AAPL", "AAPL_210625_C150", "SPY_210917_P400", "/ESU21"]
+    rows = []
+    for index in range(num_rows):
+        account = rng.choice(accounts)
+        symbol = rng.choice(symbols)
+        quantity = Decimal(rng.randint(1, 3))
+        instruction = rng.choice(["BUY", "SELL"])
+        sign = 1 if instruction == "BUY" else -1
+        dt = datetime.datetime(2021, 6, 1) + datetime.timedelta(
+            hours=rng.randint(0, 24 * 40)
+        )
+        rows.append(
+            (
+                account,
+                dt,
+                "{}{}".format(name, index),
+                "o{}{}".format(name, index),
+                "Trade",
+                symbol,
+                instruction,
+                "",
+                quantity,
+                Decimal("1"),
+                "",
+                -sign * quantity,
+                ZERO,
+                ZERO,
+            )
+        )
+    rng.shuffle(rows)
+    return petl.wrap([HEADER] + rows)
+
+
+class TestProcessStreams(unittest.TestCase):
+    def test_streams_equivalent(self):
+        mark_time = datetime.datetime(2021, 7, 20)
+        for seed in range(5):
+            rng = random.Random(seed)
+            sources = [
+                random_source(rng, "x", ["A"], 100),
+                random_source(rng, "y", ["B", "A"], 100),
+                random_source(rng, "z", ["B"], 100),
+            ]
+
+            # The full log, as previously sorted after import.
+            transactions = petl.cat(*sources).sort(("account", "datetime"))
+            expected = list(match.Process(transactions, mark_time))
+
+            streams = [source.sort(("datetime", "account")) for source in sources]
+            actual = list(match.Process(streams, mark_time))
+            self.assertEqual(expected, actual)
+            self.assertIn("Expire", {row[4] for row in actual})
+            self.assertIn("Mark", {row[4] for row in actual})
+
+    def test_picklable(self):
+        # petl pickles the rows of large tables to sort them.
+        rng = random.Random(0)
+        source = random_source(rng, "x", ["A", "B"], 100)
+        rows = list(match.Process(source, datetime.datetime(2021, 7, 20)))
+        self.assertEqual(rows, pickle.loads(pickle.dumps(rows)))
+
+
+def Rows(table: list) -> str:
+    """Render rows for an exact comparison, including Decimal exponents."""
+    return repr([tuple(row) for row in table])
+
+
+class TestProcessPartitioned(unittest.TestCase):
+    def test_identical_to_serial(self):
+        mark_time = datetime.datetime(2021, 7, 20)
+        for seed in range(3):
+            rng = random.Random(seed)
+            streams = [
+                random_source(rng, "x", ["A"], 100).sort(("datetime", "account")),
+                random_source(rng, "y", ["B", "A"], 100).sort(("datetime", "account")),
+            ]
+            expected = list(match.Process(streams, mark_time))
+            actual = list(match.Process(streams, mark_time, num_workers=3))
+            self.assertEqual(Rows(expected), Rows(actual))
+
+    def test_synthetic(self):
+        streams = synthetic.GenerateStreams(3000, seed=2)
+        mark_time = synthetic.GetEndTime(petl.cat(*streams))
+        expected = list(match.Process(streams, mark_time))
+        actual = list(match.Process(streams, mark_time, num_workers=2))
+        self.assertEqual(Rows(expected), Rows(actual))
+        rowtype = actual[0].index("rowtype")
+        self.assertEqual(
+            {"Trade", "Expire", "Assign", "Mark"},
+            {row[rowtype] for row in actual[1:]},
+        )
+
+
+def ReferenceChainMatches(txns, short_method):
+    """The matches of a chain, aggregated with the table operations of petl."""
+    chain_id = next(iter(txns.values("chain_id")))
+    ctxns = (
+        txns.movefield("chain_id", 0)
+        .movefield("account", 1)
+        .convert("chain_id", lambda _: "")
+        .sort(["match_id", "datetime"])
+        .applyfn(instrument.Expand, "symbol")
+    )
+    funcs = {
+        "date_acquired": partial(match._DateSub, "OPENING"),
+        "date_disposed": partial(match._DateSub, "CLOSING"),
+        "date_min": ("datetime", lambda g: min(g).date()),
+        "date_max": ("datetime", lambda g: max(g).date()),
+        "cost": match._CostOpened,
+        "proceeds": match._CostClosed,
+        "futures_notional_open": match._FuturesNotionalOpen,
+        "account": ("account", lambda g: next(iter(g))),
+        "symbol": ("symbol", lambda g: next(iter(set(g)))),
+        "instype": ("instype", lambda g: next(iter(set(g)))),
+        "quantity": match._EstimateMatchQuantity,
+        "long_short": match._LongShortIndicator,
+    }
+    cmatches = (
+        ctxns.aggregate("match_id", funcs)
+        .convert("cost", lambda _, r: r.cost - r.futures_notional_open, pass_row=True)
+        .convert(
+            "proceeds", lambda _, r: r.proceeds + r.futures_notional_open, pass_row=True
+        )
+        .addfield("chain_id", chain_id)
+        .addfield("pnl", lambda r: (r.proceeds + r.cost).quantize(match.Q))
+        .convert("proceeds", lambda v: v.quantize(match.Q))
+        .convert("cost", lambda v: -v.quantize(match.Q))
+    )
+    if short_method == match.ShortMethod.INVERT:
+        cmatches = (
+            cmatches.addfield("inv", lambda r: r.cost <= ZERO and r.proceeds <= ZERO)
+            .addfield("cost_inv", lambda r: -r.proceeds if r.inv else r.cost)
+            .addfield("proceeds_inv", lambda r: -r.cost if r.inv else r.proceeds)
+            .cutout("inv", "cost", "proceeds")
+            .rename({"cost_inv": "cost", "proceeds_inv": "proceeds"})
+        )
+    elif short_method == match.ShortMethod.NULLIFY:
+        cmatches = (
+            cmatches.addfield(
+                "null",
+                lambda r: (
+                    r.instype == "EquityOption"
+                    and r.cost <= ZERO
+                    and r.proceeds <= ZERO
+                ),
+            )
+            .addfield("offset", lambda r: -r.cost)
+            .addfield("cost_null", lambda r: r.cost + r.offset if r.null else r.cost)
+            .addfield(
+                "proceeds_null",
+                lambda r: r.proceeds + r.offset if r.null else r.proceeds,
+            )
+            .cutout("null", "offset", "cost", "proceeds")
+            .rename({"cost_null": "cost", "proceeds_null": "proceeds"})
+        )
+    return cmatches.cut(*match.CHAIN_MATCHES_FIELDS)
+
+
+class TestMatchesTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+        try:
+            txns = synthetic.GenerateTransactions(1500, seed=5)
+            matched = match.Process(txns, synthetic.GetEndTime(txns))
+            chained, chains_db = chainslib.ChainTransactions(
+                matched, configlib.Chains()
+            )
+            _, cls.transactions = chainslib.TransactionsTableToChainsTable(
+                chained, chains_db
+            )
+            cls.transactions = petl.wrap(list(cls.transactions))
+        finally:
+            logging.disable(logging.NOTSET)
+        cls.matches = petl.wrap(list(match.MatchesTable(cls.transactions)))
+
+    def test_header(self):
+        self.assertEqual(tuple(match.MATCHES_FIELDS), self.matches.header())
+
+    def test_unique_keys(self):
+        keys = list(self.matches.cut("chain_id", "match_id").data())
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertEqual(sorted(keys), keys)
+
+    def test_identical_to_per_chain(self):
+        chain_ids = sorted(set(self.transactions.values("chain_id")))
+        self.assertGreater(len(chain_ids), 10)
+        for chain_id in chain_ids:
+            txns = self.transactions.selecteq("chain_id", chain_id)
+            matches = self.matches.selecteq("chain_id", chain_id)
+            for short_method in match.ShortMethod:
+                expected = ReferenceChainMatches(txns, short_method)
+                self.assertEqual(
+                    Rows(expected),
+                    Rows(match.ChainMatches(matches, short_method)),
+                    (chain_id, short_method),
+                )
+                self.assertEqual(
+                    Rows(expected),
+                    Rows(match.GetChainMatchesFromTransactions(txns, short_method)),
+                )
+
+
 if __name__ == "__main__":
     unittest.main()
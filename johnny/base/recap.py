@@ -5,17 +5,14 @@ __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
 from functools import partial
-from typing import Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Set, Tuple
 import datetime
 import logging
 
-import seaborn as sns
-
-sns.set()
-
 from johnny.base import config as configlib
 from johnny.base import chains as chainslib
-from johnny.base.etl import Table, Record
+from johnny.base.etl import petl, Table, Record
+from johnny.utils.intervals import IntervalIndex
 
 Chain = chainslib.Chain
 
@@ -47,6 +44,25 @@ def get_chains_at_date(
         .values("chain_id")
     )
 
+    # Filter commissions & fees per day.
+    commfees = transactions.select(lambda r: r.datetime.date() == date).aggregate(
+        "chain_id", {"commissions": ("commissions", sum), "fees": ("fees", sum)}
+    )
+
+    active_chains = chains.select(lambda r: r.mindate <= date <= r.maxdate)
+    return _process_chains(active_chains, chains_map, date, traded_chains, commfees)
+
+
+def _process_chains(
+    chains: Table,
+    chains_map: Mapping[str, Chain],
+    date: datetime.date,
+    traded_chains: Set[str],
+    commfees: Table,
+) -> Table:
+    """Identify the action of the chains active on a date and join in the
+    comments and the commissions and fees of the day."""
+
     # Infer the action of the chain based on the status and date extents. Note
     # that this may return None, in which case the chain is to be excluded.
     def infer_action(r: Record) -> Optional[str]:
@@ -73,15 +89,9 @@ def get_chains_at_date(
             logging.error(f"Missing chain {r.chain_id}")
         return chain.comment if chain else ""
 
-    # Filter commissions & fees per day.
-    commfees = transactions.select(lambda r: r.datetime.date() == date).aggregate(
-        "chain_id", {"commissions": ("commissions", sum), "fees": ("fees", sum)}
-    )
-
     # Process the chains.
     chains = (
-        chains.select(lambda r: r.mindate <= date <= r.maxdate)
-        .addfield("action", infer_action, index=0)
+        chains.addfield("action", infer_action, index=0)
         .selecttrue("action")
         .addfield("k", lambda r: ACTIONS.get(r.action), index=0)
         .sort(["k", "chain_id"])
@@ -102,6 +112,66 @@ def get_chains_at_date(
     return chains
 
 
+class RecapIndex:
+    """A precomputed index answering `get_chains_at_date()` for any date in
+    time proportional to the number of chains active on that date.
+
+    The date extents of the chains are stored in an interval tree, and the
+    commissions and fees of each chain are summed up per day, once, along with
+    whether the chain had any transaction other than a mark that day.
+    """
+
+    def __init__(
+        self, transactions: Table, chains: Table, chains_map: Mapping[str, Chain]
+    ):
+        self.chains_map = chains_map
+
+        it = iter(chains)
+        self.header = tuple(next(it))
+        self.rows = [tuple(row) for row in it]
+        imin, imax = self.header.index("mindate"), self.header.index("maxdate")
+        self.intervals = IntervalIndex(
+            (row[imin], row[imax], pos) for pos, row in enumerate(self.rows)
+        )
+
+        # A mapping of date to chain id to [commissions, fees, traded].
+        self.days: Dict[datetime.date, Dict[str, List]] = {}
+        it = iter(transactions)
+        header = next(it)
+        idt, irowtype, ichain_id, icomm, ifees = [
+            header.index(name)
+            for name in ("datetime", "rowtype", "chain_id", "commissions", "fees")
+        ]
+        for row in it:
+            day = self.days.setdefault(row[idt].date(), {})
+            activity = day.get(row[ichain_id])
+            if activity is None:
+                activity = day[row[ichain_id]] = [0, 0, False]
+            activity[0] += row[icomm]
+            activity[1] += row[ifees]
+            if row[irowtype] != "Mark":
+                activity[2] = True
+
+    def get_chains_at_date(self, date: datetime.date) -> Table:
+        """Filter and identify chains active on a given date. This produces the
+        same table as the module-level `get_chains_at_date()`."""
+        positions = sorted(self.intervals.stab(date))
+        active_chains = petl.wrap([self.header] + [self.rows[pos] for pos in positions])
+
+        day = self.days.get(date, {})
+        traded_chains = {chain_id for chain_id, (_, _, traded) in day.items() if traded}
+        commfees = petl.wrap(
+            [("chain_id", "commissions", "fees")]
+            + [
+                (chain_id, commissions, fees)
+                for chain_id, (commissions, fees, _) in sorted(day.items())
+            ]
+        )
+        return _process_chains(
+            active_chains, self.chains_map, date, traded_chains, commfees
+        )
+
+
 def get_summary(chains: Table) -> Table:
     """Filter and identify chains active on a given date."""
 
@@ -0,0 +1,54 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import datetime
+import logging
+import unittest
+
+from johnny.base import chains as chainslib
+from johnny.base import config as configlib
+from johnny.base import match
+from johnny.base import recap
+from johnny.testing import synthetic
+
+
+class TestRecapIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        transactions = synthetic.GenerateTransactions(1000, seed=1)
+        mark_time = synthetic.GetEndTime(transactions)
+        matched = match.Process(transactions, mark_time)
+        logging.disable(logging.WARNING)
+        try:
+            chained, chains_db = chainslib.ChainTransactions(
+                matched, configlib.Chains()
+            )
+            cls.chains, cls.transactions = chainslib.TransactionsTableToChainsTable(
+                chained, chains_db
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+        cls.transactions = cls.transactions.cache()
+        cls.chains = cls.chains.cache()
+        cls.chains_map = {chain.chain_id: chain for chain in chains_db.chains}
+
+    def test_get_chains_at_date(self):
+        index = recap.RecapIndex(self.transactions, self.chains, self.chains_map)
+        mindate = min(self.chains.values("mindate"))
+        maxdate = max(self.chains.values("maxdate"))
+        date = mindate - datetime.timedelta(days=1)
+        nonempty = 0
+        while date <= maxdate + datetime.timedelta(days=1):
+            expected = list(
+                recap.get_chains_at_date(
+                    self.transactions, self.chains, self.chains_map, date
+                )
+            )
+            self.assertEqual(expected, list(index.get_chains_at_date(date)))
+            nonempty += len(expected) > 1
+            date += datetime.timedelta(days=1)
+        self.assertGreater(nonempty, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
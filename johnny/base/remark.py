@@ -0,0 +1,269 @@
+"""Mark the outputs of the last import at new prices, in place.
+
+The valuations of the chains and matches with open positions depend on the
+prices of the Mark rows of the transactions. Instead of chaining and matching
+the transactions again, the columns which depend on the marks are recomputed
+for those rows only and patched into the columnar files of the last import
+with `colstore.Update()`; the other rows aren't decoded or written.
+
+The sums are computed over the scaled integers of the stored decimal columns,
+so that they are exact and the patched values are the same as those of a full
+import at the same prices.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+from typing import List, Mapping, Optional, Tuple
+import logging
+
+import numpy as np
+
+from johnny.base import chains as chainslib
+from johnny.base import colstore
+from johnny.base import config as configlib
+from johnny.base import instrument
+from johnny.base import mark
+from johnny.base import match
+from johnny.base.etl import Table
+
+
+def MarkPositions(transactions: Table) -> np.ndarray:
+    """Return the positions of the Mark rows of a columnar table of
+    transactions."""
+    return _CodePositions(transactions, "rowtype", {"Mark"})
+
+
+def GetPriceMap(
+    transactions: Table, mark_positions: np.ndarray, config: configlib.Config
+) -> Mapping[str, Tuple[Decimal, str]]:
+    """Produce the mapping of (symbol, mark-price) of the symbols of the Mark
+    rows, as `mark.GetPriceMap()` does over all the transactions. Only the
+    latest transaction of each symbol is decoded."""
+    symbols = transactions.raw("symbol")
+    candidates = np.flatnonzero(
+        np.isin(symbols, symbols[mark_positions])
+        & ~np.isin(
+            transactions.raw("rowtype"),
+            _Codes(transactions, "rowtype", {"Open", "Mark"}),
+        )
+    )
+    # Of the rows with the same time, the last one in the log wins.
+    order = np.lexsort(
+        (
+            candidates,
+            transactions.raw("datetime")[candidates],
+            symbols[candidates],
+        )
+    )
+    candidates = candidates[order]
+    csymbols = symbols[candidates]
+    latest = candidates[np.append(csymbols[1:] != csymbols[:-1], True)]
+    return mark.GetPriceMap(
+        transactions.cut("symbol", "rowtype", "price", "datetime").take(
+            np.sort(latest)
+        ),
+        config,
+    )
+
+
+def UpdateChains(filename: str, transactions: Table, mark_positions: np.ndarray) -> int:
+    """Recompute the valuations of the chains with marks (`chains.MARK_COLUMNS`)
+    from the transactions and patch them in the columnar table of chains.
+    Returns the number of chains updated."""
+    if not len(mark_positions):
+        return 0
+    codes = transactions.raw("chain_id")
+    marked = np.unique(codes[mark_positions])
+    rows = np.flatnonzero(np.isin(codes, marked))
+    groups = np.searchsorted(marked, codes[rows])
+    ismark = np.isin(
+        transactions.raw("rowtype")[rows], _Codes(transactions, "rowtype", {"Mark"})
+    )
+
+    cost, scale = transactions.raw("cost")[rows], transactions.scale("cost")
+    pnl_chain = _Sums(cost, groups, len(marked))
+    net_liq = _Sums(cost[ismark], groups[ismark], len(marked))
+
+    chains = colstore.Read(filename)
+    chain_ids = _Strings(transactions, "chain_id", marked)
+    positions = _Locate(chains, ["chain_id"], [(chain_id,) for chain_id in chain_ids])
+    missing = [chain_id for chain_id, pos in zip(chain_ids, positions) if pos is None]
+    if missing:
+        raise ValueError(f"Chains missing from {filename}: {missing[:10]}")
+
+    table = chains.cut("pnl_win", "pnl_loss").take(positions)
+    values = [
+        chainslib.MarkValues(
+            _Quantize(pnl, scale), _Quantize(liq, scale), pnl_win, pnl_loss
+        )
+        for pnl, liq, (pnl_win, pnl_loss) in zip(pnl_chain, net_liq, table.data())
+    ]
+    colstore.Update(
+        filename,
+        positions,
+        {
+            name: [row[column] for row in values]
+            for column, name in enumerate(chainslib.MARK_COLUMNS)
+        },
+    )
+    return len(positions)
+
+
+def UpdateMatches(
+    filename: str, transactions: Table, mark_positions: np.ndarray
+) -> int:
+    """Recompute the fields of the matches with marks (`match.MARK_FIELDS`) from
+    the transactions and patch them in the columnar table of matches. If that
+    table is missing or doesn't have all of them, it is written anew. Returns the
+    number of matches updated."""
+    if not len(mark_positions):
+        return 0
+    # Identify the matches by their (chain_id, match_id) codes.
+    chain_codes = transactions.raw("chain_id").astype(np.int64)
+    match_codes = transactions.raw("match_id").astype(np.int64)
+    keys = (chain_codes + 1) * (match_codes.max() + 2) + (match_codes + 1)
+    marked = np.unique(keys[mark_positions])
+    rows = np.flatnonzero(np.isin(keys, marked))
+    groups = np.searchsorted(marked, keys[rows])
+
+    effects = transactions.raw("effect")[rows]
+    opening = np.isin(effects, _Codes(transactions, "effect", {"OPENING"}))
+    closing = np.isin(effects, _Codes(transactions, "effect", {"CLOSING"}))
+    symbols = transactions.raw("symbol")[rows]
+    futures = np.isin(symbols, _FuturesCodes(transactions, np.unique(symbols)))
+    futures &= opening
+
+    # Sum the costs, commissions and fees at the largest of their scales.
+    names = ("cost", "commissions", "fees")
+    scale = max(transactions.scale(name) for name in names)
+    cost_opened = [0] * len(marked)
+    cost_closed = [0] * len(marked)
+    for name in names:
+        values = transactions.raw(name)[rows]
+        factor = 10 ** (scale - transactions.scale(name))
+        for sums, mask in ((cost_opened, opening), (cost_closed, closing)):
+            for index, value in enumerate(
+                _Sums(values[mask], groups[mask], len(marked))
+            ):
+                sums[index] += value * factor
+    futures_notional_open = [
+        value * 10 ** (scale - transactions.scale("cost"))
+        for value in _Sums(
+            transactions.raw("cost")[rows][futures], groups[futures], len(marked)
+        )
+    ]
+
+    # Locate the matches in their table, by match id first, which is the more
+    # selective.
+    marked_rows = rows[np.unique(groups, return_index=True)[1]]
+    match_keys = list(
+        zip(
+            _Strings(transactions, "match_id", match_codes[marked_rows]),
+            _Strings(transactions, "chain_id", chain_codes[marked_rows]),
+        )
+    )
+    positions = None
+    if path.exists(filename) and colstore.IsColumnar(filename):
+        matches = colstore.Read(filename)
+        if matches.header() == tuple(match.MATCHES_FIELDS):
+            try:
+                positions = _Locate(matches, ["match_id", "chain_id"], match_keys)
+            except ValueError:
+                pass  # The ids aren't stored as strings.
+    if positions is None or None in positions:
+        logging.warning(f"Writing all the matches to {filename}")
+        colstore.Write(match.MatchesTable(transactions), filename)
+        return len(marked)
+
+    instypes = matches.cut("instype").take(positions).values("instype")
+    values = [
+        match.MarkValues(
+            instype,
+            Decimal(opened).scaleb(-scale),
+            Decimal(closed).scaleb(-scale),
+            Decimal(notional).scaleb(-scale),
+        )
+        for instype, opened, closed, notional in zip(
+            instypes, cost_opened, cost_closed, futures_notional_open
+        )
+    ]
+    colstore.Update(
+        filename,
+        positions,
+        {
+            name: [row[column] for row in values]
+            for column, name in enumerate(match.MARK_FIELDS)
+        },
+    )
+    return len(positions)
+
+
+def _Codes(table: Table, name: str, strings: set) -> List[int]:
+    """Return the codes of some strings in the dictionary of a column."""
+    return [
+        code for code, string in enumerate(table.dictionary(name)) if string in strings
+    ]
+
+
+def _CodePositions(table: Table, name: str, strings: set) -> np.ndarray:
+    """Return the positions of the rows of a string column with some values."""
+    return np.flatnonzero(np.isin(table.raw(name), _Codes(table, name, strings)))
+
+
+def _Strings(table: Table, name: str, codes: np.ndarray) -> List[str]:
+    """Return the strings of some codes of a column, None for code -1."""
+    strings = table.dictionary(name, codes[codes >= 0].tolist())
+    it = iter(strings)
+    return [None if code < 0 else next(it) for code in codes.tolist()]
+
+
+def _Locate(
+    table: Table, names: List[str], keys: List[Tuple[str, ...]]
+) -> List[Optional[int]]:
+    """Return the positions of the rows of a table with some keys, the values of
+    some string columns, or None for keys which aren't present. Only the rows
+    with the values of the first column in the keys are decoded."""
+    wanted = {key[0] for key in keys}
+    codes = [
+        code
+        for code, string in enumerate(table.dictionary(names[0]))
+        if string in wanted
+    ]
+    if None in wanted:
+        codes.append(-1)
+    rows = np.flatnonzero(np.isin(table.raw(names[0]), codes))
+    index = dict(
+        zip(
+            zip(*[_Strings(table, name, table.raw(name)[rows]) for name in names]),
+            rows.tolist(),
+        )
+    )
+    return [index.get(key) for key in keys]
+
+
+def _FuturesCodes(table: Table, codes: np.ndarray) -> List[int]:
+    """Return those of the codes of the symbols which are futures."""
+    codes = codes[codes >= 0].tolist()
+    return [
+        code
+        for code, symbol in zip(codes, table.dictionary("symbol", codes))
+        if instrument.FromString(symbol).instype == "Future"
+    ]
+
+
+def _Sums(values: np.ndarray, groups: np.ndarray, size: int) -> List[int]:
+    """Sum scaled integers by group, exactly. Python integers are used if the
+    sums could overflow 64 bits."""
+    if values.size and np.abs(values.astype(np.float64)).sum() >= 2.0**62:
+        values = values.astype(object)
+    sums = np.zeros(size, dtype=values.dtype)
+    np.add.at(sums, groups, values)
+    return [int(value) for value in sums.tolist()]
+
+
+def _Quantize(value: int, scale: int) -> Decimal:
+    """Convert a sum of scaled integers to a Decimal, quantized."""
+    return Decimal(value).scaleb(-scale).quantize(chainslib.Q)
@@ -0,0 +1,169 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+import logging
+import os
+import random
+import tempfile
+import unittest
+
+from johnny.base import chains
+from johnny.base import colstore
+from johnny.base import config as configlib
+from johnny.base import mark
+from johnny.base import match
+from johnny.base import remark
+from johnny.base.etl import petl, Table
+from johnny.testing import synthetic
+
+
+def Rows(table: Table):
+    # Compare representations, to catch differing Decimal exponents and signs.
+    return [tuple(map(repr, row)) for row in table]
+
+
+class TestRemark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+        try:
+            txns = synthetic.GenerateTransactions(2000, seed=3)
+            matched = match.Process(txns, synthetic.GetEndTime(txns))
+            marked = mark.Mark(matched, mark.FetchPricesFromTransactionsLog(matched))
+            chained, cls.chains_db = chains.ChainTransactions(
+                marked, configlib.Chains()
+            )
+            cls.chained = petl.wrap([tuple(row) for row in chained])
+            cls.chains_table, transactions = chains.TransactionsTableToChainsTable(
+                cls.chained, cls.chains_db
+            )
+            cls.transactions = petl.wrap([tuple(row) for row in transactions])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        # New prices, with more decimal places than the old ones.
+        rng = random.Random(3)
+        cls.price_map = {
+            symbol: (
+                (price * rng.randint(50, 150) / 100).quantize(Decimal("0.0001")),
+                "x",
+            )
+            for symbol, price in cls.transactions.cut("symbol", "price").data()
+        }
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filenames = {
+            name: path.join(self.tmpdir.name, f"{name}.db")
+            for name in ("transactions", "chains", "matches")
+        }
+        colstore.Write(self.transactions, self.filenames["transactions"])
+        colstore.Write(self.chains_table, self.filenames["chains"])
+        colstore.Write(match.MatchesTable(self.transactions), self.filenames["matches"])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def remark(self):
+        filename = self.filenames["transactions"]
+        transactions = colstore.Read(filename)
+        positions = remark.MarkPositions(transactions)
+        marks = mark.Mark(transactions.take(positions), self.price_map)
+        colstore.Update(
+            filename,
+            positions,
+            {name: marks.values(name) for name in mark.MARK_FIELDS},
+        )
+        transactions = colstore.Read(filename)
+        num_chains = remark.UpdateChains(
+            self.filenames["chains"], transactions, positions
+        )
+        num_matches = remark.UpdateMatches(
+            self.filenames["matches"], transactions, positions
+        )
+        return num_chains, num_matches
+
+    def expected(self, name: str) -> Table:
+        # Write the tables of a full import at the new prices, and read them back.
+        logging.disable(logging.WARNING)
+        try:
+            chains_table, transactions = chains.TransactionsTableToChainsTable(
+                mark.Mark(self.chained, self.price_map), self.chains_db
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+        table = match.MatchesTable(transactions) if name == "matches" else chains_table
+        filename = path.join(self.tmpdir.name, f"expected_{name}.db")
+        colstore.Write(table, filename)
+        return colstore.Read(filename)
+
+    def test_mark_positions(self):
+        transactions = colstore.Read(self.filenames["transactions"])
+        self.assertEqual(
+            [
+                pos
+                for pos, rowtype in enumerate(self.transactions.values("rowtype"))
+                if rowtype == "Mark"
+            ],
+            remark.MarkPositions(transactions).tolist(),
+        )
+
+    def test_price_map(self):
+        transactions = colstore.Read(self.filenames["transactions"])
+        positions = remark.MarkPositions(transactions)
+        symbols = {transactions.values("symbol")[pos] for pos in positions}
+        self.assertTrue(symbols)
+        expected = {
+            symbol: price
+            for symbol, price in mark.GetPriceMap(
+                self.transactions, configlib.Config()
+            ).items()
+            if symbol in symbols
+        }
+        self.assertEqual(
+            repr(sorted(expected.items())),
+            repr(
+                sorted(
+                    remark.GetPriceMap(
+                        transactions, positions, configlib.Config()
+                    ).items()
+                )
+            ),
+        )
+
+    def test_identical(self):
+        previous = {
+            name: Rows(colstore.Read(self.filenames[name]))
+            for name in ("chains", "matches")
+        }
+        num_chains, num_matches = self.remark()
+        self.assertGreater(num_chains, 0)
+        self.assertGreater(num_matches, 0)
+        for name in "chains", "matches":
+            expected = Rows(self.expected(name))
+            self.assertEqual(expected, Rows(colstore.Read(self.filenames[name])))
+            self.assertNotEqual(previous[name], expected)
+
+    def test_missing_matches(self):
+        os.remove(self.filenames["matches"])
+        with self.assertLogs(level="WARNING"):
+            self.remark()
+        self.assertEqual(
+            Rows(self.expected("matches")),
+            Rows(colstore.Read(self.filenames["matches"])),
+        )
+
+    def test_no_marks(self):
+        transactions = colstore.Read(self.filenames["transactions"])
+        self.assertEqual(
+            0, remark.UpdateChains(self.filenames["chains"], transactions, [])
+        )
+        self.assertEqual(
+            0, remark.UpdateMatches(self.filenames["matches"], transactions, [])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
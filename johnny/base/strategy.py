@@ -18,7 +18,6 @@ import itertools
 import logging
 
 from more_itertools import first
-import networkx as nx
 
 from johnny.base import config as configlib
 from johnny.base import instrument
@@ -0,0 +1,469 @@
+"""Deterministic generator of synthetic normalized transactions logs.
+
+This produces realistic-looking logs in the normalized format described in
+johnny/base/transactions.md, for benchmarking and testing the processing
+pipeline at arbitrary scale without real account data. The logs include stocks, equity and
+index options, futures and futures options, traded across multiple accounts as
+multi-leg orders which are later adjusted, rolled, closed, expired or assigned.
+The same seed and size always produce the same log.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import datetime
+import math
+import random
+
+from johnny.base import instrument
+from johnny.base import transactions as txnlib
+from johnny.base.etl import petl, Table
+
+
+ZERO = Decimal(0)
+Q = Decimal("0.01")
+
+# Default list of accounts to spread the trades over.
+ACCOUNTS = ("x1234", "x5678", "tasty")
+
+# Start time of the generated logs.
+START_TIME = datetime.datetime(2021, 1, 4, 9, 30)
+
+# Approximate number of trading days spanned by the generated logs, regardless
+# of their size, so that they all include expirations and rolls.
+NUM_DAYS = 500
+
+# Number of seconds in a trading session.
+SESSION_SECONDS = 6 * 3600 + 1800
+
+# Underlyings, as (initial price, strike increment).
+EQUITIES = {
+    "AAPL": (130, 5),
+    "AMZN": (3200, 50),
+    "GLD": (180, 1),
+    "IWM": (200, 1),
+    "MSFT": (220, 5),
+    "NKE": (140, 5),
+    "QQQ": (310, 5),
+    "SPX": (3700, 25),
+    "SPY": (370, 5),
+    "TLT": (160, 1),
+    "XLE": (40, 1),
+}
+
+# Futures products, as (initial price, strike increment, options product code).
+FUTURES = {
+    "/CL": (48, Decimal("0.5"), "LO"),
+    "/ES": (3700, 25, "EW"),
+    "/GC": (1900, 10, "OG"),
+    "/NQ": (12800, 100, "QNE"),
+    "/ZN": (137, Decimal("0.5"), "OZN"),
+}
+
+# Strategies, as lists of legs of (putcall, strike offset, signed ratio). A
+# putcall of None is the underlying itself.
+STRATEGIES = {
+    "Equity": [(None, 0, 100)],
+    "ShortPut": [("P", -0.05, -1)],
+    "Vertical": [("P", -0.05, -1), ("P", -0.10, 1)],
+    "Strangle": [("P", -0.10, -1), ("C", 0.10, -1)],
+    "IronCondor": [("P", -0.10, 1), ("P", -0.05, -1), ("C", 0.05, -1), ("C", 0.10, 1)],
+    "Future": [(None, 0, 1)],
+    "FutureStrangle": [("P", -0.05, -1), ("C", 0.05, -1)],
+}
+
+FUTURES_STRATEGIES = {"Future", "FutureStrangle"}
+
+# Futures contract month codes, and the quarterly ones.
+MONTH_CODES = "FGHJKMNQUVXZ"
+QUARTER_CODES = "HMUZ"
+
+
+class Leg(NamedTuple):
+    """A position in a single instrument held by a synthetic trade."""
+
+    symbol: str
+    quantity: int
+    multiplier: Decimal
+
+
+class Trade(NamedTuple):
+    """A synthetic trade, a set of legs opened together."""
+
+    account: str
+    strategy: str
+    underlying: str
+    expiration: Optional[datetime.date]
+    legs: List[Leg]
+    # The time after which the trade may be adjusted or closed.
+    due: datetime.datetime
+
+
+class Generator:
+    """A stateful generator of transactions rows."""
+
+    def __init__(self, seed: int, accounts: Tuple[str, ...], max_gap: int):
+        self.rng = random.Random(seed)
+        self.accounts = accounts
+        self.max_gap = max_gap
+        self.dt = START_TIME
+        self.rows: List[Tuple] = []
+        self.trades: List[Trade] = []
+        self.held: Dict[Tuple[str, str], int] = {}
+        self.date = self.dt.date()
+        self.prices: Dict[str, float] = {}
+        self.updates: Dict[str, datetime.datetime] = {}
+        self.num_orders = 0
+
+    def advance(self):
+        """Move time forward, during trading hours."""
+        self.dt += datetime.timedelta(seconds=self.rng.randint(1, self.max_gap))
+        if self.dt.hour >= 16:
+            days = 3 if self.dt.weekday() == 4 else 1
+            self.dt = datetime.datetime.combine(
+                self.dt.date() + datetime.timedelta(days=days), datetime.time(9, 30)
+            )
+
+    def price(self, underlying: str, initial: float) -> float:
+        """Random walk the price of an underlying, with 30% annual volatility."""
+        price = self.prices.get(underlying, initial)
+        last_dt = self.updates.get(underlying, START_TIME)
+        years = (self.dt - last_dt).total_seconds() / (365 * 86400)
+        price *= math.exp(self.rng.gauss(0, 0.30 * math.sqrt(years)))
+        self.prices[underlying] = price
+        self.updates[underlying] = self.dt
+        return price
+
+    def order_id(self) -> str:
+        self.num_orders += 1
+        return "O{:08d}".format(self.num_orders)
+
+    def add_row(
+        self,
+        account: str,
+        rowtype: str,
+        order_id: str,
+        leg: Leg,
+        effect: str,
+        quantity: int,
+        price: Decimal,
+    ):
+        """Append a normalized row for a change in the given leg."""
+        key = (account, leg.symbol)
+        position = self.held.get(key, 0) + quantity
+        if position:
+            self.held[key] = position
+        else:
+            del self.held[key]
+        instruction = "BUY" if quantity > 0 else "SELL"
+        quantity = Decimal(abs(quantity))
+        sign = -1 if instruction == "BUY" else 1
+        cost = (sign * quantity * price * leg.multiplier).quantize(Q) if price else ZERO
+        if rowtype != "Trade" or leg.multiplier == 1:
+            commissions, fees = ZERO, ZERO
+        elif leg.symbol.startswith("/"):
+            commissions = (Decimal("-1.25") * quantity).quantize(Q)
+            fees = (Decimal("-1.52") * quantity).quantize(Q)
+        else:
+            commissions = -min(quantity, 10) if effect == "OPENING" else ZERO
+            fees = (Decimal("-0.14") * quantity).quantize(Q)
+        self.rows.append(
+            (
+                account,
+                "T{:09d}".format(len(self.rows)),
+                self.dt,
+                rowtype,
+                order_id,
+                leg.symbol,
+                effect,
+                instruction,
+                quantity,
+                price,
+                cost,
+                commissions,
+                fees,
+                "{} {} {}".format(instruction, quantity, leg.symbol),
+            )
+        )
+
+    def quote(self, trade: Trade, leg: Leg) -> Decimal:
+        """Make up a price for a leg."""
+        inst = instrument.FromString(leg.symbol)
+        if trade.underlying in FUTURES:
+            underlying_price = self.prices[trade.underlying]
+        else:
+            underlying_price = self.prices[inst.underlying]
+        if not inst.putcall:
+            return Decimal(underlying_price).quantize(Q)
+        days = max((trade.expiration - self.dt.date()).days, 0)
+        intrinsic = float(
+            underlying_price - float(inst.strike)
+            if inst.putcall == "C"
+            else float(inst.strike) - underlying_price
+        )
+        extrinsic = underlying_price * 0.01 * math.sqrt(days / 30.0)
+        return Decimal(max(intrinsic, 0) + extrinsic + 0.01).quantize(Q)
+
+    def make_legs(
+        self, strategy: str, underlying: str, expiration: datetime.date
+    ) -> List[Leg]:
+        """Create the legs of a new trade."""
+        if strategy in FUTURES_STRATEGIES:
+            initial, increment, optcode = FUTURES[underlying]
+            price = self.price(underlying, initial)
+            month = QUARTER_CODES[(expiration.month - 1) // 3]
+            contract = "{}{}{}".format(underlying, month, expiration.strftime("%y"))
+            self.prices[contract] = price
+        else:
+            initial, increment = EQUITIES[underlying]
+            price = self.price(underlying, initial)
+            contract = underlying
+        size = self.rng.choice([1, 1, 1, 2, 3, 5])
+        legs = []
+        for putcall, offset, ratio in STRATEGIES[strategy]:
+            if putcall is None:
+                symbol = contract
+            else:
+                strike = Decimal(round(price * (1 + offset) / float(increment)))
+                strike *= increment
+                if strike == strike.to_integral():
+                    strike = strike.quantize(1)
+                inst = instrument.FromColumns(
+                    contract,
+                    None if contract.startswith("/") else expiration,
+                    "{}{}{}".format(
+                        optcode,
+                        MONTH_CODES[expiration.month - 1],
+                        expiration.strftime("%y"),
+                    )
+                    if contract.startswith("/")
+                    else None,
+                    putcall,
+                    strike,
+                    None,
+                )
+                symbol = instrument.ToString(inst)
+            multiplier = instrument.FromString(symbol).multiplier
+            legs.append(Leg(symbol, ratio * size, multiplier))
+        return legs
+
+    def conflicts(self, account: str, legs: List[Leg]) -> bool:
+        """Return true if any of the legs would reduce the position of another
+        leg in the same account."""
+        signs = {}
+        for leg in legs:
+            position = self.held.get((account, leg.symbol), 0) or signs.get(
+                leg.symbol, 0
+            )
+            if position * leg.quantity < 0:
+                return True
+            signs[leg.symbol] = leg.quantity
+        return False
+
+    def due(self) -> datetime.datetime:
+        """Return a time after which a new or adjusted trade is managed."""
+        return self.dt + datetime.timedelta(days=self.rng.uniform(1, 30))
+
+    def pop_trade(self, index: int) -> Trade:
+        """Remove the trade at the given index, in constant time."""
+        trade = self.trades[index]
+        self.trades[index] = self.trades[-1]
+        self.trades.pop()
+        return trade
+
+    def open_trade(self):
+        strategy = self.rng.choice(list(STRATEGIES))
+        if strategy in FUTURES_STRATEGIES:
+            underlying = self.rng.choice(list(FUTURES))
+        else:
+            underlying = self.rng.choice(list(EQUITIES))
+        expiration = self.expiration(self.dt.date() + datetime.timedelta(days=30))
+        legs = self.make_legs(strategy, underlying, expiration)
+        account = self.rng.choice(self.accounts)
+        if self.conflicts(account, legs):
+            return
+        is_option = any("_" in leg.symbol for leg in legs)
+        trade = Trade(
+            account,
+            strategy,
+            underlying,
+            expiration if is_option else None,
+            legs,
+            self.due(),
+        )
+        order_id = self.order_id()
+        for leg in legs:
+            self.add_row(
+                trade.account,
+                "Trade",
+                order_id,
+                leg,
+                "OPENING",
+                leg.quantity,
+                self.quote(trade, leg),
+            )
+        self.trades.append(trade)
+
+    def expiration(self, date: datetime.date) -> datetime.date:
+        """Return the third Friday of the month following the given date."""
+        first = (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        return first + datetime.timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+    def close_trade(self, index: int, order_id: Optional[str] = None) -> Trade:
+        trade = self.pop_trade(index)
+        order_id = order_id or self.order_id()
+        for leg in trade.legs:
+            self.add_row(
+                trade.account,
+                "Trade",
+                order_id,
+                leg,
+                "CLOSING",
+                -leg.quantity,
+                self.quote(trade, leg),
+            )
+        return trade
+
+    def roll_trade(self, index: int):
+        """Close a trade and reopen it at the next expiration in the same order."""
+        order_id = self.order_id()
+        trade = self.close_trade(index, order_id)
+        expiration = self.expiration(trade.expiration)
+        legs = self.make_legs(trade.strategy, trade.underlying, expiration)
+        if self.conflicts(trade.account, legs):
+            return
+        rolled = trade._replace(expiration=expiration, legs=legs, due=self.due())
+        for leg in legs:
+            self.add_row(
+                rolled.account,
+                "Trade",
+                order_id,
+                leg,
+                "OPENING",
+                leg.quantity,
+                self.quote(rolled, leg),
+            )
+        self.trades.append(rolled)
+
+    def adjust_trade(self, index: int):
+        """Partially close or add to a single leg of the trade."""
+        trade = self.trades[index]
+        self.trades[index] = trade._replace(due=self.due())
+        lindex = self.rng.randrange(len(trade.legs))
+        leg = trade.legs[lindex]
+        sign = 1 if leg.quantity > 0 else -1
+        if abs(leg.quantity) > 1 and self.rng.random() < 0.5:
+            change = -sign * self.rng.randint(1, abs(leg.quantity) - 1)
+            effect = "CLOSING"
+        else:
+            change = sign * self.rng.randint(1, 2)
+            effect = "OPENING"
+        self.add_row(
+            trade.account,
+            "Trade",
+            self.order_id(),
+            leg,
+            effect,
+            change,
+            self.quote(trade, leg),
+        )
+        trade.legs[lindex] = leg._replace(quantity=leg.quantity + change)
+
+    def expire_trades(self):
+        """Expire or assign the trades past their expiration date. Positions in
+        the same instrument held by multiple trades are expired together."""
+        expiring = [
+            index
+            for index, trade in enumerate(self.trades)
+            if trade.expiration and trade.expiration < self.dt.date()
+        ]
+        positions: Dict[Tuple[str, str], Leg] = {}
+        for index in reversed(expiring):
+            trade = self.pop_trade(index)
+            for leg in trade.legs:
+                key = (trade.account, leg.symbol)
+                if key in positions:
+                    leg = leg._replace(quantity=leg.quantity + positions[key].quantity)
+                positions[key] = leg
+
+        for (account, _), leg in positions.items():
+            order_id = self.order_id()
+            inst = instrument.FromString(leg.symbol)
+            assign = (
+                inst.putcall == "P"
+                and leg.quantity < 0
+                and inst.instype == "EquityOption"
+                and self.rng.random() < 0.2
+            )
+            self.add_row(
+                account,
+                "Assign" if assign else "Expire",
+                order_id,
+                leg,
+                "CLOSING",
+                -leg.quantity,
+                ZERO,
+            )
+            if assign:
+                stock = Leg(inst.underlying, -leg.quantity * 100, 1)
+                self.add_row(
+                    account,
+                    "Trade",
+                    order_id,
+                    stock,
+                    "OPENING",
+                    stock.quantity,
+                    inst.strike,
+                )
+                self.trades.append(
+                    Trade(account, "Equity", inst.underlying, None, [stock], self.due())
+                )
+
+    def step(self):
+        """Generate the next event."""
+        self.advance()
+        if self.dt.date() != self.date:
+            self.date = self.dt.date()
+            self.expire_trades()
+        choice = self.rng.random()
+        if not self.trades or choice < 0.35:
+            self.open_trade()
+            return
+        index = self.rng.randrange(len(self.trades))
+        trade = self.trades[index]
+        if trade.due > self.dt:
+            self.open_trade()
+        elif choice < 0.65:
+            self.close_trade(index)
+        elif choice < 0.80 and trade.expiration:
+            self.roll_trade(index)
+        else:
+            self.adjust_trade(index)
+
+
+def GenerateTransactions(
+    num_rows: int, seed: int = 0, accounts: Tuple[str, ...] = ACCOUNTS
+) -> Table:
+    """Generate a normalized transactions log of `num_rows` rows, in time order."""
+    # Each event produces about two rows on average.
+    max_gap = max(1, 4 * SESSION_SECONDS * NUM_DAYS // num_rows)
+    generator = Generator(seed, accounts, max_gap)
+    while len(generator.rows) < num_rows:
+        generator.step()
+    return petl.wrap([txnlib.FIELDS] + generator.rows[:num_rows])
+
+
+def GenerateStreams(
+    num_rows: int, seed: int = 0, accounts: Tuple[str, ...] = ACCOUNTS
+) -> List[Table]:
+    """Generate the same log as `GenerateTransactions()`, split per account. Each
+    table is sorted by (datetime, account), as for `match.Process()`."""
+    table = GenerateTransactions(num_rows, seed, accounts)
+    return [table.selecteq("account", account) for account in accounts]
+
+
+def GetEndTime(table: Table) -> datetime.datetime:
+    """Return a mark time after the end of a generated log."""
+    return max(table.values("datetime")) + datetime.timedelta(days=1)
@@ -0,0 +1,86 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import collections
+import logging
+import unittest
+
+from johnny.base import chains
+from johnny.base import config as configlib
+from johnny.base import instrument
+from johnny.base import match
+from johnny.testing import synthetic
+from johnny.base import transactions as txnlib
+
+
+class TestSynthetic(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.transactions = synthetic.GenerateTransactions(3000, seed=1)
+
+    def test_valid(self):
+        self.assertEqual(3000, self.transactions.nrows())
+        txnlib.ValidateFieldNames(self.transactions)
+        for rec in self.transactions.records():
+            txnlib.ValidateTransactionRecord(rec)
+        self.assertEqual(
+            list(self.transactions.values("transaction_id")),
+            sorted(set(self.transactions.values("transaction_id"))),
+        )
+        self.assertTrue(self.transactions.issorted("datetime"))
+
+    def test_coverage(self):
+        self.assertEqual(
+            {"Trade", "Expire", "Assign"}, set(self.transactions.values("rowtype"))
+        )
+        self.assertEqual(
+            set(synthetic.ACCOUNTS), set(self.transactions.values("account"))
+        )
+        instypes = {
+            instrument.FromString(symbol).instype
+            for symbol in self.transactions.values("symbol")
+        }
+        self.assertEqual(
+            {
+                "Equity",
+                "EquityOption",
+                "Collectibles",
+                "NonEquityOption",
+                "IndexOption",
+                "Future",
+                "FutureOption",
+            },
+            instypes,
+        )
+        # Multi-leg orders, e.g. iron condors and their rolls.
+        legs = set(collections.Counter(self.transactions.values("order_id")).values())
+        self.assertTrue({1, 2, 4, 8}.issubset(legs))
+
+    def test_deterministic(self):
+        self.assertEqual(
+            list(self.transactions), list(synthetic.GenerateTransactions(3000, seed=1))
+        )
+        self.assertNotEqual(
+            list(self.transactions), list(synthetic.GenerateTransactions(3000, seed=2))
+        )
+
+    def test_process(self):
+        mark_time = synthetic.GetEndTime(self.transactions)
+        streams = synthetic.GenerateStreams(3000, seed=1)
+        self.assertEqual(3000, sum(stream.nrows() for stream in streams))
+        matched = match.Process(streams, mark_time)
+        # Rows at the same time are ordered by account when merged.
+        self.assertEqual(
+            sorted(match.Process(self.transactions, mark_time).records()),
+            sorted(matched.records()),
+        )
+        logging.disable(logging.WARNING)
+        try:
+            chained, _ = chains.ChainTransactions(matched, configlib.Chains())
+            self.assertGreater(len(set(chained.values("chain_id"))), 10)
+        finally:
+            logging.disable(logging.NOTSET)
+
+
+if __name__ == "__main__":
+    unittest.main()
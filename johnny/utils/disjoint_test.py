@@ -0,0 +1,49 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import random
+import unittest
+
+from johnny.utils import disjoint
+
+
+class TestDisjointSet(unittest.TestCase):
+    def test_add(self):
+        djs = disjoint.DisjointSet()
+        self.assertEqual(0, len(djs))
+        self.assertEqual([0, 1, 2], [djs.add() for _ in range(3)])
+        self.assertEqual(3, len(djs))
+        self.assertEqual([[0], [1], [2]], djs.groups(range(3)))
+
+    def test_union(self):
+        djs = disjoint.DisjointSet(6)
+        djs.union(0, 3)
+        djs.union(4, 3)
+        djs.union(1, 5)
+        self.assertEqual(djs.find(0), djs.find(4))
+        self.assertNotEqual(djs.find(0), djs.find(1))
+        self.assertEqual(djs.union(0, 4), djs.find(3))
+        self.assertEqual([[0, 3, 4], [1, 5], [2]], djs.groups(range(6)))
+        self.assertEqual([[5, 1], [4, 0]], djs.groups([5, 4, 1, 0]))
+
+    def test_random(self):
+        # Compare against a naive labeling.
+        rng = random.Random(42)
+        size = 500
+        djs = disjoint.DisjointSet(size)
+        labels = list(range(size))
+        for _ in range(300):
+            element1, element2 = rng.randrange(size), rng.randrange(size)
+            djs.union(element1, element2)
+            old, new = labels[element1], labels[element2]
+            labels = [new if label == old else label for label in labels]
+        for element1 in range(0, size, 7):
+            for element2 in range(0, size, 11):
+                self.assertEqual(
+                    labels[element1] == labels[element2],
+                    djs.find(element1) == djs.find(element2),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""A static interval tree for stabbing queries.
+
+The index is built once from a list of closed intervals `[lo, hi]` and answers
+the query "which intervals contain this point?" in time proportional to the
+logarithm of the number of intervals plus the number of intervals returned.
+The endpoints may be of any ordered type, e.g. dates.
+
+This is a centered interval tree: each node holds the intervals which contain
+its center point, sorted once by their lower endpoint and once by their upper
+endpoint, and the intervals entirely to the left and to the right of the center
+are stored in its children.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class _Node(NamedTuple):
+    center: Any
+    # Intervals containing the center, as (lo, hi, value) tuples.
+    by_lo: List[Tuple]
+    by_hi: List[Tuple]
+    left: Optional["_Node"]
+    right: Optional["_Node"]
+
+
+class IntervalIndex:
+    """An immutable index of closed intervals, each associated with a value."""
+
+    def __init__(self, intervals: Iterable[Tuple[Any, Any, Any]]):
+        intervals = list(intervals)
+        for lo, hi, _ in intervals:
+            if hi < lo:
+                raise ValueError(f"Invalid interval: [{lo}, {hi}]")
+        self.size = len(intervals)
+        self.root = _Build(intervals)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def stab(self, point: Any) -> List[Any]:
+        """Return the values of the intervals containing `point`, in no
+        particular order."""
+        values = []
+        node = self.root
+        while node is not None:
+            if point < node.center:
+                for lo, _, value in node.by_lo:
+                    if lo > point:
+                        break
+                    values.append(value)
+                node = node.left
+            elif point > node.center:
+                for _, hi, value in node.by_hi:
+                    if hi < point:
+                        break
+                    values.append(value)
+                node = node.right
+            else:
+                values.extend(value for _, _, value in node.by_lo)
+                break
+        return values
+
+
+def _Build(intervals: List[Tuple]) -> Optional[_Node]:
+    """Build the tree of a list of intervals."""
+    if not intervals:
+        return None
+    endpoints = sorted(endpoint for lo, hi, _ in intervals for endpoint in (lo, hi))
+    center = endpoints[len(endpoints) // 2]
+    left, middle, right = [], [], []
+    for interval in intervals:
+        if interval[1] < center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            middle.append(interval)
+    return _Node(
+        center,
+        sorted(middle, key=lambda interval: interval[0]),
+        sorted(middle, key=lambda interval: interval[1], reverse=True),
+        _Build(left),
+        _Build(right),
+    )
@@ -0,0 +1,51 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import datetime
+import random
+import unittest
+
+from johnny.utils.intervals import IntervalIndex
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_empty(self):
+        index = IntervalIndex([])
+        self.assertEqual(0, len(index))
+        self.assertEqual([], index.stab(1))
+
+    def test_stab(self):
+        index = IntervalIndex([(1, 3, "a"), (2, 2, "b"), (3, 8, "c"), (9, 10, "d")])
+        self.assertEqual([], index.stab(0))
+        self.assertEqual(["a"], sorted(index.stab(1)))
+        self.assertEqual(["a", "b"], sorted(index.stab(2)))
+        self.assertEqual(["a", "c"], sorted(index.stab(3)))
+        self.assertEqual(["c"], sorted(index.stab(8)))
+        self.assertEqual(["d"], sorted(index.stab(10)))
+        self.assertEqual([], index.stab(11))
+
+    def test_dates(self):
+        date = datetime.date(2021, 1, 4)
+        day = datetime.timedelta(days=1)
+        index = IntervalIndex([(date, date + 3 * day, "a")])
+        self.assertEqual(["a"], index.stab(date + day))
+        self.assertEqual([], index.stab(date - day))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            IntervalIndex([(2, 1, "a")])
+
+    def test_random(self):
+        rng = random.Random(1)
+        intervals = []
+        for value in range(2000):
+            lo = rng.randrange(1000)
+            intervals.append((lo, lo + rng.randrange(60), value))
+        index = IntervalIndex(intervals)
+        for point in range(-1, 1070):
+            expected = [value for lo, hi, value in intervals if lo <= point <= hi]
+            self.assertEqual(expected, sorted(index.stab(point)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,208 @@
 """Timing utils.
+
+Besides logging flat timing lines, timed operations can be collected by a
+`Profiler` into a tree of nested spans, each with its wall time, the CPU time
+of its thread, the resident memory of the process and its change over the span,
+and optional row counts. A profile can be exported as JSON or
+in the Chrome trace-event format, for viewing in chrome://tracing or Perfetto.
+Profiling is enabled by installing a profiler with `profiling()`; otherwise
+`log_time` only logs.
 """
 
 __copyright__ = "Copyright (C) 2021  Martin Blais"
 __license__ = "GNU GPLv2"
 
+from typing import Any, Dict, Iterator, List, Optional
+import collections
 import contextlib
+import json
+import os
+import threading
 import time
 
 
+class Span:
+    """A timed operation, with its nested operations."""
+
+    def __init__(self, name: str, start: float, thread_id: int):
+        self.name = name
+        self.thread_id = thread_id
+        # Start time in seconds, relative to the profiler creation.
+        self.start = start
+        # Wall time and CPU time of the thread, in seconds.
+        self.wall: Optional[float] = None
+        self.cpu: Optional[float] = None
+        # Resident set size of the process at the end of the span, and its change
+        # since the start of the span, in bytes. Note that this covers all the
+        # threads of the process.
+        self.rss: Optional[int] = None
+        self.rss_delta: Optional[int] = None
+        # Number of rows processed, if reported.
+        self.rows: Optional[int] = None
+        self.children: List["Span"] = []
+        self._cpu_start = time.thread_time()
+        self._rss_start = _get_rss()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "rss": self.rss,
+            "rss_delta": self.rss_delta,
+            "rows": self.rows,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+def _get_rss() -> Optional[int]:
+    """Return the current resident set size of the process, in bytes. This is
+    only available where /proc is."""
+    try:
+        with open("/proc/self/statm", "rb") as infile:
+            return int(infile.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Profiler:
+    """A collector of spans. Spans nest per thread. Only the most recent
+    `max_roots` top-level spans are kept, so that long-running processes can
+    stay profiled."""
+
+    def __init__(self, max_roots: Optional[int] = None):
+        self.epoch = time.perf_counter()
+        self.roots = collections.deque(maxlen=max_roots)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name: str) -> Span:
+        """Open a new span nested in the current one of this thread."""
+        stack = self._stack()
+        span = Span(name, time.perf_counter() - self.epoch, threading.get_ident())
+        if stack:
+            stack[-1].children.append(span)
+        else:
+            with self._lock:
+                self.roots.append(span)
+        stack.append(span)
+        return span
+
+    def end(self, span: Span):
+        """Close a span, and any of its unclosed children."""
+        stack = self._stack()
+        while stack:
+            if stack.pop() is span:
+                break
+        span.wall = time.perf_counter() - self.epoch - span.start
+        span.cpu = time.thread_time() - span._cpu_start
+        span.rss = _get_rss()
+        if span.rss is not None and span._rss_start is not None:
+            span.rss_delta = span.rss - span._rss_start
+
+    def current(self) -> Optional[Span]:
+        """Return the innermost open span of this thread."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            roots = list(self.roots)
+        return {"spans": [span.to_dict() for span in roots]}
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Convert to Chrome trace-event format, as complete events."""
+        with self._lock:
+            roots = list(self.roots)
+        pid = os.getpid()
+        events = []
+
+        def convert(span: Span):
+            if span.wall is None:
+                return
+            args = {"cpu_ms": span.cpu * 1000}
+            if span.rss is not None:
+                args["rss"] = span.rss
+            if span.rss_delta is not None:
+                args["rss_delta"] = span.rss_delta
+            if span.rows is not None:
+                args["rows"] = span.rows
+            events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.wall * 1e6,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": args,
+                }
+            )
+            for child in span.children:
+                convert(child)
+
+        for span in roots:
+            convert(span)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_json(self, filename: str):
+        with open(filename, "w") as outfile:
+            json.dump(self.to_json(), outfile, indent=2)
+
+    def write_chrome_trace(self, filename: str):
+        with open(filename, "w") as outfile:
+            json.dump(self.to_chrome_trace(), outfile)
+
+
+_PROFILER: Optional[Profiler] = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    """Return the active profiler, if any."""
+    return _PROFILER
+
+
+def set_profiler(profiler: Optional[Profiler]) -> Optional[Profiler]:
+    """Install a profiler to collect the spans of `log_time`, or none to disable
+    profiling. Returns the previously active profiler."""
+    global _PROFILER
+    previous, _PROFILER = _PROFILER, profiler
+    return previous
+
+
+@contextlib.contextmanager
+def profiling(profiler: Optional[Profiler] = None) -> Iterator[Profiler]:
+    """A context manager that installs a profiler for its duration. Yields the
+    profiler."""
+    profiler = profiler or Profiler()
+    previous = set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        set_profiler(previous)
+
+
+def add_rows(count: int):
+    """Add to the number of rows processed by the innermost active span."""
+    span = _PROFILER.current() if _PROFILER else None
+    if span is not None:
+        span.rows = (span.rows or 0) + count
+
+
 @contextlib.contextmanager
 def log_time(operation_name, log_timings, indent=0):
     """A context manager that times the block and logs it to info level.
 
+    If a profiler is active (see `profiling()`), the block is also recorded as
+    a span nested under any enclosing `log_time` block.
+
     Args:
       operation_name: A string, a label for the name of the operation.
       log_timings: A function to write log messages to. If left to None,
@@ -22,8 +213,14 @@ def log_time(operation_name, log_timings, indent=0):
     Yields:
       The start time of the operation.
     """
+    profiler = _PROFILER
+    span = profiler.begin(operation_name) if profiler else None
     time1 = time.time()
-    yield time1
+    try:
+        yield time1
+    finally:
+        if span is not None:
+            profiler.end(span)
     time2 = time.time()
     if log_timings:
         log_timings(
@@ -0,0 +1,137 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import threading
+import time
+import unittest
+
+from johnny.utils import timing
+
+
+class TestLogTime(unittest.TestCase):
+    def test_no_profiler(self):
+        lines = []
+        self.assertIsNone(timing.get_profiler())
+        with timing.log_time("op", lines.append):
+            timing.add_rows(10)
+        self.assertEqual(1, len(lines))
+        self.assertIn("'op'", lines[0])
+
+    def test_nested(self):
+        with timing.profiling() as profiler:
+            with timing.log_time("import", None):
+                with timing.log_time("match", None):
+                    timing.add_rows(10)
+                    timing.add_rows(5)
+                with timing.log_time("mark", None):
+                    pass
+        self.assertIsNone(timing.get_profiler())
+
+        (root,) = profiler.to_json()["spans"]
+        self.assertEqual("import", root["name"])
+        self.assertIsNone(root["rows"])
+        self.assertEqual(["match", "mark"], [c["name"] for c in root["children"]])
+        match = root["children"][0]
+        self.assertEqual(15, match["rows"])
+        self.assertGreaterEqual(root["wall"], match["wall"])
+        self.assertGreaterEqual(match["start"], root["start"])
+
+    def test_exception(self):
+        with timing.profiling() as profiler:
+            with self.assertRaises(ValueError):
+                with timing.log_time("failing", None):
+                    raise ValueError
+            self.assertIsNone(profiler.current())
+        (root,) = profiler.to_json()["spans"]
+        self.assertIsNotNone(root["wall"])
+
+
+class TestProfiler(unittest.TestCase):
+    def test_chrome_trace(self):
+        profiler = timing.Profiler()
+        outer = profiler.begin("outer")
+        inner = profiler.begin("inner")
+        inner.rows = 3
+        profiler.end(inner)
+        profiler.end(outer)
+        # Unclosed spans are not exported.
+        profiler.begin("open")
+
+        trace = profiler.to_chrome_trace()
+        events = trace["traceEvents"]
+        self.assertEqual(["outer", "inner"], [e["name"] for e in events])
+        for event in events:
+            self.assertEqual("X", event["ph"])
+            for field in "ts", "dur", "pid", "tid":
+                self.assertIn(field, event)
+            self.assertIn("cpu_ms", event["args"])
+        self.assertEqual(3, events[1]["args"]["rows"])
+        self.assertNotIn("rows", events[0]["args"])
+
+    def test_end_closes_children(self):
+        profiler = timing.Profiler()
+        outer = profiler.begin("outer")
+        profiler.begin("inner")
+        profiler.end(outer)
+        self.assertIsNone(profiler.current())
+
+    def test_max_roots(self):
+        profiler = timing.Profiler(max_roots=2)
+        for name in "abc":
+            profiler.end(profiler.begin(name))
+        self.assertEqual(["b", "c"], [s["name"] for s in profiler.to_json()["spans"]])
+
+    def test_thread_cpu(self):
+        # The CPU time of other threads isn't charged to the span.
+        profiler = timing.Profiler()
+        done = threading.Event()
+
+        def spin():
+            while not done.is_set():
+                pass
+
+        thread = threading.Thread(target=spin)
+        thread.start()
+        try:
+            span = profiler.begin("waiting")
+            time.sleep(0.2)
+            profiler.end(span)
+        finally:
+            done.set()
+            thread.join()
+        self.assertLess(span.cpu, 0.1)
+
+    @unittest.skipIf(timing._get_rss() is None, "RSS is not available")
+    def test_rss_delta(self):
+        profiler = timing.Profiler()
+        span = profiler.begin("allocate")
+        data = b"x" * (64 << 20)
+        profiler.end(span)
+        self.assertGreater(span.rss_delta, 32 << 20)
+        self.assertGreater(span.rss, span.rss_delta)
+        del data
+
+        span = profiler.begin("idle")
+        profiler.end(span)
+        self.assertLess(span.rss_delta, 32 << 20)
+
+    def test_threads(self):
+        profiler = timing.Profiler()
+        outer = profiler.begin("main")
+
+        def run():
+            profiler.end(profiler.begin("thread"))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        profiler.end(outer)
+
+        # Spans opened in another thread are not nested under this one's.
+        roots = profiler.to_json()["spans"]
+        self.assertEqual(["main", "thread"], [s["name"] for s in roots])
+        self.assertEqual([], roots[0]["children"])
+
+
+if __name__ == "__main__":
+    unittest.main()
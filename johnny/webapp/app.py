@@ -8,44 +8,38 @@ __license__ = "GNU GPLv2"
 from decimal import Decimal
 from functools import partial
 from os import path
-from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
 import io
 import datetime
 import functools
-import itertools
+import hashlib
 import os
-import re
 import threading
 import logging
-import tempfile
+import time
+
+_IMPORT_START = time.perf_counter()
 
 import dateutil.parser
 import numpy as np
-import networkx as nx
-import seaborn as sns
-
-try:
-    from johnny.exports import beanjohn
-except ImportError:
-    beanjohn = None
-
-sns.set()
-from matplotlib import pyplot
-import matplotlib
-
-matplotlib.use("Agg")
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from more_itertools import first
 
 import flask
 
 from johnny.base import chains as chainslib
+from johnny.base import colstore
 from johnny.base import config as configlib
+from johnny.base import exposure as exposurelib
 from johnny.base import instrument
 from johnny.base import mark
 from johnny.base import match
 from johnny.base import recap as recaplib
-from johnny.base.etl import petl, Table, Record
+from johnny.base.etl import petl, IndexedTable, Table, Record
+from johnny.utils import timing
+from johnny.webapp import cache
+from johnny.webapp import chainframe
+from johnny.webapp import datatables
+from johnny.webapp import htmltable
+from johnny.webapp import renderer
 
 ChainStatus = chainslib.ChainStatus
 Chain = configlib.Chain
@@ -64,14 +58,82 @@ app = flask.Flask(
 app.logger.setLevel(logging.INFO)
 
 
+# Default interval in seconds between checks for new outputs of the import, to
+# reload the state. Set JOHNNY_RELOAD_INTERVAL to override; zero disables it.
+RELOAD_INTERVAL = 10
+
+# Number of threads rendering the chain graphs. Set JOHNNY_GRAPH_WORKERS to
+# override.
+GRAPH_WORKERS = 2
+
+# Maximum size in bytes of the disk cache of chain graphs. Set
+# JOHNNY_GRAPH_CACHE_BYTES to override.
+GRAPH_CACHE_BYTES = 256 << 20
+
+# Cache of rendered images. Images are rendered again after the state is
+# reloaded.
+IMAGE_CACHE = cache.LRUCache(max_entries=256, max_bytes=64 << 20)
+
+# Maximum number of requests kept in the profile.
+PROFILE_MAX_REQUESTS = 1000
+
+# If JOHNNY_PROFILE is set, the loading of the state and the request handlers
+# are profiled. The profile is served at /profile.json, and in Chrome
+# trace-event format at /profile.trace.json.
+PROFILER = None
+if os.getenv("JOHNNY_PROFILE"):
+    PROFILER = timing.Profiler(max_roots=PROFILE_MAX_REQUESTS)
+    timing.set_profiler(PROFILER)
+
+
 class State(NamedTuple):
-    """Application state."""
+    """Application state. The tables are materialized in memory and indexed, see
+    `TRANSACTIONS_INDEXES` and `CHAINS_INDEXES`."""
 
-    transactions: Table
-    positions: Table
-    chains: Table
+    transactions: IndexedTable
+    positions: IndexedTable
+    chains: IndexedTable
     chains_map: Mapping[str, configlib.Chain]
     config: configlib.Config
+    # Tables served to DataTables with server-side processing, by name.
+    sources: Mapping[str, datatables.Source]
+    # Columns of the chains table as arrays, for the statistics pages.
+    chain_frame: chainframe.ChainFrame
+    # An index of the chains and their daily commissions for the recap pages.
+    recap_index: recaplib.RecapIndex
+    # Rollups of the notional exposure of the positions, by name.
+    exposure: Mapping[str, Table]
+    # The trade matches of the chains, see `match.MatchesTable()`.
+    matches: IndexedTable
+    # A version identifying the outputs of the import the state was loaded from,
+    # and the time they were last modified.
+    version: str
+    last_modified: datetime.datetime
+
+
+# Indexes of the transactions and positions tables.
+TRANSACTIONS_INDEXES = {
+    "chain_id": "chain_id",
+    "account": "account",
+    "underlying": ("symbol", instrument.ParseUnderlying),
+    "date": ("datetime", datetime.datetime.date),
+}
+
+# Indexes of the chains table. Note that chains may have multiple underlyings.
+CHAINS_INDEXES = {
+    "chain_id": "chain_id",
+    "account": "account",
+    "underlying": ("underlyings", lambda value: value.split(",")),
+    "status": "status",
+}
+
+# Indexes of the matches table.
+MATCHES_INDEXES = {
+    "chain_id": "chain_id",
+}
+
+# Indexes which can restrict the rows served to DataTables, by request parameter.
+SOURCE_FILTERS = ["chain_id", "account", "underlying", "status"]
 
 
 def get_dict_attribute(mapping: Mapping[str, Any], attr: str, key: str) -> Any:
@@ -81,9 +143,8 @@ def get_dict_attribute(mapping: Mapping[str, Any], attr: str, key: str) -> Any:
     return getattr(value, attr, None)
 
 
-def Initialize():
-    # Make sure we have a configuration to work from.
-    #
+def GetConfigFilename() -> str:
+    """Get the filename of the configuration to work from."""
     # Note: We're reading the clean config produced by the import.
     config_filename = os.getenv("JOHNNY_CONFIG")
     if not config_filename:
@@ -92,6 +153,159 @@ def Initialize():
             "your .pbtxt file with a text-formatted config.proto."
         )
         raise SystemExit
+    return config_filename
+
+
+def LoadState(config_filename: str) -> State:
+    """Read the outputs of the import into a new application state."""
+    log = functools.partial(timing.log_time, log_timings=app.logger.info)
+    signature = GetOutputsSignature(config_filename)
+    version = hashlib.sha1(repr(signature).encode("utf8")).hexdigest()[:16]
+    # Note: HTTP dates have a resolution of seconds.
+    last_modified = datetime.datetime.fromtimestamp(
+        max(mtime_ns or 0 for _, mtime_ns, _ in signature) // 10**9,
+        datetime.timezone.utc,
+    )
+    config = configlib.ParseFile(config_filename)
+
+    with log("load_state.chains", indent=1):
+        # Read chains table.
+        # Note: You have to use the output chains (as opposed to the input
+        # chain), because they have to match the imported table of data.
+        # Otherwise, brand new trades wouldn't show a corresponding chain
+        # object.
+        chains_db = configlib.ReadChains(config.output.chains_db)
+        chains_map = {c.chain_id: c for c in chains_db.chains}
+
+        # Filter the chains table removing ignored groups.
+        ignore_groups = set(config.presentation.ignore_groups)
+        ignore_tags = set(config.presentation.ignore_tags)
+        ignore_chains = set(
+            chain.chain_id
+            for chain in chains_db.chains
+            if (chain.group in ignore_groups or set(chain.tags) & ignore_tags)
+        )
+        chains_table = colstore.Read(config.output.chains).selectnotin(
+            "chain_id", ignore_chains
+        )
+
+        if config.presentation.ignore_mindate:
+            mindate = dateutil.parser.parse(config.presentation.ignore_mindate).date()
+            chains_table = chains_table.selectge("maxdate", mindate)
+
+        chains_table = IndexedTable(chains_table, CHAINS_INDEXES)
+        chain_ids = set(chains_table.keys("chain_id"))
+
+    with log("load_state.transactions", indent=1):
+        # Filter the transactions table removing ignored chains (from above).
+        transactions = colstore.Read(config.output.transactions).selectin(
+            "chain_id", chain_ids
+        )
+
+        transactions = IndexedTable(transactions, TRANSACTIONS_INDEXES)
+
+        # Extract current positions from marks.
+        positions = IndexedTable(
+            transactions.selecteq("rowtype", "Mark"), TRANSACTIONS_INDEXES
+        )
+
+    with log("load_state.chain_frame", indent=1):
+        chain_frame = chainframe.ChainFrame(chains_table)
+
+    with log("load_state.recap_index", indent=1):
+        recap_index = recaplib.RecapIndex(transactions, chains_table, chains_map)
+
+    with log("load_state.exposure", indent=1):
+        exposure = LoadExposure(config, transactions, chains_table, chain_ids)
+
+    with log("load_state.matches", indent=1):
+        matches = LoadMatches(config, transactions, chain_ids)
+
+    chain_links = {"chain_id": partial(AddUrl, "chain", "chain_id")}
+    sources = {
+        "transactions": datatables.Source(transactions, vrepr, chain_links),
+        "positions": datatables.Source(positions, vrepr, chain_links),
+        "chains": datatables.Source(chains_table, vrepr, chain_links, "chain_id"),
+    }
+
+    return State(
+        transactions,
+        positions,
+        chains_table,
+        chains_map,
+        config,
+        sources,
+        chain_frame,
+        recap_index,
+        exposure,
+        matches,
+        version,
+        last_modified,
+    )
+
+
+def LoadExposure(
+    config: configlib.Config,
+    transactions: Table,
+    chains: Table,
+    chain_ids: Set[str],
+) -> Dict[str, Table]:
+    """Read the exposure of the positions computed by the import and roll it up.
+    If the import didn't output it, it is computed from the marks."""
+    if config.output.exposure and path.exists(config.output.exposure):
+        positions = colstore.Read(config.output.exposure).selectin(
+            "chain_id", chain_ids
+        )
+    else:
+        positions = exposurelib.PositionsExposure(transactions, chains)
+    per_underlying = petl.wrap(list(exposurelib.ByUnderlying(positions)))
+    return {
+        "per_underlying": per_underlying,
+        "per_account": petl.wrap(list(exposurelib.Rollup(per_underlying, "account"))),
+        "per_group": petl.wrap(list(exposurelib.Rollup(per_underlying, "group"))),
+        "per_strategy": petl.wrap(list(exposurelib.Rollup(per_underlying, "strategy"))),
+    }
+
+
+def LoadMatches(
+    config: configlib.Config, transactions: Table, chain_ids: Set[str]
+) -> IndexedTable:
+    """Read the trade matches computed by the import. If the import didn't output
+    them, they are aggregated from the transactions."""
+    if config.output.matches and path.exists(config.output.matches):
+        matches = colstore.Read(config.output.matches).selectin("chain_id", chain_ids)
+    else:
+        matches = match.MatchesTable(transactions)
+    return IndexedTable(matches, MATCHES_INDEXES)
+
+
+def GetOutputsSignature(config_filename: str) -> Tuple:
+    """Return the modification times and sizes of the configuration and the
+    outputs of the import it refers to. This changes after each import."""
+    config = configlib.ParseFile(config_filename)
+    filenames = [
+        config_filename,
+        config.output.chains_db,
+        config.output.chains,
+        config.output.transactions,
+    ]
+    if config.output.exposure:
+        filenames.append(config.output.exposure)
+    if config.output.matches:
+        filenames.append(config.output.matches)
+    signature = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            signature.append((filename, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((filename, None, None))
+    return tuple(signature)
+
+
+def Initialize():
+    # Make sure we have a configuration to work from.
+    config_filename = GetConfigFilename()
 
     # TODO(blais): Restore usage of the ledger. TODO(blais): Use a field from
     # the config file, centralize processing with the data preparation, from the
@@ -99,97 +313,130 @@ def Initialize():
     ledger: str = os.getenv("JOHNNY_LEDGER")
 
     global STATE
-    with _STATE_LOCK:
+    with _STATE_LOCK, timing.log_time("initialize", app.logger.info):
         if STATE is None:
             app.logger.info(
                 f"Initializing application state from '{config_filename}'..."
             )
+            STATE = LoadState(config_filename)
+            app.logger.info("Done.")
 
-            # Get the imported transactions.
-            config = configlib.ParseFile(config_filename)
-
-            # Read chains table.
-            # Note: You have to use the output chains (as opposed to the input
-            # chain), because they have to match the imported table of data.
-            # Otherwise, brand new trades wouldn't show a corresponding chain
-            # object.
-            chains_db = configlib.ReadChains(config.output.chains_db)
-            chains_map = {c.chain_id: c for c in chains_db.chains}
-
-            # Filter the chains table removing ignored groups.
-            ignore_groups = set(config.presentation.ignore_groups)
-            ignore_tags = set(config.presentation.ignore_tags)
-            ignore_chains = set(
-                chain.chain_id
-                for chain in chains_db.chains
-                if (chain.group in ignore_groups or set(chain.tags) & ignore_tags)
-            )
-            chains_table = petl.frompickle(config.output.chains).selectnotin(
-                "chain_id", ignore_chains
-            )
+    return STATE
 
-            if config.presentation.ignore_mindate:
-                mindate = dateutil.parser.parse(
-                    config.presentation.ignore_mindate
-                ).date()
-                chains_table = chains_table.selectge("maxdate", mindate)
 
-            chain_ids = set(chains_table.values("chain_id"))
+def LoadInBackground():
+    """Initialize the state in a background thread, then watch for changes.
+    Until the state is loaded, requests are answered with 503 (see /ready)."""
 
-            # Filter the transactions table removing ignored chains (from above).
-            transactions = petl.frompickle(config.output.transactions).selectin(
-                "chain_id", chain_ids
-            )
+    def run():
+        global _LOAD_ERROR
+        start = time.perf_counter()
+        try:
+            Initialize()
+        except (Exception, SystemExit) as exc:
+            app.logger.exception("Error loading the state")
+            _LOAD_ERROR = str(exc) or type(exc).__name__
+            return
+        STARTUP_TIMES["load_state"] = time.perf_counter() - start
+        StartReloader()
 
-            # Extract current positions from marks.
-            positions = transactions.selecteq("rowtype", "Mark")
+    threading.Thread(target=run, name="LoadState", daemon=True).start()
 
-            STATE = State(transactions, positions, chains_table, chains_map, config)
-            app.logger.info("Done.")
 
-    return STATE
+def GetState() -> State:
+    """Return the state of the current request. The state may be replaced at any
+    time by a reload; a request keeps using the state it started with."""
+    return flask.g.state
+
+
+class StateReloader(threading.Thread):
+    """A background thread reloading the state when the outputs of the import
+    change. The new state is built off the request path and swapped in at once.
+
+    A reload is only triggered after the outputs have remained unchanged for a
+    full polling interval, so that the files of a running import aren't mixed.
+    If the outputs change while the state is being built, it is discarded and
+    built again.
+    """
+
+    def __init__(self, config_filename: str, interval: float):
+        super().__init__(name="StateReloader", daemon=True)
+        self.config_filename = config_filename
+        self.interval = interval
+        self.signature = GetOutputsSignature(config_filename)
+
+    def run(self):
+        pending = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                signature = GetOutputsSignature(self.config_filename)
+                if signature == self.signature:
+                    pending = None
+                elif signature != pending:
+                    # Wait until the outputs settle.
+                    pending = signature
+                else:
+                    self.reload(signature)
+                    pending = None
+            except Exception:
+                app.logger.exception("Error reloading state; keeping the old one")
+
+    def reload(self, signature: Tuple):
+        global STATE
+        with timing.log_time("reload", app.logger.info):
+            state = LoadState(self.config_filename)
+        if GetOutputsSignature(self.config_filename) != signature:
+            app.logger.info("Outputs changed while reloading; retrying")
+            return
+        with _STATE_LOCK:
+            STATE = state
+        IMAGE_CACHE.clear()
+        self.signature = signature
+        app.logger.info("Reloaded application state.")
+
+
+def StartReloader():
+    """Start watching the outputs of the import, if enabled."""
+    interval = float(os.getenv("JOHNNY_RELOAD_INTERVAL", RELOAD_INTERVAL))
+    if interval > 0:
+        StateReloader(GetConfigFilename(), interval).start()
 
 
 STATE = None
 _STATE_LOCK = threading.Lock()
 
+# The error which prevented the state from loading, if any.
+_LOAD_ERROR: Optional[str] = None
 
-def ToHtmlString(table: Table, cls: str, ids: List[str] = None) -> bytes:
-    sink = petl.MemorySource()
-    table.tohtml(sink, vrepr=vrepr)
-    html = sink.getvalue().decode("utf8")
-    html = re.sub(
-        "class='petl'", f"class='display compact nowrap cell-border' id='{cls}'", html
-    )
+# Durations of the phases of the startup, in seconds.
+STARTUP_TIMES: Dict[str, float] = {}
 
-    # Add class to <th> tags.
-    fnames = iter(table.fieldnames())
-    html = re.sub(
-        "^<th>", lambda match: "<th class={}>".format(next(fnames)), html, flags=re.M
-    )
 
-    # Add column ids for each column of the header. We use this in JS to
-    # identify columns by name.
-    if ids:
-        iter_ids = itertools.chain(["header"], iter(ids))
-        html = re.sub("<tr>", lambda _: '<tr id="{}">'.format(next(iter_ids)), html)
+def ToHtmlString(table: Table, cls: str, ids: List[str] = None) -> str:
+    return htmltable.RenderString(table, cls, ids, vrepr)
 
-    # Add a footer, for partial summaries.
-    buf = io.StringIO()
-    pr = partial(print, file=buf)
-    pr(
-        "<tfoot>",
-    )
-    pr(
-        "<tr>",
+
+# A placeholder for a streamed table in a rendered template.
+_STREAM_MARKER = "<!--johnny:stream-->"
+
+
+def StreamTemplate(
+    template_name: str, name: str, table: Table, cls: str, ids=None, **context
+) -> flask.Response:
+    """Render a template, streaming one of its tables in chunks as it is
+    rendered. `name` is the name of the template variable for the table."""
+    context[name] = _STREAM_MARKER
+    prefix, suffix = flask.render_template(template_name, **context).split(
+        _STREAM_MARKER, 1
     )
-    for fname in table.fieldnames():
-        pr(f'<th class="footcol-{fname}"></th>')
-    pr("</tr>")
-    pr("</tfoot>")
-    html = re.sub("</table>", "{}</table>".format(buf.getvalue()), html)
 
-    return html
+    def generate():
+        yield prefix
+        yield from htmltable.Render(table, cls, ids, vrepr)
+        yield suffix
+
+    return flask.Response(flask.stream_with_context(generate()), mimetype="text/html")
 
 
 def vrepr(value: Any) -> str:
@@ -223,15 +470,27 @@ def AddUrl(endpoint: str, kwdarg: str, value: Any) -> str:
         return value
 
 
-def FilterChains(table: Table) -> Table:
+def FilterChains(table: IndexedTable) -> Table:
     """Filter down the list of chains from the params."""
     selected_chain_ids = flask.request.args.get("chain_ids")
     if selected_chain_ids:
-        selected_chain_ids = selected_chain_ids.split(",")
-        table = table.selectin("chain_id", selected_chain_ids)
+        table = table.selectkey("chain_id", *selected_chain_ids.split(","))
     return table
 
 
+def FilterChainsMask() -> np.ndarray:
+    """Select the chains from the params like `FilterChains()`, as a boolean
+    index over the chain frame."""
+    state = GetState()
+    selected_chain_ids = flask.request.args.get("chain_ids")
+    positions = None
+    if selected_chain_ids:
+        positions = state.chains.keypositions(
+            "chain_id", *selected_chain_ids.split(",")
+        )
+    return state.chain_frame.mask(positions)
+
+
 # TODO(blais): Remove threshold, exclude non-trades from input.
 def RatioDistribution(num, denom, threshold=1000):
     """Compute a P/L percent distribution."""
@@ -242,7 +501,69 @@ def RatioDistribution(num, denom, threshold=1000):
     return num / denom * 100
 
 
+def CachedImage(function):
+    """Decorate a handler rendering an image, to cache its responses. Responses
+    are keyed on the endpoint, its arguments and the version of the state, and
+    carry an ETag and Last-Modified for browsers to revalidate them cheaply."""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        request = flask.request
+        state = GetState()
+        key = (
+            request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            state.version,
+        )
+        etag = hashlib.sha1(repr(key).encode("utf8")).hexdigest()
+
+        # Revalidate without rendering if the browser has the image.
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            since = request.if_modified_since
+            if since is not None and since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            not_modified = since is not None and state.last_modified <= since
+        if not_modified:
+            response = flask.Response(status=304)
+        else:
+            entry = IMAGE_CACHE.get(key)
+            if entry is None:
+                rendered = function(*args, **kwargs)
+                if rendered.status_code != 200:
+                    return rendered
+                entry = cache.Entry(rendered.get_data(), rendered.mimetype)
+                IMAGE_CACHE.put(key, entry)
+            response = flask.Response(entry.contents, mimetype=entry.mimetype)
+
+        response.set_etag(etag)
+        response.last_modified = state.last_modified
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=None)
+def ImportPlotting() -> Tuple[Any, Any]:
+    """Import the plotting libraries, on first use; they are slow to load.
+    Returns the pyplot module and the canvas class to render figures with."""
+    with timing.log_time("import_plotting", app.logger.info):
+        import matplotlib
+
+        matplotlib.use("Agg")
+        from matplotlib import pyplot
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import seaborn as sns
+
+        sns.set()
+    return pyplot, FigureCanvasAgg
+
+
 def RenderHistogram(data: np.array, title: str) -> bytes:
+    pyplot, FigureCanvas = ImportPlotting()
     fig, ax = pyplot.subplots(figsize=(6, 3))
     fig.tight_layout()
     ax.set_title(title)
@@ -266,17 +587,89 @@ def favicon():
     return flask.redirect(flask.url_for("static", filename="favicon.ico"))
 
 
+# Endpoints served before the state is loaded.
+READY_ENDPOINTS = {"ready", "static", "favicon", "profile", "profile_trace"}
+
+
+@app.before_request
+def bind_state():
+    state = STATE
+    if state is None and flask.request.endpoint not in READY_ENDPOINTS:
+        if _LOAD_ERROR is not None:
+            return f"Error loading the state: {_LOAD_ERROR}", 500
+        response = flask.make_response(
+            '<html><head><meta http-equiv="refresh" content="1"></head>'
+            "<body>Loading...</body></html>",
+            503,
+        )
+        response.headers["Retry-After"] = "1"
+        return response
+    flask.g.state = state
+
+
+@app.route("/ready")
+def ready():
+    """Report whether the state is loaded, and the durations of the startup."""
+    state = STATE
+    response = {"ready": state is not None, "startup": STARTUP_TIMES}
+    if state is not None:
+        response["version"] = state.version
+    if _LOAD_ERROR is not None:
+        response["error"] = _LOAD_ERROR
+    return flask.jsonify(response), 200 if state is not None else 503
+
+
+@app.before_request
+def begin_profile():
+    if PROFILER is not None:
+        request = flask.request
+        flask.g.profile_span = PROFILER.begin(f"{request.method} {request.path}")
+
+
+@app.teardown_request
+def end_profile(_):
+    span = flask.g.pop("profile_span", None)
+    if span is not None:
+        PROFILER.end(span)
+
+
+@app.route("/profile.json")
+def profile():
+    if PROFILER is None:
+        flask.abort(404)
+    return flask.jsonify(PROFILER.to_json())
+
+
+@app.route("/profile.trace.json")
+def profile_trace():
+    if PROFILER is None:
+        flask.abort(404)
+    return flask.jsonify(PROFILER.to_chrome_trace())
+
+
 def render_chains(chains: Table) -> flask.Response:
     ids = chains.values("chain_id")
     chains = chains.convert("chain_id", partial(AddUrl, "chain", "chain_id"))
+    return StreamTemplate(
+        "chains.html", "table", chains, "chains", ids, **GetNavigation()
+    )
+
+
+def render_chains_source(**filters) -> flask.Response:
+    """Render the chains table, served from the chains source."""
+    table = petl.wrap([GetState().chains.fieldnames()])
     return flask.render_template(
-        "chains.html", table=ToHtmlString(chains, "chains", ids), **GetNavigation()
+        "chains.html",
+        table=ToHtmlString(table, "chains"),
+        ajax_url=flask.url_for("source", name="chains", **filters),
+        columns=table.fieldnames(),
+        **GetNavigation(),
     )
 
 
 @app.route("/active")
 def active():
-    return render_chains(STATE.chains.selectin("status", {"ACTIVE"}))
+    return render_chains_source(status="ACTIVE")
 
 
 @app.route("/expiring")
@@ -284,35 +677,65 @@ def expiring():
     days = int(flask.request.args.get("days", 20))
     today = datetime.date.today()
     min_dte = (
-        STATE.transactions.selecteq("rowtype", "Mark")
-        .applyfn(instrument.Expand, "symbol")
+        GetState()
+        .positions.applyfn(instrument.Expand, "symbol")
         .selecttrue("expiration")
         .addfield("dte", lambda r: (r.expiration - today).days)
         .selectle("dte", days)
         .aggregate("chain_id", {"min_dte": ("dte", min)})
     )
-    return render_chains(STATE.chains.join(min_dte, "chain_id").movefield("min_dte", 1))
+    return render_chains(
+        GetState().chains.join(min_dte, "chain_id").movefield("min_dte", 1)
+    )
 
 
 @app.route("/chains")
 def chains():
-    return render_chains(STATE.chains)
+    return render_chains_source()
+
+
+@app.route("/source/<name>")
+def source(name: str):
+    """Serve a page of a table with DataTables' server-side processing protocol.
+    Request parameters named after one of `SOURCE_FILTERS` restrict the rows to
+    those of a comma-separated list of keys. With `ids=true`, the ids of all the
+    rows matching the query are included, for selecting them."""
+    table_source = GetState().sources.get(name)
+    if table_source is None:
+        flask.abort(404)
+    args = flask.request.values
+    keys = {
+        index: args[index].split(",")
+        for index in SOURCE_FILTERS
+        if index in args and index in table_source.table.indexes
+    }
+    sums = args["sums"].split(",") if args.get("sums") else None
+    try:
+        query = datatables.ParseQuery(args)
+        response = table_source.process(
+            query, keys, sums, ids=args.get("ids") == "true"
+        )
+    except ValueError as exc:
+        response = {"draw": args.get("draw", 0, type=int), "error": str(exc)}
+    return flask.jsonify(response)
 
 
 @app.route("/chain/<chain_id>")
 def chain(chain_id: str):
     # Get the chain object from the configuration.
-    chain_obj = STATE.chains_map.get(chain_id)
+    chain_obj = GetState().chains_map.get(chain_id)
 
     # Isolate the chain summary data.
-    chain = STATE.chains.selecteq("chain_id", chain_id)
+    chain = GetState().chains.selectkey("chain_id", chain_id)
 
     # Isolate the chain transactional data.
-    txns = STATE.transactions.selecteq("chain_id", chain_id)
+    txns = GetState().transactions.selectkey("chain_id", chain_id)
     txns = instrument.Expand(txns, "symbol")
 
     # Get the corresponding set of matches.
-    matches = match.GetChainMatchesFromTransactions(txns, match.ShortMethod.INVERT)
+    matches = match.ChainMatches(
+        GetState().matches.selectkey("chain_id", chain_id), match.ShortMethod.INVERT
+    )
 
     # Split up P/L from static and dynamic deltas.
     static, dynamic = txns.biselect(
@@ -353,20 +776,24 @@ def chain(chain_id: str):
     )
 
 
-# Note: This will never be called if we couldn't import Beancount, i.e., if
-# Beancount isn't installed. Beancount installation is optional to Johnny.
+@app.route("/bchain/<chain_id>")
 def bchain(chain_id: str):
     """Render the chain to beancount."""
+    # Note: Beancount installation is optional to Johnny.
+    try:
+        from johnny.exports import beanjohn
+    except ImportError:
+        flask.abort(404)
 
     # Get the chain object from the configuration.
-    chain_obj = STATE.chains_map.get(chain_id)
+    chain_obj = GetState().chains_map.get(chain_id)
 
     # Isolate the chain summary data.
-    chain = STATE.chains.selecteq("chain_id", chain_id)
+    chain = GetState().chains.selectkey("chain_id", chain_id)
     chain = next(iter(chain.records()))
 
     # Isolate the chain transactional data.
-    txns = STATE.transactions.selecteq("chain_id", chain_id)
+    txns = GetState().transactions.selectkey("chain_id", chain_id)
     txns = instrument.Expand(txns, "symbol")
 
     # Render to text.
@@ -374,24 +801,20 @@ def bchain(chain_id: str):
     pr = partial(print, file=buf)
     pr(";; Chain\n")
     source = ""
-    beanjohn.RenderChainToBeancount(STATE.config, chain, source, buf)
+    beanjohn.RenderChainToBeancount(GetState().config, chain, source, buf)
     pr("")
     pr(";; Transactions\n")
-    beanjohn.RenderTransactionsToBeancount(STATE.config, chain, txns, source, buf)
+    beanjohn.RenderTransactionsToBeancount(GetState().config, chain, txns, source, buf)
 
     response = flask.make_response(buf.getvalue(), 200)
     response.mimetype = "text/plain"
     return response
 
 
-if beanjohn:
-    bchain = app.route("/bchain/<chain_id>")(bchain)
-
-
 @app.route("/chain_proto/<chain_id>")
 def chain_proto(chain_id: str):
     # Get the chain object from the configuration.
-    chain_obj = STATE.chains_map.get(chain_id)
+    chain_obj = GetState().chains_map.get(chain_id)
     if chain_obj is None:
         chain_obj = configlib.Chain()
         chain_obj.chain_id = chain_id
@@ -405,10 +828,10 @@ def chain_proto(chain_id: str):
 
 @app.route("/chain_protos")
 def chain_protos():
-    chains_table = FilterChains(STATE.chains)
+    chains_table = FilterChains(GetState().chains)
     chains_db = configlib.Chains()
     for rec in chains_table.records():
-        chains_db.chains.add().CopyFrom(STATE.chains_map.get(rec.chain_id))
+        chains_db.chains.add().CopyFrom(GetState().chains_map.get(rec.chain_id))
     response = flask.make_response(configlib.ToText(chains_db), 200)
     response.mimetype = "text/plain"
     return response
@@ -416,7 +839,7 @@ def chain_protos():
 
 @app.route("/chain_names")
 def chain_names():
-    chains_table = FilterChains(STATE.chains)
+    chains_table = FilterChains(GetState().chains)
     buf = io.StringIO()
     pr = functools.partial(print, file=buf)
     for rec in chains_table.sort("underlyings").records():
@@ -526,11 +949,9 @@ def RenderHistorySVG(txns: Table) -> str:
     return svg.getvalue()
 
 
-@app.route("/chain/<chain_id>/graph.png")
-def chain_graph(chain_id: str):
-    txns = STATE.transactions.selecteq("chain_id", chain_id)
-    txns = instrument.Expand(txns, "symbol")
-    graph = chainslib.CreateGraph(txns, [STATE.chains_map[chain_id]])
+def RenderChainGraph(txns: Table, chain: configlib.Chain) -> bytes:
+    """Lay out the graph of a chain and render it to PNG."""
+    graph = chainslib.CreateGraph(instrument.Expand(txns, "symbol"), [chain])
 
     for name in graph.nodes:
         node = graph.nodes[name]
@@ -542,31 +963,71 @@ def chain_graph(chain_id: str):
         elif node["type"] == "match":
             node["label"] = "match\n{}".format(name)
 
-    agraph = nx.nx_agraph.to_agraph(graph)
-    agraph.layout("dot")
-    with tempfile.NamedTemporaryFile(suffix=".png", mode="w") as tmp:
-        agraph.draw(tmp.name)
-        tmp.flush()
-        with open(tmp.name, "rb") as infile:
-            contents = infile.read()
+    return renderer.RenderDot(renderer.ToDot(graph), "png")
+
+
+def ChainGraphKey(txns: Table, chain: configlib.Chain) -> str:
+    """Return a hash of the contents the graph of a chain is rendered from."""
+    hasher = hashlib.sha1(chain.SerializeToString(deterministic=True))
+    for row in txns:
+        hasher.update(repr(tuple(row)).encode("utf8"))
+    return "chain-{}.png".format(hasher.hexdigest())
+
+
+def GetGraphRenderer() -> renderer.Renderer:
+    """Return the pool rendering the chain graphs. The graphs are cached under
+    the import cache directory of the current state, unless JOHNNY_GRAPH_CACHE
+    is set."""
+    cache_dir = os.getenv("JOHNNY_GRAPH_CACHE")
+    import_cache = GetState().config.output.import_cache
+    if cache_dir is None and import_cache:
+        cache_dir = path.join(import_cache, "graphs")
+    workers = int(os.getenv("JOHNNY_GRAPH_WORKERS", GRAPH_WORKERS))
+    max_bytes = int(os.getenv("JOHNNY_GRAPH_CACHE_BYTES", GRAPH_CACHE_BYTES))
+    return CreateGraphRenderer(workers, cache_dir or None, max_bytes)
+
+
+@functools.lru_cache(maxsize=1)
+def CreateGraphRenderer(
+    workers: int, cache_dir: Optional[str], max_bytes: int
+) -> renderer.Renderer:
+    """Create the pool rendering the chain graphs, on first use with these
+    settings. Only the latest pool is kept, so that a reload of the state with
+    a different import cache directory replaces it."""
+    return renderer.Renderer(workers, cache_dir, max_bytes)
+
+
+@app.route("/chain/<chain_id>/graph.png")
+@CachedImage
+def chain_graph(chain_id: str):
+    chain = GetState().chains_map[chain_id]
+    txns = GetState().transactions.selectkey("chain_id", chain_id)
+    contents = GetGraphRenderer().render(
+        ChainGraphKey(txns, chain), RenderChainGraph, txns, chain
+    )
     return flask.Response(contents, mimetype="image/png")
 
 
 @app.route("/transactions")
 def transactions():
-    table = STATE.transactions.convert("chain_id", partial(AddUrl, "chain", "chain_id"))
+    table = petl.wrap([GetState().transactions.fieldnames()])
     return flask.render_template(
         "transactions.html",
         table=ToHtmlString(table, "transactions"),
+        ajax_url=flask.url_for("source", name="transactions"),
+        columns=table.fieldnames(),
         **GetNavigation(),
     )
 
 
 @app.route("/positions")
 def positions():
+    table = petl.wrap([GetState().positions.fieldnames()])
     return flask.render_template(
         "positions.html",
-        table=ToHtmlString(STATE.positions, "positions"),
+        table=ToHtmlString(table, "positions"),
+        ajax_url=flask.url_for("source", name="positions"),
+        columns=table.fieldnames(),
         **GetNavigation(),
     )
 
@@ -589,21 +1050,16 @@ def GetNotional(rec: Record) -> Decimal:
 @app.route("/stats/")
 def stats():
     # Compute stats on winners and losers.
-    orig_chains = FilterChains(STATE.chains)
-
-    def PctCr(rec: Record):
-        return 0 if rec.init == 0 else rec.pnl_chain / rec.init
+    orig_chains = FilterChains(GetState().chains)
 
-    chains = orig_chains.addfield("pct_cr", PctCr)
-    win, los = chains.biselect(lambda r: r.pnl_chain > 0)
-    pnl = np.array(chains.values("pnl_chain"))
-    pnl_win = np.array(win.values("pnl_chain"))
-    pnl_los = np.array(los.values("pnl_chain"))
-    init_cr = np.array(chains.values("init"))
-
-    pct_cr = np.array(chains.values("pct_cr"))
-    pct_cr_win = np.array(win.values("pct_cr"))
-    pct_cr_los = np.array(los.values("pct_cr"))
+    frame = GetState().chain_frame
+    mask = FilterChainsMask()
+    pnl = frame.pnl[mask]
+    init_cr = frame.init[mask]
+    pct_cr = np.divide(pnl, init_cr, out=np.zeros_like(pnl), where=init_cr != 0)
+    win = pnl > 0
+    pnl_win, pnl_los = pnl[win], pnl[~win]
+    pct_cr_win, pct_cr_los = pct_cr[win], pct_cr[~win]
 
     def Quantize(value):
         return Decimal(value).quantize(Decimal("0"))
@@ -662,10 +1118,12 @@ def stats():
     stats_table = petl.wrap(rows)
 
     chain_ids = flask.request.args.get("chain_ids")
-    return flask.render_template(
+    return StreamTemplate(
         "stats.html",
+        "chains",
+        orig_chains,
+        "chains",
         stats_table=ToHtmlString(stats_table, "stats"),
-        chains=ToHtmlString(orig_chains, "chains"),
         pnlhist=flask.url_for("stats_pnlhist", chain_ids=chain_ids),
         pnlpctinit=flask.url_for("stats_pnlpctinit", chain_ids=chain_ids),
         pnlinit=flask.url_for("stats_pnlinit", chain_ids=chain_ids),
@@ -674,28 +1132,28 @@ def stats():
 
 
 @app.route("/stats/pnlhist.png")
+@CachedImage
 def stats_pnlhist():
-    chains = FilterChains(STATE.chains)
-    pnl = np.array(chains.values("pnl_chain"))
-    pnl = [v for v in pnl if -10000 < v < 10000]
+    pnl = GetState().chain_frame.pnl[FilterChainsMask()]
+    pnl = pnl[(pnl > -10000) & (pnl < 10000)]
     image = RenderHistogram(pnl, "P/L ($)")
     return flask.Response(image, mimetype="image/png")
 
 
 @app.route("/stats/pnlpctinit.png")
+@CachedImage
 def stats_pnlpctinit():
-    chains = FilterChains(STATE.chains)
-    pnl = np.array(chains.values("pnl_chain")).astype(float)
-    creds = np.array(chains.values("init")).astype(float)
-    data = RatioDistribution(pnl, creds)
+    frame = GetState().chain_frame
+    mask = FilterChainsMask()
+    data = RatioDistribution(frame.pnl[mask], frame.init[mask])
     image = RenderHistogram(data, "P/L (%/Initial Credits)")
     return flask.Response(image, mimetype="image/png")
 
 
 @app.route("/stats/pnlinit.png")
+@CachedImage
 def stats_pnlinit():
-    chains = FilterChains(STATE.chains)
-    init = np.array(chains.values("init")).astype(float)
+    init = GetState().chain_frame.init[FilterChainsMask()]
     image = RenderHistogram(init, "Initial Credits ($)")
     return flask.Response(image, mimetype="image/png")
 
@@ -710,9 +1168,11 @@ def recap_today():
 @app.route("/recap/<date>")
 def recap(date: str):
     date = dateutil.parser.parse(date).date()
-    chains = recaplib.get_chains_at_date(
-        STATE.transactions, STATE.chains, STATE.chains_map, date
-    ).convert("chain_id", partial(AddUrl, "chain", "chain_id"))
+    chains = (
+        GetState()
+        .recap_index.get_chains_at_date(date)
+        .convert("chain_id", partial(AddUrl, "chain", "chain_id"))
+    )
     summary = recaplib.get_summary(chains)
     params = GetNavigation()
     params["date"] = date
@@ -747,8 +1207,10 @@ def timeline():
 
 def get_timeline_chains():
     """Return a table of chains suitable to plotting a timeline."""
-    return STATE.chains.convert("pnl_chain", float).cut(
-        "maxdate", "account", "group", "strategy", "pnl_chain"
+    return (
+        GetState()
+        .chains.convert("pnl_chain", float)
+        .cut("maxdate", "account", "group", "strategy", "pnl_chain")
     )
 
 
@@ -765,6 +1227,7 @@ def plot_timeline(chains: Table, fieldname: str) -> flask.Response:
     df_total = total.todataframe().set_index("maxdate").cumsum()
     df_pivot = pivot.todataframe().set_index("maxdate").cumsum()
 
+    pyplot, FigureCanvas = ImportPlotting()
     fig, ax = pyplot.subplots()
     pyplot.tight_layout()
     df_total.plot(ax=ax, figsize=(24, 12), linewidth=3)
@@ -775,119 +1238,39 @@ def plot_timeline(chains: Table, fieldname: str) -> flask.Response:
 
 
 @app.route("/timeline_group.png")
+@CachedImage
 def timeline_group_png():
     chains = get_timeline_chains()
     return plot_timeline(chains, "group")
 
 
 @app.route("/timeline_strategy.png")
+@CachedImage
 def timeline_strategy_png():
     chains = get_timeline_chains()
     return plot_timeline(chains, "strategy")
 
 
 @app.route("/timeline_account.png")
+@CachedImage
 def timeline_account_png():
     chains = get_timeline_chains()
     return plot_timeline(chains, "account")
 
 
-def get_mark_position(r: Record) -> Decimal:
-    """Convert mark transaction to position (investing the sign)."""
-    sign = +1 if r.instruction == "SELL" else -1
-    return sign * r.quantity
-
-
-def get_notional(r: Record) -> Decimal:
-    """Calculate the notional risk of the position."""
-    mquantity = r.position * r.multiplier
-    if r.instype in {"EquityOption", "FutureOption"}:
-        return (mquantity * r.strike).quantize(Q)
-    elif r.instype in {"Equity"}:
-        return -mquantity * r.price
-    elif r.instype in {"Future"}:
-        return -mquantity * r.price
-    else:
-        return ZERO
-
-
-def get_downside_notional(r: Record) -> Decimal:
-    """Return downside (upside) risk notiona."""
-    if r.putcall in {"P", "C"}:
-        return r.notional if r.putcall == "P" else ZERO
-    return r.notional
-
-
-def get_upside_notional(r: Record) -> Decimal:
-    """Return downside (upside) risk notiona."""
-    if r.putcall in {"P", "C"}:
-        return r.notional if r.putcall == "C" else ZERO
-    return -r.notional
-
-
 @app.route("/leverage")
 def leverage():
-    # Calculate notional equivalent exposure for all positions.
-    notional = (
-        STATE.positions
-        # Convert Mark rows to position quantities.
-        .applyfn(instrument.Expand, "symbol")
-        .addfield("position", get_mark_position)
-        .cutout("instruction", "quantity")
-        # Compute the put/call notional risks associated with the position.
-        .addfield("notional", get_notional)
-        # Join in the group and strategy.
-        .leftjoin(STATE.chains.cut("chain_id", "group", "strategy"), "chain_id")
-    )
-
-    # Aggregate all put and call notional risk per (account, underlying).
-    per_underlying = (
-        notional.addfield("down", get_downside_notional)
-        .addfield("up", get_upside_notional)
-        .aggregate(
-            ["account", "underlying", "instype", "group", "strategy"],
-            {
-                "price": ("price", first),
-                "notional_down": ("down", lambda g: sum(g).quantize(Q)),
-                "notional_up": ("up", lambda g: sum(g).quantize(Q)),
-            },
-        )
-        .sort(["account", "underlying", "instype", "group"])
-        .cut(
-            "account",
-            "underlying",
-            "price",
-            "instype",
-            "group",
-            "strategy",
-            "notional_down",
-            "notional_up",
-        )
-    )
-
-    def aggregate(field: str):
-        return per_underlying.aggregate(
-            field,
-            {
-                "notional_down": ("notional_down", sum),
-                "notional_up": ("notional_up", sum),
-            },
-        ).sort([field])
-
-    # Aggregate all notional per account, group and strategy.
-    per_account = aggregate("account")
-    per_group = aggregate("group")
-    per_strategy = aggregate("strategy")
-
+    exposure = GetState().exposure
     return flask.render_template(
         "leverage.html",
-        per_underlying=ToHtmlString(per_underlying, "per_underlying"),
-        per_account=ToHtmlString(per_account, "per_account"),
-        per_group=ToHtmlString(per_group, "per_group"),
-        per_strategy=ToHtmlString(per_strategy, "per_strategy"),
+        **{name: ToHtmlString(table, name) for name, table in exposure.items()},
         **GetNavigation(),
     )
 
 
-# Trigger the initialization on load (before even the first request).
-Initialize()
+# Load the state in the background, so that the server can start right away.
+# Fail early if there is no configuration.
+GetConfigFilename()
+LoadInBackground()
+STARTUP_TIMES["import"] = time.perf_counter() - _IMPORT_START
+app.logger.info("Started in {:.0f} ms".format(STARTUP_TIMES["import"] * 1000))
@@ -0,0 +1,355 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from os import path
+import datetime
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from johnny.base import colstore
+from johnny.base.etl import petl
+
+
+# Libraries which must not be loaded until they're used by a request.
+DEFERRED_MODULES = ["matplotlib", "seaborn", "networkx", "beancount"]
+
+
+# Import the application in a fresh interpreter and wait for the state to load.
+SCRIPT = textwrap.dedent(
+    """
+    import json, sys, time
+    from johnny.webapp import app
+    deferred = [name for name in {modules!r} if name in sys.modules]
+    client = app.app.test_client()
+    not_ready = client.get("/chains").status_code
+    for _ in range(300):
+        response = client.get("/ready")
+        if response.status_code == 200 or response.get_json().get("error"):
+            break
+        time.sleep(0.1)
+    print(json.dumps({{
+        "deferred": deferred,
+        "not_ready": not_ready,
+        "ready": response.get_json(),
+        "chains": client.get("/chains").status_code,
+        "source": client.get("/source/chains?draw=1").get_json(),
+    }}))
+    """
+)
+
+
+# Hold a request open while the outputs are touched and the reloader swaps the
+# state in.
+RELOAD_SCRIPT = textwrap.dedent(
+    """
+    import json, os, time
+    from johnny.webapp import app
+    client = app.app.test_client()
+    for _ in range(300):
+        if client.get("/ready").status_code == 200:
+            break
+        time.sleep(0.1)
+    version = client.get("/ready").get_json()["version"]
+    config_filename = app.GetConfigFilename()
+    reloader = app.StateReloader(config_filename, 0.1)
+    with app.app.test_request_context("/chains"):
+        app.app.preprocess_request()
+        state = app.GetState()
+        config = app.configlib.ParseFile(config_filename)
+        for filename in config.output.chains, config.output.transactions:
+            stat = os.stat(filename)
+            os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        reloader.start()
+        for _ in range(300):
+            if app.STATE is not state:
+                break
+            time.sleep(0.1)
+        in_flight = app.GetState() is state
+    print(json.dumps(dict(
+        swapped=app.STATE is not state,
+        in_flight=in_flight,
+        versions=[version, client.get("/ready").get_json()["version"]],
+    )))
+    """
+)
+
+
+# Render an image through the cache, revalidate it and reload the state.
+IMAGE_SCRIPT = textwrap.dedent(
+    """
+    import json, os, time
+    from johnny.webapp import app
+    client = app.app.test_client()
+    for _ in range(300):
+        if client.get("/ready").status_code == 200:
+            break
+        time.sleep(0.1)
+    renders = []
+    def Render():
+        renders.append(app.GetState().version)
+        return app.flask.Response(b"image", mimetype="image/png")
+    image = app.CachedImage(Render)
+    def Get(*headers):
+        with app.app.test_request_context("/chains", headers=list(headers)):
+            app.app.preprocess_request()
+            response = image()
+            return dict(
+                status=response.status_code,
+                etag=response.get_etag()[0],
+                last_modified=response.headers.get("Last-Modified"),
+                data=response.get_data(as_text=True),
+                renders=len(renders),
+            )
+    results = dict(first=Get(), second=Get())
+    etag = results["first"]["etag"]
+    last_modified = results["first"]["last_modified"]
+    results["if_none_match"] = Get(("If-None-Match", '"' + etag + '"'))
+    results["if_none_match_other"] = Get(("If-None-Match", '"other"'))
+    results["if_modified_since"] = Get(("If-Modified-Since", last_modified))
+    results["if_modified_since_old"] = Get(
+        ("If-Modified-Since", "Thu, 01 Jan 1970 00:00:00 GMT")
+    )
+    config_filename = app.GetConfigFilename()
+    reloader = app.StateReloader(config_filename, 1)
+    config = app.configlib.ParseFile(config_filename)
+    for filename in config.output.chains, config.output.transactions:
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    reloader.reload(app.GetOutputsSignature(config_filename))
+    results["reloaded"] = Get(("If-None-Match", '"' + etag + '"'))
+    print(json.dumps(results))
+    """
+)
+
+
+# Set an import cache directory in the configuration and reload the state.
+GRAPH_SCRIPT = textwrap.dedent(
+    """
+    import json, os, time
+    os.environ.pop("JOHNNY_GRAPH_CACHE", None)
+    from johnny.webapp import app
+    client = app.app.test_client()
+    for _ in range(300):
+        if client.get("/ready").status_code == 200:
+            break
+        time.sleep(0.1)
+    def CacheDir():
+        with app.app.test_request_context("/chains"):
+            app.app.preprocess_request()
+            return app.GetGraphRenderer().cache_dir
+    cache_dirs = [CacheDir()]
+    config_filename = app.GetConfigFilename()
+    reloader = app.StateReloader(config_filename, 1)
+    config = app.configlib.ParseFile(config_filename)
+    config.output.import_cache = os.path.join(os.path.dirname(config_filename), "cache")
+    with open(config_filename, "w") as outfile:
+        outfile.write(app.configlib.ToText(config))
+    reloader.reload(app.GetOutputsSignature(config_filename))
+    cache_dirs.append(CacheDir())
+    print(json.dumps(dict(cache_dirs=cache_dirs)))
+    """
+)
+
+
+class AppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config = path.join(self.tmpdir.name, "config.pbtxt")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_outputs(self):
+        filename = lambda name: path.join(self.tmpdir.name, name)
+        colstore.Write(
+            petl.wrap(
+                [
+                    (
+                        "chain_id",
+                        "account",
+                        "underlyings",
+                        "status",
+                        "mindate",
+                        "maxdate",
+                        "group",
+                        "strategy",
+                        "init",
+                        "pnl_chain",
+                    ),
+                    (
+                        "c1",
+                        "x1234",
+                        "SPY",
+                        "ACTIVE",
+                        datetime.date(2021, 1, 4),
+                        datetime.date(2021, 1, 4),
+                        "NoGroup",
+                        "Equity",
+                        Decimal("-100.00"),
+                        Decimal("0.00"),
+                    ),
+                ]
+            ),
+            filename("chains.db"),
+        )
+        colstore.Write(
+            petl.wrap(
+                [
+                    (
+                        "chain_id",
+                        "account",
+                        "symbol",
+                        "datetime",
+                        "rowtype",
+                        "instruction",
+                        "effect",
+                        "quantity",
+                        "price",
+                        "cost",
+                        "commissions",
+                        "fees",
+                        "match_id",
+                    ),
+                    (
+                        "c1",
+                        "x1234",
+                        "SPY",
+                        datetime.datetime(2021, 1, 4, 10, 0),
+                        "Trade",
+                        "BUY",
+                        "OPENING",
+                        Decimal("1"),
+                        Decimal("100.00"),
+                        Decimal("-100.00"),
+                        Decimal("-1.00"),
+                        Decimal("-0.05"),
+                        "&1",
+                    ),
+                    (
+                        "c1",
+                        "x1234",
+                        "SPY",
+                        datetime.datetime(2021, 1, 5, 16, 0),
+                        "Mark",
+                        "SELL",
+                        "CLOSING",
+                        Decimal("1"),
+                        Decimal("100.00"),
+                        Decimal("100.00"),
+                        Decimal("0.00"),
+                        Decimal("0.00"),
+                        "&1",
+                    ),
+                ]
+            ),
+            filename("transactions.db"),
+        )
+        with open(self.config, "w") as outfile:
+            print("output {", file=outfile)
+            for field in "chains", "transactions":
+                print(f'  {field}: "{filename(field + ".db")}"', file=outfile)
+            print(f'  chains_db: "{filename("chains.pbtxt")}"', file=outfile)
+            print("}", file=outfile)
+
+    def run_app(self, script: str = SCRIPT):
+        env = dict(os.environ, JOHNNY_CONFIG=self.config, JOHNNY_RELOAD_INTERVAL="0")
+        output = subprocess.check_output(
+            [sys.executable, "-c", script.format(modules=DEFERRED_MODULES)], env=env
+        )
+        return json.loads(output.splitlines()[-1])
+
+
+@unittest.skipIf(importlib.util.find_spec("flask") is None, "Flask is not installed")
+class TestStartup(AppTestCase):
+    def test_startup(self):
+        self.write_outputs()
+        result = self.run_app()
+        self.assertEqual([], result["deferred"])
+        self.assertIn(result["not_ready"], {200, 503})
+        self.assertTrue(result["ready"]["ready"])
+        self.assertEqual({"import", "load_state"}, set(result["ready"]["startup"]))
+        self.assertEqual(200, result["chains"])
+        self.assertEqual(1, result["source"]["recordsTotal"])
+
+    def test_startup_error(self):
+        result = self.run_app()
+        self.assertFalse(result["ready"]["ready"])
+        self.assertIn("error", result["ready"])
+        self.assertEqual(500, result["chains"])
+
+
+@unittest.skipIf(importlib.util.find_spec("flask") is None, "Flask is not installed")
+class TestReload(AppTestCase):
+    def test_reload(self):
+        self.write_outputs()
+        result = self.run_app(RELOAD_SCRIPT)
+        self.assertTrue(result["swapped"])
+        # The request started before the reload kept the state it began with.
+        self.assertTrue(result["in_flight"])
+        old_version, new_version = result["versions"]
+        self.assertNotEqual(old_version, new_version)
+
+
+@unittest.skipIf(importlib.util.find_spec("flask") is None, "Flask is not installed")
+class TestCachedImage(AppTestCase):
+    def test_cached_image(self):
+        self.write_outputs()
+        result = self.run_app(IMAGE_SCRIPT)
+        first = result["first"]
+        self.assertEqual(200, first["status"])
+        self.assertEqual("image", first["data"])
+        self.assertTrue(first["etag"])
+        self.assertTrue(first["last_modified"])
+        self.assertEqual(1, first["renders"])
+
+        # The second request is served from the cache, with the same validators.
+        second = result["second"]
+        self.assertEqual(
+            (200, "image", first["etag"], first["last_modified"], 1),
+            (
+                second["status"],
+                second["data"],
+                second["etag"],
+                second["last_modified"],
+                second["renders"],
+            ),
+        )
+
+        # Browsers holding the image revalidate it without a render.
+        for name in "if_none_match", "if_modified_since":
+            self.assertEqual(304, result[name]["status"], name)
+            self.assertEqual("", result[name]["data"], name)
+            self.assertEqual(first["etag"], result[name]["etag"], name)
+            self.assertEqual(1, result[name]["renders"], name)
+        for name in "if_none_match_other", "if_modified_since_old":
+            self.assertEqual(200, result[name]["status"], name)
+            self.assertEqual(1, result[name]["renders"], name)
+
+        # A reload invalidates the cached image and its ETag.
+        reloaded = result["reloaded"]
+        self.assertEqual(200, reloaded["status"])
+        self.assertEqual("image", reloaded["data"])
+        self.assertNotEqual(first["etag"], reloaded["etag"])
+        self.assertEqual(2, reloaded["renders"])
+
+
+@unittest.skipIf(importlib.util.find_spec("flask") is None, "Flask is not installed")
+class TestGraphRenderer(AppTestCase):
+    def test_reload_cache_dir(self):
+        self.write_outputs()
+        result = self.run_app(GRAPH_SCRIPT)
+        # The renderer follows the import cache directory of the new state.
+        self.assertEqual(
+            [None, path.join(self.tmpdir.name, "cache", "graphs")], result["cache_dirs"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
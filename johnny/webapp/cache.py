@@ -0,0 +1,73 @@
+"""A bounded, thread-safe LRU cache of rendered responses.
+
+Entries are bounded both in number and in total size, as measured by the
+length of their contents, and the least recently used entries are evicted
+first.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+import collections
+import threading
+
+
+class Entry(NamedTuple):
+    """A cached response."""
+
+    contents: bytes
+    mimetype: str
+
+
+class LRUCache:
+    """A least-recently-used cache of responses."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: Dict[Hashable, Entry] = collections.OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: Entry):
+        size = len(entry.contents)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.num_bytes -= len(previous.contents)
+            self.entries[key] = entry
+            self.num_bytes += size
+            while (
+                len(self.entries) > self.max_entries or self.num_bytes > self.max_bytes
+            ):
+                _, evicted = self.entries.popitem(last=False)
+                self.num_bytes -= len(evicted.contents)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.num_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,54 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import unittest
+
+from johnny.webapp import cache
+
+
+def Entry(size: int) -> cache.Entry:
+    return cache.Entry(b"x" * size, "image/png")
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_put(self):
+        lru = cache.LRUCache(10, 100)
+        self.assertIsNone(lru.get("a"))
+        lru.put("a", Entry(10))
+        self.assertEqual(Entry(10), lru.get("a"))
+        lru.put("a", Entry(20))
+        self.assertEqual(
+            {"entries": 1, "bytes": 20, "hits": 1, "misses": 1}, lru.stats()
+        )
+
+    def test_evict_entries(self):
+        lru = cache.LRUCache(2, 100)
+        lru.put("a", Entry(1))
+        lru.put("b", Entry(1))
+        lru.get("a")
+        lru.put("c", Entry(1))
+        self.assertEqual(["a", "c"], list(lru.entries))
+
+    def test_evict_bytes(self):
+        lru = cache.LRUCache(10, 100)
+        lru.put("a", Entry(60))
+        lru.put("b", Entry(30))
+        lru.put("c", Entry(20))
+        self.assertEqual(["b", "c"], list(lru.entries))
+        self.assertEqual(50, lru.num_bytes)
+
+        # Entries larger than the cache aren't stored.
+        lru.put("d", Entry(101))
+        self.assertIsNone(lru.get("d"))
+        self.assertEqual(["b", "c"], list(lru.entries))
+
+    def test_clear(self):
+        lru = cache.LRUCache(10, 100)
+        lru.put("a", Entry(10))
+        lru.clear()
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(0, lru.num_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
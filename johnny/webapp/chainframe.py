@@ -0,0 +1,59 @@
+"""A columnar NumPy representation of the chains table.
+
+The statistics and distribution pages compute from these arrays with
+vectorized masks, instead of extracting and converting the values of the
+table on every request. Amounts are stored as float64, dates as datetime64 and
+categorical columns as integer codes into a sorted list of their distinct
+values. Rows are in the order of the chains table, so positions in its indexes
+apply directly.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from johnny.base.etl import IndexedTable
+
+
+class ChainFrame:
+    """Columns of the chains table as arrays."""
+
+    def __init__(self, chains: IndexedTable):
+        self.size = chains.nrows()
+        self.pnl = np.array(chains.values("pnl_chain"), dtype=np.float64)
+        self.init = np.array(chains.values("init"), dtype=np.float64)
+        self.mindate = np.array(chains.values("mindate"), dtype="datetime64[D]")
+        self.maxdate = np.array(chains.values("maxdate"), dtype="datetime64[D]")
+        self.group, self.group_names = _Encode(chains.values("group"))
+        self.strategy, self.strategy_names = _Encode(chains.values("strategy"))
+        self.account, self.account_names = _Encode(chains.values("account"))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def mask(self, positions: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Return a boolean index selecting rows at the given positions, or all
+        of them if none are given."""
+        if positions is None:
+            return np.ones(self.size, dtype=bool)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[np.fromiter(positions, dtype=np.intp)] = True
+        return mask
+
+    def code(self, column: str, value: Any) -> int:
+        """Return the code of a value of a categorical column, or -1 if it is
+        absent."""
+        names = getattr(self, f"{column}_names")
+        pos = np.searchsorted(names, value)
+        return int(pos) if pos < len(names) and names[pos] == value else -1
+
+
+def _Encode(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode a column of strings as integer codes into its sorted distinct
+    values. Missing values are encoded as the empty string."""
+    values = ["" if value is None else value for value in values]
+    names, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return codes.astype(np.int32), names
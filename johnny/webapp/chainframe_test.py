@@ -0,0 +1,95 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+import datetime
+import unittest
+
+import numpy as np
+
+from johnny.base.etl import petl, IndexedTable
+from johnny.webapp import chainframe
+
+
+ROWS = [
+    (
+        "chain_id",
+        "account",
+        "group",
+        "strategy",
+        "mindate",
+        "maxdate",
+        "init",
+        "pnl_chain",
+    ),
+    (
+        "a",
+        "x1234",
+        "Trades",
+        "Vertical",
+        datetime.date(2021, 1, 4),
+        datetime.date(2021, 1, 8),
+        Decimal("1.50"),
+        Decimal("0.75"),
+    ),
+    (
+        "b",
+        "tasty",
+        None,
+        "IronCondor",
+        datetime.date(2021, 1, 5),
+        datetime.date(2021, 1, 5),
+        Decimal("2.00"),
+        Decimal("-3.25"),
+    ),
+    (
+        "c",
+        "x1234",
+        "Trades",
+        "Vertical",
+        datetime.date(2021, 1, 6),
+        datetime.date(2021, 2, 1),
+        Decimal("0"),
+        Decimal("10"),
+    ),
+]
+
+
+class TestChainFrame(unittest.TestCase):
+    def setUp(self):
+        self.chains = IndexedTable(petl.wrap(ROWS), {"chain_id": "chain_id"})
+        self.frame = chainframe.ChainFrame(self.chains)
+
+    def test_columns(self):
+        self.assertEqual(3, len(self.frame))
+        self.assertEqual(np.float64, self.frame.pnl.dtype)
+        np.testing.assert_array_equal([0.75, -3.25, 10.0], self.frame.pnl)
+        np.testing.assert_array_equal([1.5, 2.0, 0.0], self.frame.init)
+        self.assertEqual(np.datetime64("2021-01-05"), self.frame.mindate[1])
+        self.assertEqual(np.datetime64("2021-02-01"), self.frame.maxdate[2])
+
+    def test_categories(self):
+        self.assertEqual(["", "Trades"], list(self.frame.group_names))
+        np.testing.assert_array_equal([1, 0, 1], self.frame.group)
+        self.assertEqual(["tasty", "x1234"], list(self.frame.account_names))
+        np.testing.assert_array_equal([1, 0, 1], self.frame.account)
+        self.assertEqual(0, self.frame.code("strategy", "IronCondor"))
+        self.assertEqual(-1, self.frame.code("strategy", "Butterfly"))
+        mask = self.frame.strategy == self.frame.code("strategy", "Vertical")
+        np.testing.assert_array_equal([0.75, 10.0], self.frame.pnl[mask])
+
+    def test_mask(self):
+        np.testing.assert_array_equal([True] * 3, self.frame.mask())
+        positions = self.chains.keypositions("chain_id", "c", "a")
+        np.testing.assert_array_equal([True, False, True], self.frame.mask(positions))
+        np.testing.assert_array_equal([False] * 3, self.frame.mask([]))
+
+    def test_empty(self):
+        frame = chainframe.ChainFrame(IndexedTable(petl.wrap(ROWS[:1]), {}))
+        self.assertEqual(0, len(frame))
+        self.assertEqual(0, frame.pnl.size)
+        self.assertEqual(-1, frame.code("group", "Trades"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,295 @@
+"""Server-side processing for DataTables.
+
+This implements the server side of the DataTables protocol
+(https://datatables.net/manual/server-side) over an in-memory indexed table:
+paging, multi-column sorting, a global search and per-column searches. Only the
+requested page of rows is rendered and sent to the client.
+
+Searches match against the rendered value of the cells, case-insensitively.
+Like DataTables' own client-side search, a search term is split into words (or
+double-quoted phrases) which must all match the row, unless the search is
+flagged as a regular expression. Sorting is carried out on the raw values.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+import re
+
+from johnny.base.etl import IndexedTable
+
+
+# Maximum number of rows returned in a single page.
+MAX_LENGTH = 10000
+
+
+class Search(NamedTuple):
+    """A search term, and whether it is a regular expression."""
+
+    value: str
+    regex: bool
+
+
+class Column(NamedTuple):
+    """A column of the request."""
+
+    data: str
+    searchable: bool
+    orderable: bool
+    search: Search
+
+
+class Query(NamedTuple):
+    """A parsed server-side processing request."""
+
+    draw: int
+    start: int
+    length: int
+    search: Search
+    columns: List[Column]
+    # The sort order, as pairs of (column name, descending).
+    order: List[Tuple[str, bool]]
+
+
+def _ParseBool(value: Optional[str]) -> bool:
+    return value == "true"
+
+
+def _ParseSearch(args: Mapping[str, str], prefix: str) -> Search:
+    return Search(
+        args.get(f"{prefix}[value]", "") or "",
+        _ParseBool(args.get(f"{prefix}[regex]")),
+    )
+
+
+def ParseQuery(args: Mapping[str, str]) -> Query:
+    """Parse the parameters of a request. Raises ValueError if invalid."""
+    columns = []
+    while f"columns[{len(columns)}][data]" in args:
+        prefix = f"columns[{len(columns)}]"
+        columns.append(
+            Column(
+                args[f"{prefix}[data]"],
+                _ParseBool(args.get(f"{prefix}[searchable]", "true")),
+                _ParseBool(args.get(f"{prefix}[orderable]", "true")),
+                _ParseSearch(args, f"{prefix}[search]"),
+            )
+        )
+
+    order = []
+    while f"order[{len(order)}][column]" in args:
+        prefix = f"order[{len(order)}]"
+        index = int(args[f"{prefix}[column]"])
+        if not 0 <= index < len(columns):
+            raise ValueError(f"Invalid order column: {index}")
+        if columns[index].orderable:
+            descending = args.get(f"{prefix}[dir]", "asc") == "desc"
+            order.append((columns[index].data, descending))
+
+    length = int(args.get("length", -1))
+    return Query(
+        draw=int(args.get("draw", 0)),
+        start=max(0, int(args.get("start", 0))),
+        length=MAX_LENGTH if length < 0 else min(length, MAX_LENGTH),
+        search=_ParseSearch(args, "search"),
+        columns=columns,
+        order=order,
+    )
+
+
+def _CompileSearch(search: Search) -> Optional[Callable[[str], bool]]:
+    """Compile a search to a predicate over the lowercased text of a row."""
+    if not search.value:
+        return None
+    if search.regex:
+        try:
+            regexp = re.compile(search.value, re.IGNORECASE)
+        except re.error as exc:
+            raise ValueError(f"Invalid regular expression: {exc}")
+        return lambda text: regexp.search(text) is not None
+    words = [
+        word.strip('"')
+        for word in re.findall(r'"[^"]*"|\S+', search.value.lower())
+        if word.strip('"')
+    ]
+    return lambda text: all(word in text for word in words)
+
+
+def _SortKey(column: int) -> Callable[[tuple], Any]:
+    """Sort key for a column. None values come first."""
+
+    def key(row):
+        value = row[column]
+        return (value is not None, value)
+
+    return key
+
+
+class Source:
+    """A table served with server-side processing.
+
+    Args:
+      table: The indexed table of rows.
+      format: A function rendering a value to a string, for display and search.
+      links: A mapping of field names to functions rendering their non-null
+        values for display instead, e.g. to HTML links.
+      row_id: The name of a field to use as the id of the rows in the client.
+    """
+
+    def __init__(
+        self,
+        table: IndexedTable,
+        format: Callable[[Any], str],
+        links: Optional[Mapping[str, Callable[[Any], str]]] = None,
+        row_id: Optional[str] = None,
+    ):
+        self.table = table
+        self.format = format
+        self.links = links or {}
+        self.row_id = row_id
+        self.columns = {name: index for index, name in enumerate(table.fieldnames())}
+        # The lowercased formatted values of all the rows, computed on the first
+        # search.
+        self._texts: Optional[List[Tuple[str, ...]]] = None
+
+    def texts(self) -> List[Tuple[str, ...]]:
+        if self._texts is None:
+            fmt = self.format
+            self._texts = [
+                tuple(fmt(value).lower() for value in row)
+                for row in self.table.datarows
+            ]
+        return self._texts
+
+    def filter(self, query: Query, positions: List[int]) -> List[int]:
+        """Apply the global and column searches to rows."""
+        column_matchers = []
+        for column in query.columns:
+            matcher = _CompileSearch(column.search)
+            if matcher is not None:
+                column_matchers.append((self._column_index(column.data), matcher))
+        matcher = _CompileSearch(query.search)
+        if matcher is None and not column_matchers:
+            return positions
+
+        searchable = [
+            self._column_index(column.data)
+            for column in query.columns
+            if column.searchable
+        ]
+        texts = self.texts()
+        filtered = []
+        for pos in positions:
+            text = texts[pos]
+            if matcher is not None and not matcher(
+                "  ".join([text[index] for index in searchable])
+            ):
+                continue
+            if all(match(text[index]) for index, match in column_matchers):
+                filtered.append(pos)
+        return filtered
+
+    def sort(self, query: Query, positions: List[int]) -> List[int]:
+        """Sort rows by the order of the query."""
+        datarows = self.table.datarows
+        # Apply the sort keys from least to most significant, relying on the
+        # stability of the sort.
+        for name, descending in reversed(query.order):
+            key = _SortKey(self._column_index(name))
+            try:
+                positions = sorted(
+                    positions, key=lambda pos: key(datarows[pos]), reverse=descending
+                )
+            except TypeError:
+                # Mixed types; sort on the formatted values.
+                column = self._column_index(name)
+                texts = self.texts()
+                positions = sorted(
+                    positions, key=lambda pos: texts[pos][column], reverse=descending
+                )
+        return positions
+
+    def render(self, row: tuple) -> Dict[str, str]:
+        """Render a row for display."""
+        fmt = self.format
+        record = {}
+        for name, value in zip(self.table.fieldnames(), row):
+            link = self.links.get(name)
+            record[name] = fmt(value) if link is None or value is None else link(value)
+        if self.row_id is not None:
+            record["DT_RowId"] = str(row[self.columns[self.row_id]])
+        return record
+
+    def process(
+        self,
+        query: Query,
+        keys: Optional[Mapping[str, List[Any]]] = None,
+        sums: Optional[List[str]] = None,
+        ids: bool = False,
+    ) -> Dict[str, Any]:
+        """Process a query and return the response.
+
+        Args:
+          query: The parsed query.
+          keys: An optional mapping of index names to keys, restricting the rows
+            to those of the keys.
+          sums: An optional list of column names to sum over the filtered rows.
+          ids: Whether to include the ids of all the filtered rows, in order,
+            e.g. for the client to select them beyond the current page.
+        Returns:
+          A JSON-serializable response. The sums, if any, are included under
+          "sums", and the ids under "ids".
+        """
+        datarows = self.table.datarows
+        if keys:
+            positions = None
+            for name, values in keys.items():
+                selected = self.table.keypositions(name, *values)
+                positions = (
+                    selected
+                    if positions is None
+                    else sorted(set(positions).intersection(selected))
+                )
+        else:
+            positions = range(len(datarows))
+        total = len(positions)
+
+        positions = self.filter(query, positions)
+        positions = self.sort(query, positions)
+        page = positions[query.start : query.start + query.length]
+
+        response = {
+            "draw": query.draw,
+            "recordsTotal": total,
+            "recordsFiltered": len(positions),
+            "data": [self.render(datarows[pos]) for pos in page],
+        }
+        if sums:
+            response["sums"] = {
+                name: self._sum(name, positions)
+                for name in sums
+                if name in self.columns
+            }
+        if ids:
+            if self.row_id is None:
+                raise ValueError("Table has no row ids")
+            column = self.columns[self.row_id]
+            response["ids"] = [str(datarows[pos][column]) for pos in positions]
+        return response
+
+    def _sum(self, name: str, positions: List[int]) -> float:
+        column = self.columns[name]
+        datarows = self.table.datarows
+        return sum(
+            float(value)
+            for value in (datarows[pos][column] for pos in positions)
+            if isinstance(value, (Decimal, int, float))
+        )
+
+    def _column_index(self, name: str) -> int:
+        index = self.columns.get(name)
+        if index is None:
+            raise ValueError(f"Invalid column: {name}")
+        return index
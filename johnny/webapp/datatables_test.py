@@ -0,0 +1,128 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+import unittest
+
+from johnny.base.etl import petl, IndexedTable
+from johnny.webapp import datatables
+
+
+ROWS = [
+    ("chain_id", "account", "symbol", "cost"),
+    ("a", "x1234", "SPY", Decimal("-1.50")),
+    ("b", "x1234", "QQQ", Decimal("2.00")),
+    ("c", "tasty", "SPY", None),
+    ("d", "tasty", "IWM", Decimal("10")),
+]
+
+
+def Args(columns=None, **kwargs):
+    """Build request parameters like those sent by DataTables."""
+    args = {"draw": "3", "start": "0", "length": "10"}
+    for index, name in enumerate(columns or ROWS[0]):
+        args[f"columns[{index}][data]"] = name
+        args[f"columns[{index}][searchable]"] = "true"
+        args[f"columns[{index}][orderable]"] = "true"
+        args[f"columns[{index}][search][value]"] = ""
+        args[f"columns[{index}][search][regex]"] = "false"
+    args.update(kwargs)
+    return args
+
+
+class TestSource(unittest.TestCase):
+    def setUp(self):
+        table = IndexedTable(petl.wrap(ROWS), {"account": "account"})
+        self.source = datatables.Source(
+            table, str, {"chain_id": lambda value: f"<a>{value}</a>"}, "chain_id"
+        )
+
+    def process(self, args, **kwargs):
+        return self.source.process(datatables.ParseQuery(args), **kwargs)
+
+    def ids(self, response):
+        return [row["DT_RowId"] for row in response["data"]]
+
+    def test_page(self):
+        response = self.process(Args(start="1", length="2"))
+        self.assertEqual(3, response["draw"])
+        self.assertEqual(4, response["recordsTotal"])
+        self.assertEqual(4, response["recordsFiltered"])
+        self.assertEqual(["b", "c"], self.ids(response))
+        self.assertEqual(
+            {
+                "chain_id": "<a>b</a>",
+                "account": "x1234",
+                "symbol": "QQQ",
+                "cost": "2.00",
+                "DT_RowId": "b",
+            },
+            response["data"][0],
+        )
+
+    def test_sort(self):
+        args = Args(
+            **{
+                "order[0][column]": "2",
+                "order[0][dir]": "desc",
+                "order[1][column]": "3",
+                "order[1][dir]": "asc",
+            }
+        )
+        self.assertEqual(["c", "a", "b", "d"], self.ids(self.process(args)))
+
+    def test_search(self):
+        response = self.process(Args(**{"search[value]": "spy X12"}))
+        self.assertEqual(["a"], self.ids(response))
+        self.assertEqual(1, response["recordsFiltered"])
+        self.assertEqual(4, response["recordsTotal"])
+
+        response = self.process(
+            Args(**{"search[value]": "^(qqq|iwm)$", "search[regex]": "true"})
+        )
+        self.assertEqual([], self.ids(response))
+        response = self.process(
+            Args(**{"search[value]": "qqq|iwm", "search[regex]": "true"})
+        )
+        self.assertEqual(["b", "d"], self.ids(response))
+
+        with self.assertRaises(ValueError):
+            self.process(Args(**{"search[value]": "(", "search[regex]": "true"}))
+
+    def test_column_search(self):
+        args = Args(**{"columns[1][search][value]": "tasty"})
+        self.assertEqual(["c", "d"], self.ids(self.process(args)))
+
+        # Non-searchable columns are excluded from the global search only.
+        args = Args(**{"columns[2][searchable]": "false", "search[value]": "spy"})
+        self.assertEqual([], self.ids(self.process(args)))
+
+    def test_keys_and_sums(self):
+        response = self.process(
+            Args(), keys={"account": ["tasty"]}, sums=["cost", "unknown"]
+        )
+        self.assertEqual(["c", "d"], self.ids(response))
+        self.assertEqual(2, response["recordsTotal"])
+        self.assertEqual({"cost": 10.0}, response["sums"])
+
+    def test_ids(self):
+        args = Args(length="1", **{"search[value]": "spy", "order[0][column]": "0"})
+        args["order[0][dir]"] = "desc"
+        response = self.process(args, ids=True)
+        self.assertEqual(["c"], self.ids(response))
+        self.assertEqual(["c", "a"], response["ids"])
+        self.assertNotIn("ids", self.process(args))
+
+        source = datatables.Source(self.source.table, str)
+        with self.assertRaises(ValueError):
+            source.process(datatables.ParseQuery(args), ids=True)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            datatables.ParseQuery(Args(**{"order[0][column]": "9"}))
+        with self.assertRaises(ValueError):
+            self.process(Args(columns=["nonexistent"], **{"search[value]": "a"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
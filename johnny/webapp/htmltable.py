@@ -0,0 +1,83 @@
+"""Rendering of tables to HTML for DataTables.
+
+The markup is emitted directly, in a single pass over the rows, and can be
+produced in chunks so that large tables can be streamed to the client. The
+table carries an id, its header cells carry the name of their column as a
+class, and it has an empty footer for partial summaries. Rows may be given ids,
+which are used in the client to identify selected rows.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from typing import Any, Callable, Iterator, List, Optional
+
+from johnny.base.etl import Table
+
+
+# Number of rows rendered per chunk.
+CHUNK_ROWS = 500
+
+# Types whose cells are right-aligned.
+_NUMERIC_TYPES = (int, float, Decimal)
+
+
+def Render(
+    table: Table,
+    cls: str,
+    ids: Optional[List[str]] = None,
+    vrepr: Callable[[Any], str] = str,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[str]:
+    """Render a table to HTML, as chunks of markup.
+
+    Args:
+      table: The table to render.
+      cls: The id of the table element.
+      ids: An optional list of ids for the rows.
+      vrepr: A function rendering the values.
+      chunk_rows: The number of rows per chunk.
+    Yields:
+      Strings of HTML, which concatenate to the complete table.
+    """
+    it = iter(table)
+    header = next(it, ())
+    parts = [f"<table class='display compact nowrap cell-border' id='{cls}'>\n"]
+    if header:
+        parts.append("<thead>\n")
+        parts.append('<tr id="header">\n' if ids else "<tr>\n")
+        parts.extend(f"<th class={name}>{name}</th>\n" for name in header)
+        parts.append("</tr>\n</thead>\n")
+    parts.append("<tbody>\n")
+
+    iter_ids = iter(ids) if ids else None
+    for index, row in enumerate(it):
+        row_id = next(iter_ids, None) if iter_ids is not None else None
+        parts.append("<tr>\n" if row_id is None else f'<tr id="{row_id}">\n')
+        if len(row) < len(header):
+            row = tuple(row) + (None,) * (len(header) - len(row))
+        for value in row:
+            if isinstance(value, _NUMERIC_TYPES) and not isinstance(value, bool):
+                parts.append(f"<td style='text-align: right'>{vrepr(value)}</td>\n")
+            else:
+                parts.append(f"<td>{vrepr(value)}</td>\n")
+        parts.append("</tr>\n")
+        if index % chunk_rows == chunk_rows - 1:
+            yield "".join(parts)
+            parts = []
+
+    parts.append("</tbody>\n<tfoot>\n<tr>\n")
+    parts.extend(f'<th class="footcol-{name}"></th>\n' for name in header)
+    parts.append("</tr>\n</tfoot>\n</table>\n")
+    yield "".join(parts)
+
+
+def RenderString(
+    table: Table,
+    cls: str,
+    ids: Optional[List[str]] = None,
+    vrepr: Callable[[Any], str] = str,
+) -> str:
+    """Render a table to an HTML string."""
+    return "".join(Render(table, cls, ids, vrepr))
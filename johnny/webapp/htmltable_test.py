@@ -0,0 +1,84 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+from functools import partial
+import datetime
+import io
+import itertools
+import re
+import unittest
+
+from johnny.base.etl import petl
+from johnny.webapp import htmltable
+
+
+def vrepr(value):
+    if isinstance(value, Decimal):
+        return "{:,.2f}".format(value)
+    return str(value)
+
+
+def PetlHtmlString(table, cls, ids=None):
+    """The previous rendering, via petl and regular expressions."""
+    sink = petl.MemorySource()
+    table.tohtml(sink, vrepr=vrepr)
+    html = sink.getvalue().decode("utf8")
+    html = re.sub(
+        "class='petl'", f"class='display compact nowrap cell-border' id='{cls}'", html
+    )
+    fnames = iter(table.fieldnames())
+    html = re.sub(
+        "^<th>", lambda match: "<th class={}>".format(next(fnames)), html, flags=re.M
+    )
+    if ids:
+        iter_ids = itertools.chain(["header"], iter(ids))
+        html = re.sub("<tr>", lambda _: '<tr id="{}">'.format(next(iter_ids)), html)
+    buf = io.StringIO()
+    pr = partial(print, file=buf)
+    pr("<tfoot>")
+    pr("<tr>")
+    for fname in table.fieldnames():
+        pr(f'<th class="footcol-{fname}"></th>')
+    pr("</tr>")
+    pr("</tfoot>")
+    html = re.sub("</table>", "{}</table>".format(buf.getvalue()), html)
+    return html
+
+
+ROWS = [
+    ("chain_id", "cost", "quantity", "open", "date", "link"),
+    ("a", Decimal("-1234.5"), 1, True, datetime.date(2021, 1, 2), "<a href=x>a</a>"),
+    ("b", None, 2.5, False, None, None),
+    ("c", Decimal("0"), -3, None, datetime.date(2021, 1, 3), ""),
+]
+
+
+class TestRender(unittest.TestCase):
+    def test_identical(self):
+        table = petl.wrap(ROWS)
+        self.assertEqual(
+            PetlHtmlString(table, "chains"),
+            htmltable.RenderString(table, "chains", vrepr=vrepr),
+        )
+        ids = ["a", "b", "c"]
+        self.assertEqual(
+            PetlHtmlString(table, "chains", ids),
+            htmltable.RenderString(table, "chains", ids, vrepr=vrepr),
+        )
+
+    def test_empty(self):
+        table = petl.wrap(ROWS[:1])
+        self.assertEqual(
+            PetlHtmlString(table, "empty"), htmltable.RenderString(table, "empty")
+        )
+
+    def test_chunks(self):
+        rows = [ROWS[0]] + ROWS[1:] * 5
+        chunks = list(htmltable.Render(petl.wrap(rows), "t", vrepr=vrepr, chunk_rows=4))
+        self.assertEqual(4, len(chunks))
+        self.assertEqual(PetlHtmlString(petl.wrap(rows), "t"), "".join(chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""A bounded pool of workers rendering images off the request threads.
+
+Renders are identified by a key, typically a hash of the contents they are
+produced from. Concurrent requests for the same key share a single render,
+and the results are stored in a directory, so that they survive reloads of
+the state and restarts of the server. The directory is capped in size, and the
+least recently used renders are removed from it first.
+
+Graphs are laid out by running the graphviz `dot` program in a subprocess. The
+graphviz library isn't thread-safe, and laying out in-process would also hold
+the interpreter lock for the duration of the layout.
+"""
+
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from concurrent import futures
+from os import path
+from typing import Any, Callable, Dict, Optional
+import logging
+import os
+import subprocess
+import threading
+
+
+class Renderer:
+    """A pool of workers with request coalescing and an optional disk cache, of
+    at most `max_cache_bytes` if set."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        cache_dir: Optional[str] = None,
+        max_cache_bytes: Optional[int] = None,
+    ):
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="Renderer"
+        )
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.pending: Dict[str, futures.Future] = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def render(self, key: str, function: Callable[..., bytes], *args: Any) -> bytes:
+        """Return the result of `function(*args)`, rendered on the pool, unless it
+        is cached under `key` or already being rendered."""
+        contents = self._read(key)
+        if contents is not None:
+            return contents
+        with self._lock:
+            future = self.pending.get(key)
+            if future is None:
+                # The render may have completed since the cache was checked.
+                contents = self._read(key)
+                if contents is not None:
+                    return contents
+                future = self.executor.submit(self._run, key, function, *args)
+                self.pending[key] = future
+        return future.result()
+
+    def _run(self, key: str, function: Callable[..., bytes], *args: Any) -> bytes:
+        try:
+            contents = function(*args)
+            self._write(key, contents)
+            return contents
+        finally:
+            with self._lock:
+                del self.pending[key]
+
+    def _filename(self, key: str) -> str:
+        return path.join(self.cache_dir, key)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as infile:
+                contents = infile.read()
+        except FileNotFoundError:
+            return None
+        # Mark the file as recently used, for eviction.
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+        return contents
+
+    def _write(self, key: str, contents: bytes):
+        if not self.cache_dir:
+            return
+        filename = self._filename(key)
+        tmp_filename = filename + ".tmp"
+        try:
+            with open(tmp_filename, "wb") as outfile:
+                outfile.write(contents)
+            os.replace(tmp_filename, filename)
+        except OSError as exc:
+            logging.warning(f"Could not cache {filename}: {exc}")
+            return
+        if self.max_cache_bytes is not None:
+            with self._evict_lock:
+                self._evict()
+
+    def _evict(self):
+        """Remove the least recently used files until the cache fits its size."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _QuoteDot(value: Any) -> str:
+    """Quote a string as a DOT identifier."""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return '"{}"'.format(value.replace("\n", "\\n"))
+
+
+def ToDot(graph: "networkx.Graph") -> str:
+    """Convert an undirected graph to the DOT language. Only the `label` attribute
+    of the nodes is output."""
+    lines = ["graph {"]
+    for name, attrs in graph.nodes(data=True):
+        label = attrs.get("label")
+        if label is None:
+            lines.append("  {};".format(_QuoteDot(name)))
+        else:
+            lines.append("  {} [label={}];".format(_QuoteDot(name), _QuoteDot(label)))
+    for name1, name2 in graph.edges():
+        lines.append("  {} -- {};".format(_QuoteDot(name1), _QuoteDot(name2)))
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def RenderDot(source: str, format: str = "png") -> bytes:
+    """Lay out and render a graph in the DOT language with the `dot` program."""
+    process = subprocess.run(
+        ["dot", "-T{}".format(format)],
+        input=source.encode("utf8"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(
+            "dot failed: {}".format(process.stderr.decode("utf8", "replace").strip())
+        )
+    return process.stdout
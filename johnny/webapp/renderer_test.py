@@ -0,0 +1,123 @@
+__copyright__ = "Copyright (C) 2021  Martin Blais"
+__license__ = "GNU GPLv2"
+
+from concurrent import futures
+from os import path
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from johnny.webapp import renderer
+
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def render(self, value: str) -> bytes:
+        self.calls.append(value)
+        self.started.set()
+        self.release.wait(5)
+        return value.encode("utf8")
+
+    def test_coalesce(self):
+        pool = renderer.Renderer(2, self.tmpdir.name)
+        with futures.ThreadPoolExecutor(4) as executor:
+            results = [
+                executor.submit(pool.render, "key", self.render, "a") for _ in range(4)
+            ]
+            self.started.wait(5)
+            self.assertEqual(["key"], list(pool.pending))
+            self.release.set()
+            self.assertEqual([b"a"] * 4, [result.result() for result in results])
+        self.assertEqual(["a"], self.calls)
+        self.assertEqual({}, pool.pending)
+
+    def test_no_cache(self):
+        self.release.set()
+        pool = renderer.Renderer(1)
+        self.assertEqual(b"a", pool.render("key", self.render, "a"))
+        self.assertEqual(b"a", pool.render("key", self.render, "a"))
+        self.assertEqual(["a", "a"], self.calls)
+
+    def test_disk_cache(self):
+        self.release.set()
+        cache_dir = path.join(self.tmpdir.name, "graphs")
+        pool = renderer.Renderer(1, cache_dir)
+        self.assertEqual(b"a", pool.render("key", self.render, "a"))
+        self.assertEqual(["key"], os.listdir(cache_dir))
+
+        # The cache is shared by new renderers.
+        pool = renderer.Renderer(1, cache_dir)
+        self.assertEqual(b"a", pool.render("key", self.render, "a"))
+        self.assertEqual(b"b", pool.render("other", self.render, "b"))
+        self.assertEqual(["a", "b"], self.calls)
+
+    def test_error(self):
+        pool = renderer.Renderer(1, self.tmpdir.name)
+
+        def fail():
+            raise ValueError("Layout failed")
+
+        with self.assertRaises(ValueError):
+            pool.render("key", fail)
+        self.assertEqual({}, pool.pending)
+        self.assertEqual([], os.listdir(self.tmpdir.name))
+
+    def test_evict(self):
+        self.release.set()
+        pool = renderer.Renderer(1, self.tmpdir.name, max_cache_bytes=2)
+        self.assertEqual(b"a", pool.render("key1", self.render, "a"))
+        self.assertEqual(b"b", pool.render("key2", self.render, "b"))
+        # Reading a render marks it as recently used.
+        os.utime(path.join(self.tmpdir.name, "key1"), (0, 0))
+        os.utime(path.join(self.tmpdir.name, "key2"), (1, 1))
+        self.assertEqual(b"a", pool.render("key1", self.render, "a"))
+        self.assertEqual(b"c", pool.render("key3", self.render, "c"))
+        self.assertEqual(["key1", "key3"], sorted(os.listdir(self.tmpdir.name)))
+        self.assertEqual(["a", "b", "c"], self.calls)
+
+
+class TestDot(unittest.TestCase):
+    def graph(self):
+        import networkx as nx
+
+        graph = nx.Graph()
+        graph.add_node("t1", label='BUY "SPY"\n100')
+        graph.add_node("o1")
+        graph.add_edge("t1", "o1")
+        return graph
+
+    @unittest.skipIf(importlib.util.find_spec("networkx") is None, "No networkx")
+    def test_to_dot(self):
+        self.assertEqual(
+            "\n".join(
+                [
+                    "graph {",
+                    '  "t1" [label="BUY \\"SPY\\"\\n100"];',
+                    '  "o1";',
+                    '  "t1" -- "o1";',
+                    "}",
+                ]
+            ),
+            renderer.ToDot(self.graph()),
+        )
+
+    @unittest.skipIf(shutil.which("dot") is None, "Graphviz is not installed")
+    def test_render_dot(self):
+        self.assertTrue(renderer.RenderDot("graph { a -- b; }").startswith(b"\x89PNG"))
+        with self.assertRaises(RuntimeError):
+            renderer.RenderDot("graph {")
+
+
+if __name__ == "__main__":
+    unittest.main()
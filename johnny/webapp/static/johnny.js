@@ -40,21 +40,49 @@ function CreateChainsTable(id, extra_config) {
     if (extra_config != null) {
         config = Object.assign(config, extra_config)
     }
+    if (config.serverSide) {
+        // Have the server compute the sums over all the filtered rows.
+        config.ajax.data = function(data) {
+            data.sums = Object.keys(sum_columns).join(",");
+        };
+    }
     var table = $(id).DataTable(config);
 
-    // Emphasize some columns of the table.
+    // Emphasize some columns of the table. The rows are recreated on each draw
+    // when they are fetched from the server.
+    EmphasizeColumns(table);
+    table.on('draw.dt', function () {
+        EmphasizeColumns(table);
+    });
+
+    InstallDataTableFocus(table);
+
+    AddFooterSums(table, sum_columns);
+
+    return table;
+}
+
+function EmphasizeColumns(table) {
     $(table.column(':contains(pnl_win)').nodes()).addClass('win-column');
     $(table.column(':contains(pnl_chain)').nodes()).addClass('pnl-column');
     $(table.column(':contains(pnl_loss)').nodes()).addClass('loss-column');
     $(table.column(':contains(net_win)').nodes()).addClass('win-column');
     $(table.column(':contains(net_liq)').nodes()).addClass('pnl-column');
     $(table.column(':contains(net_loss)').nodes()).addClass('loss-column');
+}
 
-    InstallDataTableFocus(table);
-
-    AddFooterSums(table, sum_columns);
-
-    return table;
+// Configuration for a table whose rows are paged, sorted and searched on the
+// server, from the given URL. `columns` is the list of field names.
+function ServerSideConfig(url, columns) {
+    return {
+        serverSide: true,
+        processing: true,
+        searchDelay: 300,
+        ajax: {url: url},
+        columns: $.map(columns, function(name) {
+            return {data: name};
+        }),
+    };
 }
 
 // Bind SLASH to focus on the search box of the DataTable instance from
@@ -102,6 +130,16 @@ function UpdateFooter(table, sum_columns) {
         var contains = ':contains(' + colname + ')';
         var column = table.column(contains);
         var data = table.cells('.selected', contains).data();
+        if (data.length == 0 && table.page.info().serverSide) {
+            // Only the current page is available; use the server's sums.
+            var json = table.ajax.json();
+            if (json && json.sums && colname in json.sums) {
+                $(column.footer()).html(json.sums[colname].toLocaleString('en-US'));
+            } else {
+                $(column.footer()).html('N/A');
+            }
+            return;
+        }
         if (data.length == 0) {
             data = table.cells({search: 'applied'}, contains).data();
             if (data.length == 0) {